@@ -0,0 +1,298 @@
+import argparse
+import gc
+import io
+import json
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from PIL import Image
+from moteur import (tables, calculer_interets_ligne, calculer_interets_lot,
+                    calculer_interets_centimes, calculer_interets_lot_centimes, en_centimes_np,
+                    generer_loyers_theoriques_pre_rj, generer_loyers_post_rj, generer_echeancier_post_rj,
+                    calculer_cascade_pre_rj, imputer_paiements_monitor, synthese_dossier, reduire_series, serie_quotidienne)
+
+# --- BANC D'ESSAI ---
+# python bench.py                          -> toutes les étapes, tailles par défaut
+# python bench.py -e cascade -e pdf_dossier
+# python bench.py --sauver bench_ref.json  -> enregistre la référence
+# python bench.py --comparer bench_ref.json -> compare à la référence (hors ligne)
+# python bench.py -e pdf_relance -t 1000 -r 1 -> fuite mémoire : la colonne rss doit rester ~0
+#   (contrôle automatique plus court : tests/test_pdf_monitor.py)
+
+# --- DONNÉES SYNTHÉTIQUES ---
+def generer_lignes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    montants = np.round(rng.uniform(0, 50000, n), 2)
+    debut = date(2019, 6, 1).toordinal() + rng.integers(0, 2000, n)
+    fin = debut + rng.integers(0, 1500, n)
+    return montants, debut, fin
+
+def generer_paiements(n, debut, fin, seed=0):
+    rng = np.random.default_rng(seed)
+    jours = np.sort(rng.integers(0, (fin - debut).days, n))
+    montants = np.round(rng.uniform(100, 5000, n), 2)
+    return [{"date": debut + timedelta(days=int(j)), "montant": float(m)} for j, m in zip(jours, montants)]
+
+def generer_dossier(nb_paiements, seed=0):
+    return {
+        "loyer": 12000.0 + 500 * (seed % 7),
+        "paiements_pre": generer_paiements(nb_paiements, date(2019, 10, 1), date(2025, 6, 25), seed),
+        "paiements_post": generer_paiements(max(1, nb_paiements // 10), date(2025, 6, 27), date(2026, 4, 30), seed + 1),
+        "teom": [{"annee": 2022, "montant": 310.0}, {"annee": 2023, "montant": 325.0}],
+        "identity": {"nom": f"Proprietaire {seed}", "lot": f"L{seed:04d}"},
+    }
+
+def generer_echeancier_long(nb_echeances):
+    base, _ = generer_echeancier_post_rj(12000.0, 114.06, 135.30)
+    trimestre = base[-1]["montant"]
+    return [{"date": date(2025, 7, 10) + timedelta(days=91 * i), "label": f"Echeance {i}",
+             "montant": trimestre, "indice_used": 135.30} for i in range(nb_echeances)]
+
+def generer_scan(seed=0, taille=(3000, 4000)):
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 255, (taille[1] // 16, taille[0] // 16, 3), dtype=np.uint8)
+    img = Image.fromarray(pixels).resize(taille)
+    tampon = io.BytesIO()
+    img.save(tampon, format="JPEG", quality=90)
+    return tampon.getvalue()
+
+class Piece(io.BytesIO):
+    # Equivalent minimal d'un UploadedFile Streamlit
+    def __init__(self, contenu, type_mime):
+        super().__init__(contenu)
+        self.type = type_mime
+
+# --- ÉTAPES ---
+# Chaque étape reçoit une taille et renvoie la fonction à chronométrer (préparation exclue).
+def etape_interets(n):
+    montants, debut, fin = generer_lignes(n)
+    return lambda: calculer_interets_lot(montants, debut, fin)
+
+def etape_interets_centimes(n):
+    montants, debut, fin = generer_lignes(n)
+    montants_cts = en_centimes_np(montants)
+    return lambda: calculer_interets_lot_centimes(montants_cts, debut, fin)
+
+def etape_interets_scalaire(n):
+    montants, debut, fin = generer_lignes(n)
+    lignes = list(zip(montants.tolist(), [date.fromordinal(int(o)) for o in debut], [date.fromordinal(int(o)) for o in fin]))
+    return lambda: [calculer_interets_ligne(m, d, f) for m, d, f in lignes]
+
+def etape_echeanciers(n):
+    loyers = [12000.0 + i for i in range(n)]
+    def run():
+        for loyer in loyers:
+            generer_loyers_theoriques_pre_rj(loyer)
+            generer_loyers_post_rj(loyer)
+    return run
+
+def etape_cascade(n):
+    paiements = generer_paiements(n, date(2019, 10, 1), date(2025, 6, 25))
+    return lambda: calculer_cascade_pre_rj(12000.0, paiements)
+
+def etape_graphique(n):
+    # Données du graphique de l'onglet 1 (réduites à POINTS_GRAPHIQUE points)
+    paiements = generer_paiements(n, date(2019, 10, 1), date(2025, 6, 25))
+    data_detail, *_ = calculer_cascade_pre_rj(12000.0, paiements)
+    def run():
+        jours, princ_cts, int_cts = serie_quotidienne(data_detail)
+        df_g = pd.DataFrame({'Date': jours, 'R_Princ': princ_cts / 100, 'R_Int': int_cts / 100})
+        garder = reduire_series([df_g['R_Princ'].to_numpy(), df_g['R_Int'].to_numpy()])
+        return df_g.iloc[garder].melt('Date', value_vars=['R_Princ', 'R_Int'], var_name='Type', value_name='Montant')
+    return run
+
+def etape_scenarios(n):
+    # n hypothèses (retards, virements réduits, règlement, taux) sur un dossier de 40 virements
+    from scenarios import evaluer_scenarios, scenarios_monte_carlo
+    dossier = generer_dossier(40)
+    params = scenarios_monte_carlo(40, n, retard_max=90, reduction_max=0.3,
+                                   reglement=(date(2020, 1, 1), date(2025, 6, 1), 5000.0), taux=(5.0, 15.0))
+    return lambda: evaluer_scenarios(dossier["loyer"], dossier["paiements_pre"], **params)
+
+def etape_imputation(n):
+    base = generer_echeancier_long(n)
+    paiements = generer_paiements(n * 2, date(2025, 7, 1), base[-1]["date"])
+    return lambda: imputer_paiements_monitor(base, paiements, base[-1]["date"])
+
+def etape_soldes_a_date(n):
+    # n dates de simulation sur un lot de 1000 échéances : index construit une fois, une bisection par date
+    from moteur import indexer_monitor, arrieres_au
+    base = generer_echeancier_long(1000)
+    index = indexer_monitor(base, generer_paiements(2000, date(2025, 7, 1), base[-1]["date"]))
+    jours = [date(2025, 7, 1) + timedelta(days=int(j)) for j in np.random.default_rng(0).integers(0, 90_000, n)]
+    return lambda: [arrieres_au(index, d) for d in jours]
+
+def etape_lots(n):
+    dossiers = [generer_dossier(12, seed=i) for i in range(n)]
+    return lambda: [synthese_dossier(d, date(2026, 1, 15)) for d in dossiers]
+
+def etape_portefeuille(n):
+    import os, tempfile
+    import stockage
+    from calcul_portefeuille import calculer_portefeuille
+    cnx = stockage.connexion(os.path.join(tempfile.mkdtemp(), f"portefeuille_{n}.db"))
+    for i in range(n):
+        d = generer_dossier(12, seed=i)
+        stockage.enregistrer_dossier(d["identity"]["lot"], d["identity"], d["loyer"],
+                                     {"pre": d["paiements_pre"], "post": d["paiements_post"]}, d["teom"], cnx)
+    return lambda: calculer_portefeuille(date(2026, 1, 15), cnx=cnx)
+
+def etape_pdf_dossier(n):
+    from pdf_dossier import construire_dossier_pdf
+    import images
+    dossier = generer_dossier(12)
+    cascade = calculer_cascade_pre_rj(dossier["loyer"], dossier["paiements_pre"])
+    scans = [generer_scan(seed=i) for i in range(n)]
+    def run():
+        images._cache.clear()
+        pieces = [Piece(s, "image/jpeg") for s in scans]
+        return construire_dossier_pdf(dossier["identity"], dossier["loyer"], cascade,
+                                      dossier["paiements_pre"], dossier["teom"], pieces)
+    return run
+
+def generer_piece_pdf(taille_mo, seed=0):
+    # PDF d'images JPEG peu compressibles, ~taille_mo Mo
+    pages = [Image.open(io.BytesIO(generer_scan(seed=seed + i, taille=(2000, 2800)))) for i in range(max(1, taille_mo * 4 // 3))]
+    tampon = io.BytesIO()
+    pages[0].save(tampon, format="PDF", save_all=True, append_images=pages[1:])
+    return tampon.getvalue()
+
+def etape_pdf_fusion(n):
+    # Avis de taxe de n Mo joint deux fois : fusionné une seule fois
+    from pdf_dossier import construire_dossier_pdf
+    dossier = generer_dossier(12)
+    cascade = calculer_cascade_pre_rj(dossier["loyer"], dossier["paiements_pre"])
+    avis = generer_piece_pdf(n)
+    def run():
+        pieces = [Piece(avis, "application/pdf"), Piece(avis, "application/pdf")]
+        with construire_dossier_pdf(dossier["identity"], dossier["loyer"], cascade,
+                                    dossier["paiements_pre"], dossier["teom"], pieces) as fichier:
+            fichier.seek(0, io.SEEK_END)
+            return fichier.tell()
+    return run
+
+def etape_pdf_relance(n):
+    from pdf_monitor import construire_relance_pdf
+    base = generer_echeancier_long(4)
+    paiements = generer_paiements(2, date(2025, 7, 1), date(2026, 1, 1))
+    today = date(2026, 1, 15)
+    debts_display, *totaux = imputer_paiements_monitor(base, paiements, today)
+    df_ilc = pd.DataFrame(tables()["historique_ilc"])
+    def run():
+        for _ in range(n):
+            construire_relance_pdf({"nom": "X", "lot": "1"}, "15/01/2026", debts_display, totaux, paiements, df_ilc)
+    return run
+
+ETAPES = {
+    # nom : (fonction, paramètre de taille, tailles par défaut)
+    "interets": (etape_interets, "lignes", (10_000, 1_000_000)),
+    "interets_centimes": (etape_interets_centimes, "lignes", (10_000, 1_000_000)),
+    "interets_scalaire": (etape_interets_scalaire, "lignes", (10_000, 1_000_000)),
+    "echeanciers": (etape_echeanciers, "lots", (100, 1000)),
+    "cascade": (etape_cascade, "paiements_par_lot", (10, 100, 1000)),
+    "graphique": (etape_graphique, "paiements_par_lot", (100, 10_000)),
+    "scenarios": (etape_scenarios, "scenarios", (1000, 10_000)),
+    "imputation": (etape_imputation, "echeances", (10, 100, 1000)),
+    "soldes_a_date": (etape_soldes_a_date, "dates", (100, 10_000)),
+    "lots": (etape_lots, "lots_par_run", (10, 100, 500)),
+    "portefeuille": (etape_portefeuille, "lots", (100, 500)),
+    "pdf_dossier": (etape_pdf_dossier, "images_par_dossier", (0, 5, 20)),
+    "pdf_fusion": (etape_pdf_fusion, "mo_par_piece", (5, 50)),
+    "pdf_relance": (etape_pdf_relance, "rapports", (10, 100)),
+}
+
+def ecart_interets_centimes(n=10_000):
+    # En centimes, lot et scalaire doivent être identiques à l'unité près
+    montants, debut, fin = generer_lignes(n, seed=1)
+    montants_cts = en_centimes_np(montants)
+    scalaire = [calculer_interets_centimes(int(m), date.fromordinal(int(d)), date.fromordinal(int(f)))
+                for m, d, f in zip(montants_cts, debut, fin)]
+    return int(np.count_nonzero(np.asarray(scalaire) != calculer_interets_lot_centimes(montants_cts, debut, fin)))
+
+def ecart_interets(n=10_000):
+    # Contrôle de cohérence : le calcul par lot doit égaler le scalaire au centime
+    montants, debut, fin = generer_lignes(n, seed=1)
+    scalaire = [calculer_interets_ligne(m, date.fromordinal(int(d)), date.fromordinal(int(f)))
+                for m, d, f in zip(montants.tolist(), debut, fin)]
+    return float(np.max(np.abs(np.round(scalaire, 2) - np.round(calculer_interets_lot(montants, debut, fin), 2))))
+
+# --- MESURE ---
+def rss_mo():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * 4096 / 1e6
+    except OSError:
+        return float("nan")
+
+def mesurer(fabrique, taille, repetitions):
+    fn = fabrique(taille)
+    temps = []
+    for _ in range(repetitions):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        temps.append(time.perf_counter() - t0)
+    # Pic mémoire (allocations Python + NumPy) sur une exécution dédiée, hors chronométrage
+    gc.collect()
+    rss_avant = rss_mo()
+    tracemalloc.start()
+    fn()
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"temps": min(temps), "pic_mo": pic / 1e6, "rss_delta_mo": rss_mo() - rss_avant}
+
+def lancer(etapes, tailles_forcees, repetitions):
+    resultats = {}
+    for nom in etapes:
+        fabrique, parametre, tailles = ETAPES[nom]
+        for taille in tailles_forcees or tailles:
+            cle = f"{nom}[{parametre}={taille}]"
+            res = mesurer(fabrique, taille, repetitions)
+            resultats[cle] = res
+            print(f"{cle:<42} {res['temps'] * 1000:11.2f} ms   pic {res['pic_mo']:9.2f} Mo   rss {res['rss_delta_mo']:+8.2f} Mo", flush=True)
+    return resultats
+
+def comparer(resultats, reference, seuil):
+    regressions = 0
+    print("\n--- Comparaison à la référence ---")
+    for cle, res in resultats.items():
+        if cle not in reference:
+            print(f"{cle:<42} (absent de la référence)")
+            continue
+        ratio_t = res["temps"] / reference[cle]["temps"] if reference[cle]["temps"] else float("inf")
+        ratio_m = res["pic_mo"] / reference[cle]["pic_mo"] if reference[cle]["pic_mo"] else 1.0
+        alerte = ratio_t > seuil or ratio_m > seuil
+        regressions += alerte
+        print(f"{cle:<42} temps x{ratio_t:5.2f}   mémoire x{ratio_m:5.2f}   {'REGRESSION' if alerte else 'ok'}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai : échéanciers, cascade, imputation, PDF")
+    parser.add_argument("-e", "--etape", action="append", choices=sorted(ETAPES), help="étape(s) à lancer (défaut : toutes)")
+    parser.add_argument("-t", "--taille", action="append", type=int, help="taille(s) à la place des tailles par défaut")
+    parser.add_argument("-r", "--repetitions", type=int, default=3)
+    parser.add_argument("--sauver", help="enregistre les résultats comme référence (JSON)")
+    parser.add_argument("--comparer", help="compare à une référence enregistrée (JSON)")
+    parser.add_argument("--seuil", type=float, default=1.25, help="ratio au-delà duquel une étape est en régression")
+    args = parser.parse_args(argv)
+
+    etapes = args.etape or list(ETAPES)
+    if "interets" in etapes:
+        print(f"interets : écart max lot / scalaire = {ecart_interets():.2f} EUR")
+    if "interets_centimes" in etapes:
+        print(f"interets_centimes : lignes différentes lot / scalaire = {ecart_interets_centimes()}")
+    resultats = lancer(etapes, args.taille, args.repetitions)
+    if args.sauver:
+        with open(args.sauver, "w", encoding="utf-8") as f:
+            json.dump(resultats, f, indent=2, sort_keys=True)
+    if args.comparer:
+        with open(args.comparer, encoding="utf-8") as f:
+            reference = json.load(f)
+        return 1 if comparer(resultats, reference, args.seuil) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+import pandas as pd
+from moteur import lire_sauvegarde, synthese_dossier
+
+# --- CALCUL EN MASSE : un albion_backup.json par lot ---
+# Usage : python calcul_lots.py DOSSIER_JSON -o synthese.csv [--workers N] [--date 2026-01-15]
+
+def lister_dossiers(repertoire):
+    return sorted(os.path.join(repertoire, f) for f in os.listdir(repertoire) if f.lower().endswith(".json"))
+
+def traiter_fichier(args):
+    chemin, aujourd_hui = args
+    try:
+        with open(chemin, encoding="utf-8") as f:
+            dossier = lire_sauvegarde(json.load(f))
+        ligne = synthese_dossier(dossier, aujourd_hui)
+        ligne["erreur"] = ""
+    except Exception as e:
+        ligne = {"erreur": f"{type(e).__name__}: {e}"}
+    ligne["fichier"] = os.path.basename(chemin)
+    return ligne
+
+def calculer_repertoire(repertoire, aujourd_hui, workers=None):
+    chemins = lister_dossiers(repertoire)
+    taches = [(c, aujourd_hui) for c in chemins]
+    # Un lot = quelques ms : on regroupe les tâches pour amortir l'aller-retour inter-processus
+    chunksize = max(1, len(taches) // ((workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        lignes = list(pool.map(traiter_fichier, taches, chunksize=chunksize))
+    colonnes = ["fichier", "lot", "nom", "loyer_ht", "principal", "interets", "indemnites", "teom",
+                "total_declare", "reste_exigible", "erreur"]
+    return pd.DataFrame(lignes, columns=colonnes)
+
+def ecrire_synthese(df, sortie):
+    if sortie.lower().endswith(".parquet"):
+        df.to_parquet(sortie, index=False)
+    else:
+        df.to_csv(sortie, index=False, float_format="%.2f")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calcul de la créance pour un répertoire de dossiers albion_backup.json")
+    parser.add_argument("repertoire")
+    parser.add_argument("-o", "--sortie", default="synthese_lots.csv", help="fichier .csv ou .parquet")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="nombre de processus (défaut : nb de coeurs)")
+    parser.add_argument("--date", default=None, help="date du suivi post-RJ (AAAA-MM-JJ, défaut : aujourd'hui)")
+    args = parser.parse_args(argv)
+
+    aujourd_hui = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else date.today()
+    df = calculer_repertoire(args.repertoire, aujourd_hui, args.workers)
+    ecrire_synthese(df, args.sortie)
+
+    nb_erreurs = int((df["erreur"] != "").sum())
+    print(f"{len(df)} lot(s) traité(s), {nb_erreurs} erreur(s) -> {args.sortie}")
+    return 1 if nb_erreurs else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import argparse
+import sys
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from moteur import (DATE_JUGEMENT, FIN_SUIVI_POST_RJ, INDEMNITE_FORFAITAIRE, tables, en_centimes, en_ordinaux,
+                    generer_echeancier_post_rj, calculer_cascade_pre_rj, total_creance, indexer_monitor,
+                    arrieres_aux, fins_de_mois)
+import stockage
+
+# --- PORTEFEUILLE : tous les lots de la base en une passe colonnaire ---
+# Un grand livre commun (une ligne par dette et par lot, en centimes) remplace la boucle lot par lot.
+# Imputation monitor (pénalités d'abord, puis principal par date) en sommes cumulées par lot :
+# une dette reçoit la part de la masse des virements comprise entre le cumul des dettes qui la
+# précèdent et le sien ; le virement qui la solde est trouvé par searchsorted sur le cumul des virements.
+# La créance déclarée reste une cascade par lot (imputation sur les intérêts d'abord : chaque virement
+# dépend du solde d'intérêts laissé par le précédent).
+# Usage : python calcul_portefeuille.py [--date 2026-01-15] [-o portefeuille.csv] [--base albion.db]
+#         python calcul_portefeuille.py --mensuel [--date 2026-01-15] [-o arrieres.csv] -> arriérés en fin de mois
+
+TRANCHES_RETARD = [0, 1, 31, 61, 91, 181, np.inf]
+LIBELLES_RETARD = ["À jour", "1-30 j", "31-60 j", "61-90 j", "91-180 j", "> 180 j"]
+# Cumuls de lots différents séparés dans une seule clé triée (2^42 centimes ≈ 44 Md€ par lot)
+DECALAGE_LOT = 1 << 42
+
+# --- GRAND LIVRE ---
+def indices_ilc(instantane=None):
+    historique = (instantane or tables()["instantane"]).historique_ilc
+    indices = {int(row["Annee"]): float(row["Indice"]) for row in historique}
+    futurs = tuple((a, i) for a, i in sorted(indices.items()) if a > 2025)
+    return indices[2019], indices[2025], futurs
+
+def grand_livre_post_rj(loyers_cts, fin=FIN_SUIVI_POST_RJ, instantane=None):
+    # Échéances monitor de chaque lot (plan commun en cache, montant par lot) : colonnes lot, date, montant
+    indice_base, indice_revision, futurs = indices_ilc(instantane)
+    par_loyer = {}
+    codes, dates, montants = [], [], []
+    for code, loyer_cts in enumerate(loyers_cts):
+        if loyer_cts not in par_loyer:
+            echeances, _ = generer_echeancier_post_rj(loyer_cts / 100, indice_base, indice_revision, fin, futurs)
+            par_loyer[loyer_cts] = ([e["date"] for e in echeances], [en_centimes(e["montant"]) for e in echeances])
+        d, m = par_loyer[loyer_cts]
+        codes.append(np.full(len(d), code, dtype=np.int64))
+        dates.append(en_ordinaux(np.array(d, dtype="datetime64[D]")))
+        montants.append(np.asarray(m, dtype=np.int64))
+    vide = np.zeros(0, dtype=np.int64)
+    return pd.DataFrame({
+        "lot": np.concatenate(codes) if codes else vide,
+        "date": np.concatenate(dates) if dates else vide,
+        "montant": np.concatenate(montants) if montants else vide,
+    })
+
+def ajouter_penalites(dettes, today):
+    # Indemnité forfaitaire le lendemain de chaque échéance passée
+    echues = dettes[dettes["date"] < today.toordinal()]
+    penalites = pd.DataFrame({"lot": echues["lot"].to_numpy(), "date": echues["date"].to_numpy() + 1,
+                              "montant": en_centimes(INDEMNITE_FORFAITAIRE)})
+    dettes = dettes.assign(penalite=False)
+    return pd.concat([dettes, penalites.assign(penalite=True)], ignore_index=True)
+
+# --- IMPUTATION VECTORISÉE (même résultat que imputer_paiements_monitor) ---
+# dettes : lot (code), date (ordinal), montant (centimes), penalite ; virements : lot, date, montant, dans l'ordre de saisie
+def imputer_portefeuille(dettes, virements, today):
+    ordre = np.lexsort((dettes["date"].to_numpy(), ~dettes["penalite"].to_numpy(), dettes["lot"].to_numpy()))
+    dettes = dettes.iloc[ordre].reset_index(drop=True)
+    # Un virement négatif n'est jamais imputé (le curseur l'ignore)
+    virements = virements.assign(montant=virements["montant"].clip(lower=0))
+    ordre_v = np.argsort(virements["lot"].to_numpy(), kind="stable")
+    virements = virements.iloc[ordre_v].reset_index(drop=True)
+
+    lot = dettes["lot"].to_numpy()
+    montant = dettes["montant"].to_numpy()
+    cumul = dettes.groupby("lot")["montant"].cumsum().to_numpy()
+    verse = virements.groupby("lot")["montant"].sum()
+    masse = verse.reindex(lot, fill_value=0).to_numpy()
+    paye = np.clip(masse - (cumul - montant), 0, montant)
+    reste = montant - paye
+
+    # Virement qui solde (ou entame en dernier) chaque dette
+    cle_v = virements["lot"].to_numpy() * DECALAGE_LOT + virements.groupby("lot")["montant"].cumsum().to_numpy()
+    j = np.searchsorted(cle_v, lot * DECALAGE_LOT + np.minimum(cumul, masse), side="left")
+    dates_v = virements["date"].to_numpy()
+    date_paiement = np.where(paye > 0, dates_v[np.minimum(j, len(dates_v) - 1)] if len(dates_v) else 0, 0)
+
+    date_dette = dettes["date"].to_numpy()
+    t = today.toordinal()
+    soldee = (reste == 0) & (paye > 0)
+    jours_retard = np.where(soldee, np.maximum(0, date_paiement - date_dette),
+                            np.where(t > date_dette, t - date_dette, 0))
+    en_retard = (reste > 0) & (t > date_dette)
+    return dettes.assign(paye=paye, reste=reste, date_paiement=date_paiement, jours_retard=jours_retard, en_retard=en_retard)
+
+# --- CRÉANCE DÉCLARÉE (cascade pré-RJ par lot) ---
+def creances_declarees(lots, paiements_pre, instantane=None):
+    pre = {}
+    for lot, d, m in paiements_pre:
+        pre.setdefault(lot, []).append({"date": date.fromisoformat(d), "montant": m / 100})
+    lignes = []
+    for lot, loyer_cts in lots:
+        _, princ_net, int_net, indemnite = calculer_cascade_pre_rj(loyer_cts / 100, pre.get(lot, []), instantane=instantane)
+        lignes.append((princ_net, int_net, indemnite))
+    return pd.DataFrame(lignes, columns=["principal", "interets", "indemnites"])
+
+# --- SYNTHÈSE ---
+def calculer_portefeuille(today, fin=FIN_SUIVI_POST_RJ, cnx=None, instantane=None):
+    # Renvoie (une ligne par lot, une ligne par dette post-RJ imputée) ; tous les lots sur la même version des tables
+    instantane = instantane or tables()["instantane"]
+    lignes_lots, lignes_paiements, lignes_teom = stockage.lire_portefeuille(cnx)
+    lots = pd.DataFrame(lignes_lots, columns=["lot", "nom", "loyer_cts"])
+    paiements = pd.DataFrame(lignes_paiements, columns=["lot", "phase", "date", "montant"])
+    code = {l: i for i, l in enumerate(lots["lot"])}
+
+    synthese = lots[["lot", "nom"]].assign(loyer_ht=lots["loyer_cts"] / 100)
+    pre = paiements[paiements["phase"] == "pre"]
+    synthese = synthese.join(creances_declarees(zip(lots["lot"], lots["loyer_cts"]),
+                                                zip(pre["lot"], pre["date"], pre["montant"]), instantane))
+    teom = dict(lignes_teom)
+    synthese["teom"] = [(teom.get(l) or 0) / 100 for l in lots["lot"]]
+    synthese["total_declare"] = [total_creance(*v) for v in
+                                 zip(synthese["principal"], synthese["interets"], synthese["indemnites"], synthese["teom"])]
+
+    post = paiements[paiements["phase"] == "post"]
+    virements = pd.DataFrame({"lot": post["lot"].map(code).to_numpy(dtype=np.int64),
+                              "date": en_ordinaux(post["date"].to_numpy(dtype="datetime64[D]")),
+                              "montant": post["montant"].to_numpy(dtype=np.int64)})
+    dettes = imputer_portefeuille(ajouter_penalites(grand_livre_post_rj(lots["loyer_cts"].tolist(), fin, instantane), today), virements, today)
+
+    retard = dettes[dettes["en_retard"]]
+    par_lot = retard.groupby(["lot", "penalite"])["reste"].sum().unstack(fill_value=0)
+    par_lot = par_lot.reindex(index=range(len(lots)), columns=[False, True], fill_value=0)
+    synthese["retard_loyer"] = par_lot[False].to_numpy() / 100
+    synthese["retard_penalite"] = par_lot[True].to_numpy() / 100
+    synthese["retard_post_rj"] = (par_lot[False] + par_lot[True]).to_numpy() / 100
+    jours_max = retard[~retard["penalite"]].groupby("lot")["jours_retard"].max()
+    synthese["jours_retard_max"] = jours_max.reindex(range(len(lots)), fill_value=0).to_numpy()
+    return synthese, dettes
+
+def repartition_retards(dettes, today):
+    # Échéances de loyer passées, par ancienneté du retard (soldées : retard constaté au paiement)
+    echues = dettes[~dettes["penalite"] & (dettes["date"] < today.toordinal())]
+    tranche = pd.cut(echues["jours_retard"], TRANCHES_RETARD, right=False, labels=LIBELLES_RETARD)
+    groupes = echues.groupby(tranche, observed=False)
+    return pd.DataFrame({"echeances": groupes.size(), "reste_du": groupes["reste"].sum() / 100}).rename_axis("retard")
+
+# --- ARRIÉRÉS EN FIN DE MOIS (index des soldes à date, un par lot) ---
+def arrieres_fin_de_mois(fins, fin=FIN_SUIVI_POST_RJ, cnx=None, instantane=None):
+    # Une ligne par lot, une colonne par date de fins (euros) ; virements reçus au plus tard à la date.
+    # Tous les lots et tous les mois sur la même version des tables
+    instantane = instantane or tables()["instantane"]
+    lignes_lots, lignes_paiements, _ = stockage.lire_portefeuille(cnx)
+    post = {}
+    for lot, phase, d, m in lignes_paiements:
+        if phase == "post": post.setdefault(lot, []).append({"date": date.fromisoformat(d), "montant": m / 100})
+    indice_base, indice_revision, futurs = indices_ilc(instantane)
+    par_loyer = {}
+    jours = en_ordinaux(np.array(fins, dtype="datetime64[D]"))
+    lignes = []
+    for lot, _, loyer_cts in lignes_lots:
+        if loyer_cts not in par_loyer:
+            par_loyer[loyer_cts], _ = generer_echeancier_post_rj(loyer_cts / 100, indice_base, indice_revision, fin, futurs)
+        total, _, _ = arrieres_aux(indexer_monitor(par_loyer[loyer_cts], post.get(lot, [])), jours, encaisses=True)
+        lignes.append(total / 100)
+    colonnes = [d.isoformat() for d in fins]
+    arrieres = pd.DataFrame(np.array(lignes).reshape(len(lignes), len(fins)), columns=colonnes)
+    return pd.concat([pd.DataFrame(lignes_lots, columns=["lot", "nom", "loyer_cts"])[["lot", "nom"]], arrieres], axis=1)
+
+def totaux_portefeuille(synthese):
+    return {
+        "lots": len(synthese),
+        "total_declare": int(synthese["total_declare"].map(en_centimes).sum()) / 100,
+        "retard_post_rj": int(synthese["retard_post_rj"].map(en_centimes).sum()) / 100,
+        "lots_en_retard": int((synthese["retard_post_rj"] > 0).sum()),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthèse de tous les lots de la base (créance déclarée, arriérés post-RJ)")
+    parser.add_argument("-o", "--sortie", default=None, help="fichier .csv (défaut : affichage des totaux seulement)")
+    parser.add_argument("--date", default=None, help="date du suivi post-RJ (AAAA-MM-JJ, défaut : aujourd'hui)")
+    parser.add_argument("--base", help="fichier SQLite (défaut : ALBION_BASE)")
+    parser.add_argument("--mensuel", action="store_true", help="arriérés post-RJ de chaque lot en fin de mois, du jugement à --date")
+    args = parser.parse_args(argv)
+    if not (args.base or stockage.chemin_base()): parser.error("indiquer la base : --base ou ALBION_BASE")
+
+    aujourd_hui = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else date.today()
+    if args.mensuel:
+        fins = fins_de_mois(DATE_JUGEMENT, aujourd_hui)
+        arrieres = arrieres_fin_de_mois(fins, cnx=stockage.connexion(args.base))
+        if args.sortie:
+            arrieres.to_csv(args.sortie, index=False, float_format="%.2f")
+        for d in fins:
+            print(f"{d:%d/%m/%Y} : {int(arrieres[d.isoformat()].map(en_centimes).sum()) / 100:>14,.2f} EUR "
+                  f"({int((arrieres[d.isoformat()] > 0).sum())} lot(s) en retard)")
+        return 0
+    synthese, dettes = calculer_portefeuille(aujourd_hui, cnx=stockage.connexion(args.base))
+    if args.sortie:
+        synthese.to_csv(args.sortie, index=False, float_format="%.2f")
+    totaux = totaux_portefeuille(synthese)
+    print(f"{totaux['lots']} lot(s) : créance déclarée {totaux['total_declare']:,.2f} EUR, "
+          f"arriérés post-RJ au {aujourd_hui:%d/%m/%Y} {totaux['retard_post_rj']:,.2f} EUR "
+          f"({totaux['lots_en_retard']} lot(s) en retard)")
+    print(repartition_retards(dettes, aujourd_hui).to_string())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+# Racine du dépôt : les modules (moteur, import_releves, ...) sont importables depuis tests/
@@ -0,0 +1,75 @@
+import hashlib
+import io
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# --- PIPELINE IMAGES EN MÉMOIRE (scans TEOM, graphiques) ---
+# Les scans sont décodés en parallèle, réduits à la résolution d'impression,
+# recompressés en JPEG et passés à FPDF sans fichier temporaire.
+
+LARGEUR_IMPRESSION_MM = 190
+DPI_IMPRESSION = 150
+QUALITE_JPEG = 80
+TAILLE_CACHE = 128
+
+_cache = OrderedDict()
+_verrou = threading.Lock()
+
+def empreinte(contenu):
+    return hashlib.sha256(contenu).hexdigest()
+
+def _reduire(contenu, largeur_mm, dpi, qualite):
+    img = Image.open(io.BytesIO(contenu))
+    # draft() laisse le décodeur JPEG sauter directement à une échelle réduite
+    largeur_px = int(round(largeur_mm / 25.4 * dpi))
+    img.draft("RGB", (largeur_px, largeur_px * 4))
+    if img.mode not in ("RGB", "L"): img = img.convert("RGB")
+    if img.width > largeur_px:
+        img = img.resize((largeur_px, max(1, round(img.height * largeur_px / img.width))), Image.LANCZOS)
+    tampon = io.BytesIO()
+    img.save(tampon, format="JPEG", quality=qualite, optimize=True)
+    return {"w": img.width, "h": img.height, "cs": "DeviceRGB" if img.mode == "RGB" else "DeviceGray",
+            "f": "DCTDecode", "data": tampon.getvalue()}
+
+def preparer_image(contenu, largeur_mm=LARGEUR_IMPRESSION_MM, dpi=DPI_IMPRESSION, qualite=QUALITE_JPEG):
+    cle = (empreinte(contenu), largeur_mm, dpi, qualite)
+    with _verrou:
+        if cle in _cache:
+            _cache.move_to_end(cle)
+            return cle[0], _cache[cle]
+    image = _reduire(contenu, largeur_mm, dpi, qualite)
+    with _verrou:
+        _cache[cle] = image
+        while len(_cache) > TAILLE_CACHE:
+            _cache.popitem(last=False)
+    return cle[0], image
+
+def _preparer_ou_erreur(contenu):
+    try:
+        return preparer_image(contenu), None
+    except Exception as e:
+        return None, e
+
+def preparer_images(contenus, workers=4):
+    # PIL relâche le GIL pendant le décodage et le redimensionnement : des threads suffisent
+    if len(contenus) <= 1: return [_preparer_ou_erreur(c) for c in contenus]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_preparer_ou_erreur, contenus))
+
+def preparer_pixels_rgb(pixels, largeur, hauteur):
+    # Pixels RGB 8 bits bruts (ex. rendu Agg d'un graphique) : compression sans perte, sans PNG intermédiaire
+    data = zlib.compress(pixels, 6)
+    return empreinte(data), {"w": largeur, "h": hauteur, "cs": "DeviceRGB", "f": "FlateDecode", "data": data}
+
+def inserer_image(pdf, image_preparee, x=None, y=None, w=0, h=0):
+    # Enregistre l'image directement dans la table d'images de FPDF (pas de fichier).
+    # FPDF supprime 'data' après écriture : on lui donne un dict neuf à chaque document.
+    nom, image = image_preparee
+    nom = f"mem_{nom}"
+    if nom not in pdf.images:
+        pdf.images[nom] = {"w": image["w"], "h": image["h"], "cs": image["cs"], "bpc": 8,
+                           "f": image["f"], "data": image["data"], "i": len(pdf.images) + 1}
+    pdf.image(nom, x=x, y=y, w=w, h=h)
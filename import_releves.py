@@ -0,0 +1,290 @@
+import argparse
+import csv
+import io
+import re
+import sys
+from collections import Counter
+from datetime import date, datetime
+from itertools import islice
+from moteur import DATE_JUGEMENT, en_centimes
+
+# --- IMPORT DES RELEVÉS BANCAIRES (CSV / OFX) ---
+# Lecture en flux, par blocs : la mémoire ne dépend pas de la taille du relevé.
+# Seuls les crédits sont retenus (éventuellement filtrés sur l'émetteur), puis routés
+# avant / après DATE_JUGEMENT. Doublons : occurrences de (date, centimes, référence) comptées dans un index
+# haché, O(1) par ligne ; réimporter un relevé qui chevauche le précédent n'ajoute rien.
+# Usage : python import_releves.py releve.csv [--lot A204 | --motif-lot "LOT\s*(\w+)"] [--emetteur ALBION]
+
+TAILLE_BLOC = 1000
+ALIAS_COLONNES = {
+    "date": ("date", "date operation", "date opération", "date comptable", "date valeur", "dtposted"),
+    "montant": ("montant", "montant eur", "montant (eur)", "amount", "trnamt"),
+    "credit": ("credit", "crédit", "credit eur", "crédit eur"),
+    "libelle": ("libelle", "libellé", "libelle operation", "libellé opération", "description", "name", "memo"),
+    "reference": ("reference", "référence", "ref", "réf", "fitid", "id operation", "numero"),
+}
+FORMATS_DATE = ("%d/%m/%Y", "%Y-%m-%d", "%d/%m/%y", "%d-%m-%Y", "%Y%m%d")
+
+class PointVirgule(csv.excel):
+    # Export des banques françaises
+    delimiter = ";"
+
+# --- LECTURE ---
+def ouvrir_texte(flux):
+    # Flux binaire (fichier, UploadedFile) -> texte ; UTF-8 si l'échantillon le permet, sinon cp1252
+    echantillon = flux.read(65536)
+    flux.seek(0)
+    try:
+        echantillon.decode("utf-8-sig")
+        encodage = "utf-8-sig"
+    except UnicodeDecodeError:
+        encodage = "cp1252"
+    return io.TextIOWrapper(flux, encoding=encodage, errors="replace", newline="")
+
+def lire_date(texte):
+    texte = texte.strip()[:10] if "/" in texte or "-" in texte else texte.strip()[:8]
+    for fmt in FORMATS_DATE:
+        try:
+            return datetime.strptime(texte, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"date illisible : {texte!r}")
+
+def lire_date_ofx(texte):
+    # DTPOSTED : AAAAMMJJ[HHMMSS[.XXX]][[±h:TZ]] ; seuls les 8 premiers chiffres comptent
+    trouve = re.match(r"\d{8}", texte.strip())
+    if not trouve: raise ValueError(f"date OFX illisible : {texte!r}")
+    return datetime.strptime(trouve.group(0), "%Y%m%d").date()
+
+def lire_montant(texte):
+    texte = texte.replace("\xa0", "").replace(" ", "").replace("€", "").replace("EUR", "").strip()
+    if not texte: return None
+    # Le dernier séparateur est la décimale, l'autre sépare les milliers : 1.234,56 comme 1,234.56
+    decimale = "," if texte.rfind(",") > texte.rfind(".") else "."
+    texte = texte.replace("." if decimale == "," else ",", "")
+    if texte.count(decimale) > 1: raise ValueError(f"montant ambigu : {texte!r}")
+    return float(texte.replace(",", "."))
+
+def compter_illisible(stats):
+    if stats is not None: stats["illisibles"] += 1
+
+def normaliser(nom):
+    return nom.strip().strip('"').lower()
+
+def lignes_csv(texte, stats=None):
+    debut = texte.read(8192)
+    texte.seek(0)
+    try:
+        dialecte = csv.Sniffer().sniff(debut, delimiters=";,\t")
+    except csv.Error:
+        dialecte = PointVirgule
+    lecteur = csv.reader(texte, dialecte)
+    entete = [normaliser(c) for c in next(lecteur, [])]
+    colonnes = {}
+    for champ, alias in ALIAS_COLONNES.items():
+        for i, nom in enumerate(entete):
+            if nom in alias:
+                colonnes[champ] = i
+                break
+    if "date" not in colonnes or not ({"montant", "credit"} & colonnes.keys()):
+        raise ValueError(f"colonnes date / montant introuvables dans l'en-tête : {entete}")
+    col_montant = colonnes.get("credit", colonnes.get("montant"))
+    for ligne in lecteur:
+        if not ligne or len(ligne) <= max(colonnes.values()): continue
+        try:
+            montant = lire_montant(ligne[col_montant])
+            if montant is None: continue
+            d = lire_date(ligne[colonnes["date"]])
+        except ValueError:
+            compter_illisible(stats)
+            continue
+        yield {
+            "date": d,
+            "montant": montant,
+            "libelle": ligne[colonnes["libelle"]].strip() if "libelle" in colonnes else "",
+            "reference": ligne[colonnes["reference"]].strip() if "reference" in colonnes else "",
+        }
+
+RE_BALISE_OFX = re.compile(r"<(/?)(\w+)>([^<\r\n]*)")
+
+def lignes_ofx(texte, stats=None):
+    # OFX 1.x (SGML, balises non fermées) comme 2.x (XML) : on ne garde que les STMTTRN
+    operation = None
+    for ligne in texte:
+        for fermeture, balise, valeur in RE_BALISE_OFX.findall(ligne):
+            balise = balise.upper()
+            if balise == "STMTTRN":
+                if fermeture and operation is not None:
+                    if "TRNAMT" in operation and "DTPOSTED" in operation:
+                        try:
+                            d, montant = lire_date_ofx(operation["DTPOSTED"]), lire_montant(operation["TRNAMT"])
+                        except ValueError:
+                            montant = None
+                        if montant is None:
+                            compter_illisible(stats)
+                        else:
+                            yield {
+                                "date": d,
+                                "montant": montant,
+                                "libelle": " ".join(filter(None, (operation.get("NAME", ""), operation.get("MEMO", "")))),
+                                "reference": operation.get("FITID", ""),
+                            }
+                    operation = None
+                elif not fermeture:
+                    operation = {}
+            elif operation is not None and not fermeture:
+                operation[balise] = valeur.strip()
+
+def lire_releve(flux, nom_fichier="", stats=None):
+    # Une ligne illisible (date, montant) est écartée et comptée dans stats["illisibles"], la lecture continue.
+    # Le flux reste à l'appelant : l'enveloppe texte est détachée en fin de lecture (sinon son
+    # ramasse-miettes ferme l'UploadedFile).
+    texte = ouvrir_texte(flux)
+    try:
+        debut = texte.read(4096)
+        texte.seek(0)
+        if nom_fichier.lower().endswith((".ofx", ".qfx")) or "<OFX>" in debut.upper() or "OFXHEADER" in debut.upper():
+            yield from lignes_ofx(texte, stats)
+        else:
+            yield from lignes_csv(texte, stats)
+    finally:
+        texte.detach()
+
+# --- DOUBLONS ---
+class IndexDoublons:
+    # existants : (date, centimes, référence ou None). Un virement saisi à la main (sans référence)
+    # absorbe une seule ligne de relevé de même date et même montant.
+    # Occurrences comptées : la n-ième ligne identique d'un import n'est un doublon que si la base en a
+    # déjà n (deux loyers du même jour, même montant, même libellé sont deux virements).
+    def __init__(self, existants=()):
+        self.enregistres = Counter()
+        self.lus = Counter()
+        self.sans_reference = Counter()
+        for d, cts, ref in existants:
+            if ref: self.enregistres[(d, cts, ref)] += 1
+            else: self.sans_reference[(d, cts)] += 1
+
+    def nouveau(self, d, cts, ref):
+        cle = (d, cts, ref)
+        self.lus[cle] += 1
+        if self.lus[cle] <= self.enregistres[cle]: return False
+        if self.sans_reference[(d, cts)] > 0:
+            self.sans_reference[(d, cts)] -= 1
+            return False
+        return True
+
+def reference_operation(op):
+    # Sans référence bancaire, le libellé en tient lieu
+    return op["reference"] or op["libelle"] or None
+
+def credits_retenus(operations, emetteur=None):
+    motif = re.compile(emetteur, re.IGNORECASE) if emetteur else None
+    for op in operations:
+        if op["montant"] <= 0: continue
+        if motif and not motif.search(op["libelle"]): continue
+        yield op
+
+def nouvelles_stats():
+    return {"lus": 0, "credits": 0, "doublons": 0, "pre": 0, "post": 0, "sans_lot": 0, "illisibles": 0}
+
+# --- IMPORT DANS LA SESSION (un lot, applications Streamlit) ---
+def importer_dans_session(flux, nom_fichier, paiements_pre, paiements_post, emetteur=None):
+    # Ajoute aux virements de la session en place (moteur.Virements, triés par date) ;
+    # renvoie (stats, nouvelles lignes [(date, montant, référence)])
+    index = IndexDoublons((date.fromordinal(int(j)), int(c), None) for v in (paiements_pre, paiements_post)
+                          for j, c in zip(v.jours, v.centimes))
+    stats = nouvelles_stats()
+    nouvelles = []
+    def compter(operations):
+        for op in operations:
+            stats["lus"] += 1
+            yield op
+    for op in credits_retenus(compter(lire_releve(flux, nom_fichier, stats)), emetteur):
+        stats["credits"] += 1
+        ref = reference_operation(op)
+        if not index.nouveau(op["date"], en_centimes(op["montant"]), ref):
+            stats["doublons"] += 1
+            continue
+        if op["date"] <= DATE_JUGEMENT:
+            paiements_pre.ajouter(op["date"], op["montant"])
+            stats["pre"] += 1
+        else:
+            paiements_post.ajouter(op["date"], op["montant"])
+            stats["post"] += 1
+        nouvelles.append((op["date"], op["montant"], ref))
+    return stats, nouvelles
+
+# --- IMPORT DANS LA BASE (tous les lots, comptabilité) ---
+def importer_dans_base(flux, nom_fichier, lot=None, motif_lot=None, emetteur=None, cnx=None, taille_bloc=TAILLE_BLOC):
+    import stockage
+    cnx = cnx or stockage.connexion()
+    lots_connus = {l.upper(): l for l, _ in stockage.lister_lots(cnx)}
+    motif = re.compile(motif_lot, re.IGNORECASE) if motif_lot else None
+    index_par_lot = {}
+    stats = nouvelles_stats()
+    operations = lire_releve(flux, nom_fichier, stats)
+    while True:
+        bloc = list(islice(operations, taille_bloc))
+        if not bloc: break
+        stats["lus"] += len(bloc)
+        a_inserer = {}
+        for op in credits_retenus(bloc, emetteur):
+            stats["credits"] += 1
+            cible = lot
+            if motif:
+                trouve = motif.search(f"{op['libelle']} {op['reference']}")
+                cible = trouve.group(1) if trouve else None
+            cible = lots_connus.get(str(cible).upper())
+            if cible is None:
+                stats["sans_lot"] += 1
+                continue
+            if cible not in index_par_lot:
+                index_par_lot[cible] = IndexDoublons(stockage.cles_paiements_lot(cible, cnx))
+            ref = reference_operation(op)
+            if not index_par_lot[cible].nouveau(op["date"], en_centimes(op["montant"]), ref):
+                stats["doublons"] += 1
+                continue
+            a_inserer.setdefault(cible, []).append((op["date"], op["montant"], ref))
+            stats["pre" if op["date"] <= DATE_JUGEMENT else "post"] += 1
+        for cible, lignes in a_inserer.items():
+            stockage.ajouter_paiements(cible, lignes, cnx)
+    return stats
+
+def resume(stats):
+    return (f"{stats['lus']} lignes, {stats['credits']} crédits retenus : {stats['pre']} avant jugement, "
+            f"{stats['post']} après, {stats['doublons']} doublons ignorés"
+            + (f", {stats['sans_lot']} sans lot connu" if stats["sans_lot"] else "")
+            + (f", {stats['illisibles']} lignes illisibles ignorées" if stats["illisibles"] else ""))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import de relevés bancaires (CSV / OFX) dans la base des lots")
+    parser.add_argument("fichiers", nargs="+")
+    cible = parser.add_mutually_exclusive_group(required=True)
+    cible.add_argument("--lot", help="tous les crédits vont à ce lot")
+    cible.add_argument("--motif-lot", help="expression régulière dont le groupe 1 donne le lot (libellé + référence)")
+    parser.add_argument("--emetteur", help="expression régulière sur le libellé (ex. nom de l'administrateur)")
+    parser.add_argument("--base", help="fichier SQLite (défaut : ALBION_BASE)")
+    args = parser.parse_args(argv)
+    if args.motif_lot:
+        try:
+            groupes = re.compile(args.motif_lot).groups
+        except re.error as e:
+            parser.error(f"--motif-lot invalide : {e}")
+        if groupes < 1: parser.error("--motif-lot doit contenir un groupe entre parenthèses (le numéro de lot)")
+
+    import stockage
+    if not (args.base or stockage.chemin_base()): parser.error("indiquer la base : --base ou ALBION_BASE")
+    cnx = stockage.connexion(args.base)
+    erreurs = 0
+    for chemin in args.fichiers:
+        try:
+            with open(chemin, "rb") as f:
+                stats = importer_dans_base(f, chemin, args.lot, args.motif_lot, args.emetteur, cnx)
+            print(f"{chemin} : {resume(stats)}")
+        except (OSError, ValueError, csv.Error) as e:
+            erreurs += 1
+            print(f"{chemin} : {type(e).__name__}: {e}", file=sys.stderr)
+    return 1 if erreurs else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
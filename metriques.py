@@ -0,0 +1,77 @@
+import atexit
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# --- CHRONOMÉTRAGE DES PHASES (format Prometheus) ---
+# with mesure("cascade"): ...  -> histogramme albion_phase_duree_secondes{app=...,phase="cascade"}
+# Export : fichier texte Prometheus (collecteur "textfile" de node_exporter), réécrit au plus
+# toutes les INTERVALLE_EXPORT secondes. ALBION_METRIQUES_DIR="" désactive l'écriture du fichier.
+
+SEUILS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+INTERVALLE_EXPORT = 5.0
+
+_verrou = threading.Lock()
+_histogrammes = {}  # phase -> [compteurs par seuil (+Inf en dernier), somme, nombre]
+_etat = {"app": "albion", "dernier_export": 0.0}
+
+def configurer(app):
+    _etat["app"] = app
+
+def chemin_export():
+    repertoire = os.environ.get("ALBION_METRIQUES_DIR", tempfile.gettempdir())
+    if not repertoire: return None
+    return os.path.join(repertoire, f"albion_{_etat['app']}.prom")
+
+def enregistrer(phase, duree):
+    with _verrou:
+        h = _histogrammes.get(phase)
+        if h is None:
+            h = _histogrammes[phase] = [[0] * (len(SEUILS) + 1), 0.0, 0]
+        h[0][bisect_left(SEUILS, duree)] += 1
+        h[1] += duree
+        h[2] += 1
+        a_exporter = time.monotonic() - _etat["dernier_export"] > INTERVALLE_EXPORT
+        if a_exporter: _etat["dernier_export"] = time.monotonic()
+    if a_exporter: exporter()
+
+@contextmanager
+def mesure(phase):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        enregistrer(phase, time.perf_counter() - t0)
+
+def texte_prometheus():
+    nom = "albion_phase_duree_secondes"
+    lignes = [f"# HELP {nom} Duree des phases de calcul et de generation PDF.", f"# TYPE {nom} histogram"]
+    with _verrou:
+        instantane = {p: (list(h[0]), h[1], h[2]) for p, h in _histogrammes.items()}
+    for phase, (compteurs, somme, nombre) in sorted(instantane.items()):
+        labels = f'app="{_etat["app"]}",phase="{phase}"'
+        cumul = 0
+        for seuil, n in zip(SEUILS + (float("inf"),), compteurs):
+            cumul += n
+            le = "+Inf" if seuil == float("inf") else repr(seuil)
+            lignes.append(f'{nom}_bucket{{{labels},le="{le}"}} {cumul}')
+        lignes.append(f"{nom}_sum{{{labels}}} {somme:.6f}")
+        lignes.append(f"{nom}_count{{{labels}}} {nombre}")
+    return "\n".join(lignes) + "\n"
+
+def exporter(chemin=None):
+    chemin = chemin or chemin_export()
+    if not chemin: return
+    # Ecriture atomique : le collecteur ne lit jamais un fichier à moitié écrit
+    tmp = f"{chemin}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(texte_prometheus())
+        os.replace(tmp, chemin)
+    except OSError:
+        pass
+
+atexit.register(exporter)
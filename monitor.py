@@ -1,42 +1,27 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 from datetime import date, datetime, timedelta
-from fpdf import FPDF
 import json
 import io
-import matplotlib.pyplot as plt
-import tempfile
-import os
+from pdf_monitor import construire_relance_pdf
+from moteur import (DATE_JUGEMENT, INDEMNITE_FORFAITAIRE, tables, json_serial, lire_paiements,
+                    cle_paiements, depuis_cle_paiements, Virements, en_virements, en_ordinaux, fins_de_mois,
+                    FIN_SUIVI_POST_RJ, generer_echeancier_post_rj, indexer_monitor, imputer_au, arrieres_aux)
+from metriques import configurer, mesure
+import stockage
+from import_releves import importer_dans_session, resume
+from travaux import empreinte_travail, soumettre as soumettre_travail, etat as etat_travail, contenu as contenu_travail
 
 # --- CONFIGURATION ---
+configurer("monitor")
 st.set_page_config(page_title="Albion Monitor V2.7 (Official Data)", page_icon="📡", layout="wide")
 
 # --- CONSTANTES ---
-DATE_JUGEMENT = date(2025, 6, 26)
 DATE_DEBUT_BAIL = date(2019, 6, 1)
 DATE_PIVOT_INDEX = "01 Juin"
-INDEMNITE_FORFAITAIRE = 40.0
-
-# --- HISTORIQUE ILC (Mis à jour INSEE T4 2024) ---
-HISTORIQUE_ILC = [
-    {"Annee": 2019, "Indice": 114.06, "Note": "Base Contrat (T4 2018)"},
-    {"Annee": 2020, "Indice": 116.26, "Note": "Révision Juin 2020"},
-    {"Annee": 2021, "Indice": 118.41, "Note": "Révision Juin 2021"},
-    {"Annee": 2022, "Indice": 126.13, "Note": "Révision Juin 2022"},
-    {"Annee": 2023, "Indice": 133.62, "Note": "Révision Juin 2023"},
-    # VALEUR OFFICIELLE VERIFIEE (Publiée Mars 2025)
-    {"Annee": 2024, "Indice": 135.30, "Note": "Révision Juin 2024 (Ref T4 2023)"}, 
-    # PROJECTION T4 2024 POUR REVISION JUIN 2025 (Attention, ici on applique T4 2024)
-    # L'indice applicable en Juin 2025 est le T4 2024 (135.30).
-    # L'indice applicable en Juin 2026 sera le T4 2025 (Estimé ici à 137.50 pour l'exemple futur).
-    {"Annee": 2025, "Indice": 135.30, "Note": "Révision Juin 2025 (Ref T4 2024 - Officiel)"},
-]
 
 # --- UTILITAIRES ---
-def json_serial(obj):
-    if isinstance(obj, (datetime, date)): return obj.isoformat()
-    raise TypeError ("Type %s not serializable" % type(obj))
-
 def format_date_courte(d):
     if not isinstance(d, (date, datetime)): return ""
     return d.strftime("%d/%m/%Y")
@@ -46,265 +31,75 @@ def date_en_francais(d):
     mois = ["", "janvier", "février", "mars", "avril", "mai", "juin", "juillet", "août", "septembre", "octobre", "novembre", "décembre"]
     return f"{d.day} {mois[d.month]} {d.year}"
 
-# --- MOTEUR DE CALCUL ---
-def generer_echeancier_post_rj(montant_annuel_ht_base, indice_base, indice_revision):
-    coef = indice_revision / indice_base
-    annuel_indexe_ht = montant_annuel_ht_base * coef
-    annuel_indexe_ttc = annuel_indexe_ht * 1.10 
-    
-    echeances = []
-    
-    # Solde Juin 2025
-    montant_juin = (annuel_indexe_ttc / 365) * 4 
-    echeances.append({
-        "date": date(2025, 7, 10), 
-        "label": "Solde Juin 2025 (Prorata)", 
-        "montant": montant_juin,
-        "indice_used": indice_revision
-    })
-    
-    # T3 2025
-    echeances.append({
-        "date": date(2025, 10, 10), 
-        "label": "T3 2025 (Juil-Août-Sept)", 
-        "montant": annuel_indexe_ttc / 4,
-        "indice_used": indice_revision
-    })
-    
-    # T4 2025
-    echeances.append({
-        "date": date(2026, 1, 10), 
-        "label": "T4 2025 (Oct-Nov-Déc)", 
-        "montant": annuel_indexe_ttc / 4,
-        "indice_used": indice_revision
-    })
-    
-    # T1 2026
-    echeances.append({
-        "date": date(2026, 4, 10), 
-        "label": "T1 2026 (Jan-Fév-Mars)", 
-        "montant": annuel_indexe_ttc / 4,
-        "indice_used": indice_revision
-    })
-
-    return echeances, coef
-
-# --- GRAPHIQUE ---
-def create_debt_chart(data_rows):
-    labels = []
-    montants_dus = []
-    montants_payes = []
-    for row in data_rows:
-        if "Indemnité" not in row['label']:
-            short_label = row['raw_date'].strftime("%b %y")
-            labels.append(short_label)
-            montants_dus.append(row['montant'])
-            montants_payes.append(row['paye'])
-            
-    fig, ax = plt.subplots(figsize=(7, 3))
-    ax.bar(labels, montants_dus, color='#ffebee', edgecolor='#ef5350', label='Dû', width=0.6)
-    ax.bar(labels, montants_payes, color='#c8e6c9', edgecolor='#66bb6a', label='Payé', width=0.6)
-    ax.set_ylabel('Euros (€)', fontsize=8)
-    ax.set_title('VISUALISATION DES IMPAYES', fontsize=10, fontweight='bold')
-    ax.legend(fontsize=8)
-    ax.spines['top'].set_visible(False)
-    ax.spines['right'].set_visible(False)
-    plt.tight_layout()
-    return fig
-
-# --- PDF ---
-class PDFRelance(FPDF):
-    def __init__(self, user_info, sim_date):
-        super().__init__()
-        self.user_info = user_info
-        self.sim_date = sim_date
-        self.alias_nb_pages()
-
-    def header(self):
-        self.set_font('Arial', 'I', 8)
-        self.set_text_color(100, 100, 100)
-        self.cell(0, 10, f"Dossier de Recouvrement - HOTEL ALBION - Lot {self.user_info.get('lot', '?')}", 0, 1, 'R')
-        self.set_text_color(0, 0, 0)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Page {self.page_no()}/{{nb}}', 0, 0, 'C')
-
-    def generate_report(self, total_due, sub_loyer, sub_penalite, table_rows, history_payments, df_ilc):
-        # PAGE 1
-        self.add_page()
-        self.set_font("Arial", 'B', 14)
-        self.cell(0, 10, f"AUDIT DE SITUATION AU {self.sim_date}", 0, 1, 'C')
-        self.ln(5)
-
-        try:
-            fig = create_debt_chart(table_rows)
-            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_file:
-                fig.savefig(tmp_file.name, format="png", dpi=100)
-                tmp_path = tmp_file.name
-            self.image(tmp_path, x=10, w=190)
-            os.unlink(tmp_path)
-            self.ln(5)
-        except: pass
-
-        # ILC
-        self.set_fill_color(230, 240, 255)
-        self.set_font("Arial", 'B', 10)
-        self.cell(0, 7, "I. JUSTIFICATIF D'INDEXATION (Clause Echelle Mobile - Art. L145-39)", 1, 1, 'L', fill=True)
-        self.set_font("Arial", 'I', 8)
-        self.multi_cell(0, 5, "Conformement au bail, la revision du montant s'applique automatiquement le 1er JUIN de chaque annee en fonction de l'evolution de l'indice ILC.")
-        self.set_font("Arial", 'B', 8)
-        self.cell(30, 5, "Annee", 1, 0, 'C')
-        self.cell(40, 5, "Indice ILC", 1, 0, 'C')
-        self.cell(40, 5, "Coefficient", 1, 0, 'C')
-        self.cell(80, 5, "Reference", 1, 1, 'L')
-        self.set_font("Arial", '', 8)
-        base_val = 114.06 
-        for index, row in df_ilc.iterrows():
-            coef = row['Indice'] / base_val
-            self.cell(30, 5, str(int(row['Annee'])), 1, 0, 'C')
-            self.cell(40, 5, f"{row['Indice']:.2f}", 1, 0, 'C')
-            self.cell(40, 5, f"x {coef:.4f}", 1, 0, 'C')
-            self.cell(80, 5, str(row['Note']), 1, 1, 'L')
-        self.ln(5)
-
-        # PAIEMENTS
-        self.set_font("Arial", 'B', 10)
-        self.set_fill_color(240, 240, 240)
-        self.cell(0, 7, "II. HISTORIQUE DES VIREMENTS RECUS", 1, 1, 'L', fill=True)
-        if history_payments:
-            self.set_font("Arial", 'B', 9)
-            self.cell(50, 6, "Date Reception", 1)
-            self.cell(50, 6, "Montant", 1, 1)
-            self.set_font("Arial", '', 9)
-            total_history = 0
-            for p in history_payments:
-                d_str = p['date'].strftime("%d/%m/%Y")
-                self.cell(50, 6, d_str, 1)
-                self.cell(50, 6, f"{p['montant']:.2f} EUR", 1, 1, 'R')
-                total_history += p['montant']
-            self.set_font("Arial", 'B', 9)
-            self.cell(50, 6, "TOTAL PERCU", 1)
-            self.cell(50, 6, f"{total_history:.2f} EUR", 1, 1, 'R')
+# --- CACHE DU SUIVI (entre les reruns Streamlit) ---
+# Index des soldes à date, indépendant de la date de simulation : déplacer le curseur ne le reconstruit pas
+@st.cache_data(max_entries=64, show_spinner=False)
+def index_en_cache(loyer_annuel_ht, indice_base, indice_actuel, paiements_cle, fin=FIN_SUIVI_POST_RJ, indices_futurs=()):
+    with mesure("echeancier_post_rj"):
+        base_loyers, _ = generer_echeancier_post_rj(loyer_annuel_ht, indice_base, indice_actuel, fin, indices_futurs)
+    with mesure("index_monitor"):
+        return indexer_monitor(base_loyers, depuis_cle_paiements(paiements_cle))
+
+# --- SUIVI D'UN TRAVAIL PDF ---
+# Pendant le rendu, seul le fragment est réexécuté (interrogation toutes les 0,5 s) ;
+# dès que le PDF est prêt, un rerun complet arrête l'interrogation.
+def suivre_travail_pdf(ident, nom_fichier, libelle_bouton):
+    en_attente = not getattr(etat_travail(ident), "termine", True)
+
+    @st.fragment(run_every=0.5 if en_attente else None)
+    def suivi():
+        travail = etat_travail(ident)
+        if travail is None: return
+        if not travail.termine:
+            st.progress(travail.avancement, text=f"⏳ {travail.etape}…")
+        elif en_attente:
+            st.rerun()
+        elif travail.erreur:
+            st.error(f"Échec de la génération du PDF : {travail.erreur}")
         else:
-            self.set_font("Arial", 'I', 9)
-            self.cell(0, 6, "Aucun virement enregistre a ce jour.", 1, 1)
-        self.ln(5)
-
-        # PENALITES SEPAREES
-        self.set_font("Arial", 'B', 10)
-        self.cell(0, 7, "III. INDEMNITES DE RETARD (Ajoutees hors indexation)", 1, 1, 'L', fill=True)
-        self.set_font("Arial", '', 9)
-        has_penalty = False
-        for row in table_rows:
-            if "Indemnité" in row['label']:
-                has_penalty = True
-                self.cell(40, 6, row['raw_date'].strftime("%d/%m/%Y"), 1)
-                self.cell(110, 6, row['label'].replace("↪ ", ""), 1)
-                self.cell(40, 6, "40.00 EUR", 1, 1, 'R')
-        if not has_penalty: self.cell(190, 6, "Néant.", 1, 1)
-        
-        self.ln(10)
-        
-        self.set_fill_color(255, 235, 235)
-        self.set_font("Arial", 'B', 10)
-        self.cell(140, 6, "SOUS-TOTAL DETTE PRINCIPALE (Occupation) :", 1, 0, 'R', fill=True)
-        self.cell(50, 6, f"{sub_loyer:,.2f} EUR", 1, 1, 'R', fill=True)
-        self.cell(140, 6, "SOUS-TOTAL INDEMNITES FORFAITAIRES :", 1, 0, 'R', fill=True)
-        self.cell(50, 6, f"{sub_penalite:,.2f} EUR", 1, 1, 'R', fill=True)
-        
-        self.set_font("Arial", 'B', 14)
-        self.cell(140, 10, "TOTAL GENERAL EXIGIBLE :", 1, 0, 'R', fill=True)
-        self.cell(50, 10, f"{total_due:,.2f} EUR", 1, 1, 'R', fill=True)
-        
-        self.set_font("Arial", 'I', 8)
-        self.cell(0, 6, "(Suivant decompte et Mise en Demeure - Voir Page 2/2)", 0, 1, 'C')
-
-        # PAGE 2
-        self.add_page()
-        self.set_font("Arial", 'B', 11)
-        self.cell(0, 5, self.user_info.get('nom', ''), 0, 1)
-        self.set_font("Arial", '', 10)
-        self.cell(0, 5, f"Lot : {self.user_info.get('lot', '')}", 0, 1)
-        self.cell(0, 5, f"Email : {self.user_info.get('email', '')}", 0, 1)
-        self.ln(10)
-        self.set_font("Arial", 'B', 11)
-        self.cell(0, 5, "A l'attention de l'Administrateur Judiciaire", 0, 1, 'R')
-        self.ln(15)
-        self.set_font("Arial", 'B', 14)
-        self.cell(0, 10, "MISE EN DEMEURE DE PAYER SOUS HUITAINE", 0, 1, 'C')
-        self.set_font("Arial", 'B', 10)
-        self.cell(0, 5, "(Sommes Post-Jugement - Art. L.622-17 Code de commerce)", 0, 1, 'C')
-        self.ln(10)
-        
-        self.set_font("Arial", '', 10)
-        txt = ("Maitre,\n\n"
-               "Veuillez trouver en Page 1 l'audit complet de la situation comptable de mon lot.\n"
-               "Je constate a ce jour un solde debiteur exigible.\n\n"
-               "Conformement a l'Article 11 du bail, ces sommes etaient exigibles le 10 du mois. "
-               "L'Article L.622-17 I du Code de commerce impose leur paiement strict a l'echeance.\n\n"
-               "Je vous rappelle les dispositions contractuelles et legales :\n"
-               "- Art 4-10 (Non-tolerance) : Aucun retard passe ne vaut droit acquis.\n"
-               "- Art 15 (Frais) : Les frais de recouvrement sont a votre charge exclusive.\n"
-               "- Art L.441-10 : L'indemnite forfaitaire de 40 EUR est due de plein droit.\n\n"
-               "Les paiements recus ont ete imputes prioritairement sur les penalites (Art 1343-1 Code Civil).")
-        self.multi_cell(0, 5, txt.encode('latin-1', 'replace').decode('latin-1'))
-        self.ln(5)
-        
-        self.set_fill_color(255, 200, 200)
-        self.set_font("Arial", 'B', 9)
-        self.cell(0, 6, "RESTE A REGLER CE JOUR (DETAILS EN PAGE 1)", 1, 1, 'L', fill=True)
-        self.cell(25, 6, "Echeance", 1)
-        self.cell(65, 6, "Libelle", 1)
-        self.cell(20, 6, "Indice", 1)
-        self.cell(25, 6, "Montant", 1)
-        self.cell(25, 6, "Reste Du", 1, 1)
-        self.set_font("Arial", '', 8)
-        for row in table_rows:
-            if row['reste'] > 0.01:
-                if "Indemnité" in row['label']: 
-                    self.set_font("Arial", 'I', 8)
-                    indice_txt = "-"
-                else: 
-                    self.set_font("Arial", '', 8)
-                    indice_txt = f"{row['indice']:.2f}"
-                d_str = row['raw_date'].strftime("%d/%m/%Y")
-                self.cell(25, 6, d_str, 1)
-                self.cell(65, 6, row['label'][:40].encode('latin-1', 'replace').decode('latin-1'), 1)
-                self.cell(20, 6, indice_txt, 1, 0, 'C')
-                self.cell(25, 6, f"{row['montant']:.2f}", 1, 0, 'R')
-                self.cell(25, 6, f"{row['reste']:.2f}", 1, 1, 'R')
-        self.ln(5)
-        self.set_font("Arial", 'B', 12)
-        self.cell(0, 10, f"NET A PAYER : {total_due:,.2f} EUR", 0, 1, 'R')
-        self.ln(5)
-        self.set_font("Arial", '', 10)
-        self.multi_cell(0, 5, f"IBAN : {self.user_info.get('iban', '')}\nBIC : {self.user_info.get('bic', '')}")
-        self.ln(10)
-        self.cell(0, 10, "Signature :", 0, 1, 'R')
+            # Octets lus au clic seulement (le résultat peut être sur disque)
+            st.download_button(label=libelle_bouton, data=lambda: contenu_travail(ident), file_name=nom_fichier, mime="application/pdf")
+    suivi()
 
 # --- INTERFACE STREAMLIT ---
-if 'paiements' not in st.session_state: st.session_state.paiements = []
+# Virements en colonnes (moteur.Virements) ; un état d'une version antérieure est reconverti
+st.session_state.paiements = en_virements(st.session_state.get("paiements", Virements()))
+
+# BASE DES LOTS (SQLite, si ALBION_BASE est défini) : le monitor suit les virements post-RJ du lot
+base_active = stockage.chemin_base() is not None
+# Liste de tous les lots (identités, RIB) : poste de gestion seulement (stockage.ouverture_lots_active)
+lots_connus = [lot for lot, _ in stockage.lister_lots()] if stockage.ouverture_lots_active() else []
 
 # SIDEBAR
 with st.sidebar:
     st.title("🎛️ Simulation (2026)")
     date_simulation = st.date_input("Date 'Aujourd'hui' (Simulation)", value=date(2026, 1, 15))
+    date_projection = st.date_input("Échéancier jusqu'au", value=FIN_SUIVI_POST_RJ, min_value=DATE_JUGEMENT)
     
     st.divider()
     st.header("👤 Propriétaire")
-    id_nom = st.text_input("Nom", placeholder="M. Dupont")
-    id_lot = st.text_input("Lot", placeholder="A102")
-    id_iban = st.text_input("IBAN")
-    id_bic = st.text_input("BIC")
-    id_email = st.text_input("Email")
+    if lots_connus:
+        choix_lot = st.selectbox("🗄️ Ouvrir un lot enregistré", [""] + lots_connus)
+        if choix_lot and choix_lot != st.session_state.get("lot_ouvert"):
+            dossier = stockage.charger_monitor(choix_lot)
+            st.session_state.paiements = Virements.depuis_liste(dossier["paiements"])
+            st.session_state.loyer_base = dossier["loyer_base"]
+            st.session_state.info = dossier["info"]
+            st.session_state.lot_ouvert = choix_lot
+    info = st.session_state.get("info", {})
+    id_nom = st.text_input("Nom", value=info.get("nom", ""), placeholder="M. Dupont")
+    id_lot = st.text_input("Lot", value=info.get("lot", ""), placeholder="A102")
+    id_iban = st.text_input("IBAN", value=info.get("iban", ""))
+    id_bic = st.text_input("BIC", value=info.get("bic", ""))
+    id_email = st.text_input("Email", value=info.get("email", ""))
     
     st.divider()
     with st.expander("📈 Indexation & Preuves (ILC)", expanded=True):
         st.caption(f"Date pivot : {DATE_PIVOT_INDEX}")
-        st.markdown("**1. Historique ILC (Fixé)**")
-        df_ilc_defaut = pd.DataFrame(HISTORIQUE_ILC)
+        ref = tables()
+        if ref["erreur"]: st.warning(f"Tables non rechargées ({ref['erreur']}) : version {ref['version']} conservée.")
+        st.markdown(f"**1. Historique ILC (Fixé)** — version {ref['version']}")
+        df_ilc_defaut = pd.DataFrame(ref["historique_ilc"])
         df_ilc = st.data_editor(df_ilc_defaut, num_rows="dynamic", hide_index=True)
         
         try:
@@ -314,16 +109,19 @@ with st.sidebar:
             val_indice_actuel = row_actuel['Indice']
             coef = val_indice_actuel / val_indice_base
             st.success(f"Coef. Actif : {val_indice_actuel} / {val_indice_base} = **{coef:.4f}**")
+            # Lignes au-delà de 2025 : révisions des juins suivants (projection)
+            indices_futurs = tuple((int(r['Annee']), float(r['Indice'])) for _, r in df_ilc.iterrows() if r['Annee'] > 2025)
         except:
             st.error("Erreur indices.")
             val_indice_base = 114.06
             val_indice_actuel = 135.30
+            indices_futurs = ()
 
     st.divider()
     uploaded_file = st.file_uploader("Charger sauvegarde", type=["json"])
     if uploaded_file:
         data = json.load(uploaded_file)
-        st.session_state.paiements = [{"date": datetime.strptime(p["date"], "%Y-%m-%d").date(), "montant": p["montant"]} for p in data.get("paiements", [])]
+        st.session_state.paiements = Virements.depuis_liste(lire_paiements(data.get("paiements", [])))
         st.session_state.loyer_base = data.get("loyer_base", 0.0)
         id_nom = data.get("info", {}).get("nom", id_nom)
         st.success("Chargé !")
@@ -349,6 +147,27 @@ with col2:
 
 if loyer_annuel_ht == 0: st.stop()
 
+# Ecriture au fil de l'eau : seulement le lot ouvert (liste des lots ou bouton « Enregistrer » ci-dessous)
+lot_base = id_lot.strip()
+ecrire_base = base_active and bool(lot_base) and lot_base == st.session_state.get("lot_ouvert")
+fiche = (lot_base, id_nom, id_iban, id_bic, id_email, loyer_annuel_ht)
+identity_base = {"nom": id_nom, "iban": id_iban, "bic": id_bic, "email": id_email}
+# Nouveau lot : créé sur demande seulement (un numéro mal tapé ne crée pas de lot avec cette saisie)
+if base_active and lot_base and not ecrire_base:
+    if st.button(f"🗄️ Enregistrer le lot {lot_base} dans la base"):
+        if stockage.lot_existe(lot_base):
+            st.error(f"Le lot {lot_base} est déjà enregistré : vérifiez le numéro de lot.")
+        else:
+            stockage.enregistrer_dossier(lot_base, identity_base, loyer_annuel_ht, {"post": st.session_state.paiements})
+            st.session_state.fiche_ecrite = fiche
+            st.session_state.lot_ouvert = lot_base
+            ecrire_base = True
+            st.success(f"Lot {lot_base} enregistré : les saisies suivantes sont écrites dans la base.")
+
+if ecrire_base and st.session_state.get("fiche_ecrite") != fiche:
+    stockage.enregistrer_lot(lot_base, identity_base, loyer_annuel_ht)
+    st.session_state.fiche_ecrite = fiche
+
 st.divider()
 
 # GESTION PAIEMENTS
@@ -363,10 +182,24 @@ with c_pay_1:
             if d_pay <= DATE_JUGEMENT:
                 st.error("Date antérieure au jugement.")
             else:
-                st.session_state.paiements.append({"date": d_pay, "montant": m_pay})
-                st.session_state.paiements.sort(key=lambda x: x['date']) 
+                st.session_state.paiements.ajouter(d_pay, m_pay)
+                if ecrire_base: stockage.ajouter_paiement(lot_base, d_pay, m_pay)
                 st.rerun()
     
+    with st.expander("🏦 Importer un relevé (CSV / OFX)"):
+        releve = st.file_uploader("Relevé", type=["csv", "ofx", "qfx", "txt"], key="releve_monitor")
+        emetteur = st.text_input("Filtrer sur le libellé (émetteur, optionnel)", placeholder="ex. ALBION")
+        if releve and st.button("Importer les crédits"):
+            try:
+                # Le monitor ne suit que l'après-jugement : les crédits antérieurs sont écartés
+                stats, nouvelles = importer_dans_session(releve, releve.name, Virements(), st.session_state.paiements, emetteur or None)
+            except (ValueError, UnicodeError) as e:
+                st.error(f"Relevé illisible : {e}")
+            else:
+                nouvelles = [n for n in nouvelles if n[0] > DATE_JUGEMENT]
+                if ecrire_base and nouvelles: stockage.ajouter_paiements(lot_base, nouvelles)
+                st.success(resume(stats) + " (antérieurs au jugement écartés)")
+    
     if st.session_state.paiements:
         st.write("Historique :")
         disp_pay = []
@@ -374,85 +207,24 @@ with c_pay_1:
             disp_pay.append({"Date": format_date_courte(p["date"]), "Montant": f"{p['montant']:.2f} €"})
         st.dataframe(pd.DataFrame(disp_pay), hide_index=True)
         if st.button("Supprimer dernier paiement"):
-            st.session_state.paiements.pop()
+            p = st.session_state.paiements.retirer(-1)
+            if ecrire_base: stockage.supprimer_paiement(lot_base, p["date"], p["montant"])
             st.rerun()
 
 # CŒUR DU SYSTÈME
 with c_pay_2:
     st.subheader("📊 Tableau de Bord (Calculé)")
     
-    base_loyers, _ = generer_echeancier_post_rj(loyer_annuel_ht, val_indice_base, val_indice_actuel)
-    
-    all_debts = []
     today = date_simulation
-    
-    for item in base_loyers:
-        all_debts.append({
-            "date": item['date'],
-            "label": item['label'],
-            "montant": item['montant'],
-            "type": "PRINCIPAL",
-            "paye": 0.0,
-            "reste": item['montant'],
-            "date_paiement": None,
-            "indice": item['indice_used']
-        })
-        if today > item['date']:
-            date_penalite = item['date'] + timedelta(days=1)
-            all_debts.append({
-                "date": date_penalite, 
-                "label": f"↪ Indemnité (Retard {item['label']})",
-                "montant": INDEMNITE_FORFAITAIRE,
-                "type": "PENALITE", 
-                "paye": 0.0,
-                "reste": INDEMNITE_FORFAITAIRE,
-                "date_paiement": None,
-                "indice": 0
-            })
-            
-    debts_to_pay = sorted(all_debts, key=lambda x: (0 if x['type'] == 'PENALITE' else 1, x['date']))
-    
-    available_payments = [p.copy() for p in st.session_state.paiements] 
-    total_retard = 0
-    sub_retard_loyer = 0
-    sub_retard_penalite = 0
-    
-    for debt in debts_to_pay:
-        payment_date_for_this_debt = None
-        for pay in available_payments:
-            if pay['montant'] <= 0: continue 
-            if debt['reste'] <= 0: break 
-            
-            amount_taken = min(pay['montant'], debt['reste'])
-            pay['montant'] -= amount_taken
-            debt['reste'] -= amount_taken
-            debt['paye'] += amount_taken
-            payment_date_for_this_debt = pay['date']
-            
-        debt['date_paiement'] = payment_date_for_this_debt
-        debt['jours_retard'] = 0
-        target_date = debt['date']
-        
-        if debt['reste'] < 0.01 and debt['date_paiement']: 
-            delta = (debt['date_paiement'] - target_date).days
-            debt['jours_retard'] = max(0, delta)
-        elif today > target_date:
-            delta = (today - target_date).days
-            debt['jours_retard'] = max(0, delta)
-
-        if debt['reste'] > 0.01 and today > target_date:
-            total_retard += debt['reste']
-            if debt['type'] == 'PRINCIPAL':
-                sub_retard_loyer += debt['reste']
-            else:
-                sub_retard_penalite += debt['reste']
-
-    debts_display = sorted(debts_to_pay, key=lambda x: x['date'])
+    index = index_en_cache(loyer_annuel_ht, float(val_indice_base), float(val_indice_actuel),
+                           cle_paiements(st.session_state.paiements), date_projection, indices_futurs)
+    with mesure("imputation"):
+        debts_display, total_retard, sub_retard_loyer, sub_retard_penalite = imputer_au(index, today)
     
     final_rows = []
     for d in debts_display:
         statut = ""
-        if d['reste'] < 0.01: statut = "✅ PAYÉ"
+        if d['reste'] == 0: statut = "✅ PAYÉ"
         elif d['reste'] < d['montant']: statut = "🟠 PARTIEL"
         elif today < d['date']: statut = "⚪ À ÉCHOIR"
         else: statut = "🔴 IMPAYÉ"
@@ -496,8 +268,19 @@ with c_pay_2:
         use_container_width=True,
         hide_index=True
     )
+
+    with st.expander("📅 Retard exigible en fin de mois (virements reçus à date)"):
+        fins = fins_de_mois(DATE_JUGEMENT, date_projection)
+        total_fm, loyer_fm, penalite_fm = arrieres_aux(index, en_ordinaux(np.array(fins, dtype="datetime64[D]")), encaisses=True)
+        df_fm = pd.DataFrame({"Fin de mois": fins, "Loyers": loyer_fm / 100, "Pénalités": penalite_fm / 100, "Total": total_fm / 100})
+        st.bar_chart(df_fm, x="Fin de mois", y=["Loyers", "Pénalités"])
+        st.dataframe(df_fm, column_config={
+            "Loyers": st.column_config.NumberColumn("Loyers", format="%.2f €"),
+            "Pénalités": st.column_config.NumberColumn("Pénalités", format="%.2f €"),
+            "Total": st.column_config.NumberColumn("Total", format="%.2f €"),
+        }, hide_index=True)
     
-    if total_retard > 0.01:
+    if total_retard > 0:
         st.error(f"""
         ### ⚠️ RETARD EXIGIBLE TOTAL (Au {format_date_courte(today)}) : {total_retard:,.2f} €
         
@@ -506,32 +289,19 @@ with c_pay_2:
         * **Pénalités (40€) :** {sub_retard_penalite:,.2f} €
         """)
         
+        user_data = {"nom": id_nom, "lot": id_lot, "iban": id_iban, "bic": id_bic, "email": id_email}
+        totaux = (total_retard, sub_retard_loyer, sub_retard_penalite)
+        ilc_pdf = df_ilc.to_dict("records")
+        ident = empreinte_travail("relance", user_data, format_date_courte(today), debts_display, totaux,
+                                  st.session_state.paiements, ilc_pdf)
         if st.button("🔥 TÉLÉCHARGER MISE EN DEMEURE (PDF + GRAPH)"):
-            user_data = {"nom": id_nom, "lot": id_lot, "iban": id_iban, "bic": id_bic, "email": id_email}
-            pdf = PDFRelance(user_data, format_date_courte(today))
-            
-            rows_for_pdf = []
-            for r in final_rows:
-                rows_for_pdf.append({
-                    "date": r['raw_date'],
-                    "label": r['raw_label'],
-                    "montant": r['Montant'],
-                    "paye": r['Payé'], 
-                    "reste": r['Reste Dû'],
-                    "raw_date": r['raw_date'],
-                    "indice": r['indice']
-                })
-                
-            pdf.generate_report(total_retard, sub_retard_loyer, sub_retard_penalite, rows_for_pdf, st.session_state.paiements, df_ilc)
-            
-            st.download_button(
-                "📥 PDF Relance",
-                data=pdf.output(dest='S').encode('latin-1'),
-                file_name=f"Relance_Albion_{format_date_courte(today)}.pdf",
-                mime="application/pdf"
-            )
+            soumettre_travail(ident, construire_relance_pdf, user_data, format_date_courte(today), debts_display, totaux,
+                              st.session_state.paiements.en_liste(), pd.DataFrame(ilc_pdf), libelle=f"Relance {id_lot}")
+            st.session_state.travail_relance = ident
+        if st.session_state.get("travail_relance") == ident:
+            suivre_travail_pdf(ident, f"Relance_Albion_{format_date_courte(today)}.pdf", "📥 PDF Relance")
     else:
-        if sum(p['montant'] for p in st.session_state.paiements) > 0: 
+        if st.session_state.paiements.total() > 0: 
             st.success("✅ Compte à jour.")
 
 with st.sidebar:
@@ -0,0 +1,791 @@
+import hashlib
+import json
+import math
+import os
+import threading
+from bisect import bisect_right
+from functools import lru_cache
+from types import MappingProxyType
+import numpy as np
+from datetime import date, datetime, timedelta
+
+# --- CONSTANTES JURIDIQUES & DONNÉES ---
+DATE_JUGEMENT = date(2025, 6, 26)
+DATE_DEBUT_GRAPH = date(2019, 6, 1)
+INDEMNITE_FORFAITAIRE = 40.0
+
+# --- TABLES DE RÉFÉRENCE (tables_albion.json) ---
+# Taux légaux, indices ILC et historique ILC sont lus dans un fichier versionné ; le fichier est
+# relu dès que sa date de modification change (publication d'un nouveau semestre BCE sans
+# redémarrage). Chaque version est un InstantaneTables figé, remplacé d'une seule affectation :
+# un calcul prend l'instantané une fois (tables()["instantane"] ou paramètre instantane=) et ne
+# voit jamais un mélange de deux versions, même si un thread PDF tourne pendant le rechargement.
+FICHIER_TABLES = os.environ.get("ALBION_TABLES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tables_albion.json"))
+
+# Empreinte des tables : invalide les caches dès qu'un taux ou un indice change
+def version_table(table):
+    return hashlib.sha1(repr(table).encode("utf-8")).hexdigest()[:12]
+
+def lire_tables(chemin):
+    with open(chemin, encoding="utf-8") as f:
+        data = json.load(f)
+    taux = sorted(((datetime.strptime(d, "%Y-%m-%d").date(), float(t)) for d, t in data["taux_legaux"]), key=lambda x: x[0])
+    if not taux: raise ValueError("taux_legaux vide")
+    indices = {str(k): float(v) for k, v in data["indices"].items()}
+    if "BASE" not in indices: raise ValueError("indice BASE manquant")
+    historique = sorted(data.get("historique_ilc", []), key=lambda r: r["Annee"])
+    return {"version": str(data.get("version", "")), "taux_legaux": taux, "indices": indices, "historique_ilc": historique}
+
+_verrou_tables = threading.Lock()
+_etat_tables = {"signature": None, "erreur": None}
+
+class InstantaneTables:
+    # Une version des tables et ses dérivés (table cumulée des taux), en lecture seule
+    __slots__ = ("version", "version_taux", "version_indices", "taux_legaux", "indices", "historique_ilc",
+                 "dates_taux", "ordinal_debut", "cumul", "cumul_np", "taux_apres")
+
+    def __init__(self, t):
+        ordinal_debut, cumul = construire_cumul_taux(t["taux_legaux"])
+        cumul_np = np.asarray(cumul, dtype=np.int64)
+        cumul_np.flags.writeable = False
+        valeurs = {
+            # Empreintes calculées sur les tables telles que lues (listes, dict), avant leur conversion
+            "version": t["version"], "version_taux": version_table(t["taux_legaux"]), "version_indices": version_table(t["indices"]),
+            "taux_legaux": tuple(t["taux_legaux"]), "indices": MappingProxyType(dict(t["indices"])),
+            "historique_ilc": tuple(MappingProxyType(dict(r)) for r in t["historique_ilc"]),
+            "dates_taux": tuple(d for d, _ in t["taux_legaux"]), "ordinal_debut": ordinal_debut,
+            "cumul": tuple(cumul), "cumul_np": cumul_np, "taux_apres": round(t["taux_legaux"][-1][1] * 100),
+        }
+        for nom, valeur in valeurs.items():
+            object.__setattr__(self, nom, valeur)
+
+    def __setattr__(self, nom, valeur):
+        raise AttributeError("InstantaneTables est en lecture seule : installer_tables() pour changer de version")
+
+_TABLES = None
+
+def installer_tables(t):
+    global _TABLES
+    # Une seule affectation : un lecteur a l'ancienne version ou la nouvelle, jamais un mélange
+    _TABLES = InstantaneTables(t)
+
+def tables(chemin=None):
+    # Relit le fichier s'il a changé ; un fichier invalide laisse en place la version précédente
+    chemin = chemin or FICHIER_TABLES
+    try:
+        st = os.stat(chemin)
+        signature = (chemin, st.st_mtime_ns, st.st_size)
+    except OSError as e:
+        signature, erreur = None, e
+    if signature is not None and signature != _etat_tables["signature"]:
+        with _verrou_tables:
+            if signature != _etat_tables["signature"]:
+                try:
+                    installer_tables(lire_tables(chemin))
+                    _etat_tables["erreur"] = None
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    if _etat_tables["signature"] is None: raise
+                    _etat_tables["erreur"] = f"{os.path.basename(chemin)} : {e}"
+                _etat_tables["signature"] = signature
+    elif signature is None:
+        if _etat_tables["signature"] is None: raise erreur
+        _etat_tables["erreur"] = f"{os.path.basename(chemin)} : {erreur}"
+    instantane = _TABLES
+    return {"version": instantane.version, "version_taux": instantane.version_taux, "version_indices": instantane.version_indices,
+            "taux_legaux": instantane.taux_legaux, "indices": instantane.indices, "historique_ilc": instantane.historique_ilc,
+            "instantane": instantane, "erreur": _etat_tables["erreur"]}
+
+# Ordinal (date.toordinal) du 01/01/1970, origine des datetime64[D]
+ORDINAL_EPOCH = date(1970, 1, 1).toordinal()
+
+# --- UTILITAIRES ---
+def json_serial(obj):
+    if isinstance(obj, (datetime, date)): return obj.isoformat()
+    if isinstance(obj, Virements): return obj.en_liste()
+    raise TypeError ("Type %s not serializable" % type(obj))
+
+def lire_paiements(liste):
+    return [{"date": datetime.strptime(p["date"], "%Y-%m-%d").date(), "montant": p["montant"]} for p in liste]
+
+# --- VIREMENTS EN COLONNES (état de session Streamlit) ---
+# Deux tableaux au lieu d'une liste de dicts : jours (date.toordinal, int32) et montants en centimes (int64,
+# arrondis comme à l'entrée du grand livre), triés par date, ordre de saisie conservé à date égale.
+# Itérer produit les dicts {"date", "montant"} à la volée (moteur, PDF, base) sans les garder en session.
+# Clé de cache : octets des deux tableaux, relus sans copie par depuis_cle_paiements.
+# VERSION_VIREMENTS change avec le format ; un état de session d'une autre version est reconverti (en_virements).
+VERSION_VIREMENTS = 1
+
+class Virements:
+    def __init__(self, jours=(), centimes=()):
+        self.version = VERSION_VIREMENTS
+        self.jours = np.asarray(jours, dtype=np.int32)
+        self.centimes = np.asarray(centimes, dtype=np.int64)
+
+    @classmethod
+    def depuis_liste(cls, paiements):
+        paiements = list(paiements)
+        jours = np.array([p["date"].toordinal() for p in paiements], dtype=np.int32)
+        centimes = np.array([en_centimes(p["montant"]) for p in paiements], dtype=np.int64)
+        ordre = np.argsort(jours, kind="stable")
+        return cls(jours[ordre], centimes[ordre])
+
+    def __len__(self):
+        return len(self.jours)
+
+    def __iter__(self):
+        for j, c in zip(self.jours.tolist(), self.centimes.tolist()):
+            yield {"date": date.fromordinal(j), "montant": c / 100}
+
+    def __getitem__(self, i):
+        return {"date": date.fromordinal(int(self.jours[i])), "montant": int(self.centimes[i]) / 100}
+
+    def ajouter(self, d, montant):
+        # Après les virements du même jour (comme append puis tri stable)
+        i = int(np.searchsorted(self.jours, d.toordinal(), side="right"))
+        self.jours = np.insert(self.jours, i, d.toordinal())
+        self.centimes = np.insert(self.centimes, i, en_centimes(montant))
+
+    def retirer(self, i):
+        p = self[i]
+        self.jours = np.delete(self.jours, i)
+        self.centimes = np.delete(self.centimes, i)
+        return p
+
+    def total(self):
+        return int(self.centimes.sum()) / 100
+
+    def colonnes(self):
+        # Vues en lecture seule des deux tableaux, sans copie (ajouter / retirer remplacent les tableaux :
+        # une vue reste l'état au moment de l'appel)
+        jours, centimes = self.jours.view(), self.centimes.view()
+        jours.flags.writeable = False
+        centimes.flags.writeable = False
+        return {"jours": jours, "centimes": centimes}
+
+    def en_liste(self):
+        return list(self)
+
+    def cle(self):
+        return (self.version, self.jours.tobytes(), self.centimes.tobytes())
+
+def en_virements(paiements):
+    if isinstance(paiements, Virements) and paiements.version == VERSION_VIREMENTS: return paiements
+    return Virements.depuis_liste(paiements)
+
+# Clé hashable des virements (caches Streamlit)
+def cle_paiements(paiements):
+    return en_virements(paiements).cle()
+
+def depuis_cle_paiements(cle):
+    version, jours, centimes = cle
+    if version != VERSION_VIREMENTS: raise ValueError(f"clé de virements en version {version}")
+    return Virements(np.frombuffer(jours, dtype=np.int32), np.frombuffer(centimes, dtype=np.int64))
+
+# Format du bouton "Sauvegarder" de monitor.py (albion_monitor.json)
+def lire_sauvegarde_monitor(data):
+    return {
+        "loyer_base": data.get("loyer_base", 0.0),
+        "paiements": lire_paiements(data.get("paiements", [])),
+        "info": data.get("info", {}),
+    }
+
+# Format du bouton "SAUVEGARDER" de app.py (albion_backup.json)
+def lire_sauvegarde(data):
+    return {
+        "loyer": data.get("loyer", 0.0),
+        "paiements_pre": lire_paiements(data.get("paiements", [])),
+        "paiements_post": lire_paiements(data.get("paiements_post", [])),
+        "teom": data.get("teom", []),
+        "identity": data.get("identity", {}),
+    }
+
+def get_taux_legal(d, instantane=None):
+    instantane = instantane or _TABLES
+    i = bisect_right(instantane.dates_taux, d)
+    return instantane.taux_legaux[i - 1][1] if i else 10.00
+
+# --- TABLE CUMULÉE DES TAUX (taux x jours, en centièmes de %) ---
+# cumul[i] = somme des taux des jours [ordinal_debut, ordinal_debut + i[
+# Les intérêts sur un intervalle se lisent par différence de deux cases.
+def construire_cumul_taux(taux_legaux):
+    ordinal_debut = taux_legaux[0][0].toordinal()
+    ordinal_fin = taux_legaux[-1][0].toordinal()
+    cumul = [0] * (ordinal_fin - ordinal_debut + 1)
+    # Un taux par période [début, début suivant[ ; à date égale, la dernière ligne l'emporte
+    for (debut, taux), (suivant, _) in zip(taux_legaux, taux_legaux[1:]):
+        t = round(taux * 100)
+        for o in range(debut.toordinal(), suivant.toordinal()):
+            cumul[o - ordinal_debut + 1] = cumul[o - ordinal_debut] + t
+    return ordinal_debut, cumul
+
+_TAUX_AVANT = round(10.00 * 100)
+tables()
+
+# instantane=None : version courante des tables (une lecture par appel)
+def cumul_taux(d, instantane=None):
+    instantane = instantane or _TABLES
+    cumul = instantane.cumul
+    i = d.toordinal() - instantane.ordinal_debut
+    if i < 0: return i * _TAUX_AVANT
+    if i >= len(cumul): return cumul[-1] + (i - len(cumul) + 1) * instantane.taux_apres
+    return cumul[i]
+
+def calculer_interets_ligne(montant, date_depart, date_fin, instantane=None):
+    if date_depart >= date_fin: return 0.0
+    instantane = instantane or _TABLES
+    # montant * (taux / 100) * (jours / 365), taux exprimé en centièmes de %
+    return montant * (cumul_taux(date_fin, instantane) - cumul_taux(date_depart, instantane)) / 3650000
+
+# --- CALCUL PAR LOTS (NumPy) ---
+def en_ordinaux(dates):
+    # Accepte des date, des datetime64 ou des ordinaux entiers
+    arr = np.asarray(dates)
+    if np.issubdtype(arr.dtype, np.integer): return arr.astype(np.int64)
+    return arr.astype("datetime64[D]").astype(np.int64) + ORDINAL_EPOCH
+
+def cumul_taux_np(ordinaux, instantane=None):
+    instantane = instantane or _TABLES
+    cumul = instantane.cumul_np
+    i = np.asarray(ordinaux, dtype=np.int64) - instantane.ordinal_debut
+    n = len(cumul)
+    res = cumul[np.clip(i, 0, n - 1)]
+    res = np.where(i < 0, i * _TAUX_AVANT, res)
+    res = np.where(i >= n, cumul[-1] + (i - n + 1) * instantane.taux_apres, res)
+    return res
+
+def calculer_interets_lot(montants, dates_depart, dates_fin, instantane=None):
+    # Equivalent vectorisé de calculer_interets_ligne, ligne à ligne
+    instantane = instantane or _TABLES
+    montants = np.asarray(montants, dtype=np.float64)
+    o_dep = en_ordinaux(dates_depart)
+    o_fin = en_ordinaux(dates_fin)
+    delta = cumul_taux_np(o_fin, instantane) - cumul_taux_np(o_dep, instantane)
+    return np.where(o_fin > o_dep, montants * delta / 3650000, 0.0)
+
+# --- MONTANTS EN CENTIMES (entiers exacts) ---
+# Politique d'arrondi, la même partout (écran, PDF, traitements en masse) :
+# - montant saisi ou calculé en euros (loyer, virement, TEOM) : centime le plus proche, demi au-dessus,
+#   appliqué une fois à l'entrée du grand livre (en_centimes / en_centimes_np, mêmes opérations IEEE) ;
+# - intérêts : montant x (cumul des taux) / 3 650 000 en entiers, arrondi demi au-dessus, une fois par
+#   période entre deux mouvements ;
+# - additions, soustractions, imputations : exactes. Les euros affichés sont centimes / 100.
+def en_centimes(montant):
+    c = math.floor(abs(montant) * 100 + 0.5)
+    return -c if montant < 0 else c
+
+def en_centimes_np(montants):
+    montants = np.asarray(montants, dtype=np.float64)
+    return (np.sign(montants) * np.floor(np.abs(montants) * 100 + 0.5)).astype(np.int64)
+
+def en_euros(centimes):
+    return centimes / 100
+
+def diviser_arrondi(num, den):
+    # Division entière arrondie au plus proche, demi au-dessus (en valeur absolue)
+    q = (2 * abs(num) + den) // (2 * den)
+    return -q if num < 0 else q
+
+def calculer_interets_centimes(montant_cts, date_depart, date_fin, instantane=None):
+    if date_depart >= date_fin: return 0
+    instantane = instantane or _TABLES
+    return diviser_arrondi(montant_cts * (cumul_taux(date_fin, instantane) - cumul_taux(date_depart, instantane)), 3650000)
+
+def calculer_interets_lot_centimes(montants_cts, dates_depart, dates_fin, instantane=None):
+    # Equivalent vectorisé (int64) de calculer_interets_centimes ; pas de dépassement sous ~3e11 EUR x an
+    instantane = instantane or _TABLES
+    montants_cts = np.asarray(montants_cts, dtype=np.int64)
+    o_dep = en_ordinaux(dates_depart)
+    o_fin = en_ordinaux(dates_fin)
+    num = montants_cts * (cumul_taux_np(o_fin, instantane) - cumul_taux_np(o_dep, instantane))
+    q = (2 * np.abs(num) + 3650000) // 7300000
+    return np.where(o_fin > o_dep, np.sign(num) * q, 0)
+
+# --- ÉCHÉANCIER PAR RÈGLES ---
+# Une échéance par trimestre civil (appel le 10), loyer indexé au 1er juin, mois entamés au prorata.
+# niveaux : [(date d'effet, montant de référence, indice)] triés ; le niveau d'un mois est celui
+#   en vigueur le 1er du mois. Montant de référence mensuel (calcul="mensuel") ou annuel ("annuel").
+# terme="echoir" : trimestre appelé le 10 de son premier mois, mois reportés si l'appel précède le début ;
+# terme="echu"   : trimestre appelé le 10 du mois qui suit sa fin.
+# Générateur paresseux : fin=None produit des échéances sans limite (itertools.islice / takewhile).
+MOIS_FR = ["", "Janvier", "Février", "Mars", "Avril", "Mai", "Juin",
+           "Juillet", "Août", "Septembre", "Octobre", "Novembre", "Décembre"]
+MOIS_COURTS = ["", "Jan", "Fév", "Mars", "Avr", "Mai", "Juin", "Juil", "Août", "Sept", "Oct", "Nov", "Déc"]
+COEF_TVA = 1.10
+JOUR_ECHEANCE = 10
+PIVOT_INDEXATION = (6, 1)
+DEBUT_LOYERS = date(2019, 9, 1)
+FIN_SUIVI_POST_RJ = date(2026, 3, 31)
+
+def mois_suivant(annee, mois):
+    return (annee + 1, 1) if mois == 12 else (annee, mois + 1)
+
+# Plan d'un échéancier : dates, libellés et mois facturés par niveau, indépendants du montant du loyer.
+# Chaque entrée : (date, libellé, type, tranches ((rang du niveau, nb de mois), ...), jours du prorata)
+def iterer_plan(dates_effet, debut, fin, terme, libelle):
+    def tranches(groupe):
+        res = []
+        for _, rang in groupe:
+            if res and res[-1][0] == rang: res[-1][1] += 1
+            else: res.append([rang, 1])
+        return tuple(map(tuple, res))
+
+    annee, t = debut.year, (debut.month - 1) // 3
+    report = []
+    while fin is None or date(annee, 3 * t + 1, 1) <= fin:
+        pleins, trimestre = [], []
+        for mois in range(3 * t + 1, 3 * t + 4):
+            premier = date(annee, mois, 1)
+            dernier = date(*mois_suivant(annee, mois), 1) - timedelta(days=1)
+            du, au = max(premier, debut), dernier if fin is None else min(dernier, fin)
+            if du > au: continue
+            rang = bisect_right(dates_effet, premier) - 1
+            if du == premier and au == dernier:
+                pleins.append(((annee, mois), rang))
+                continue
+            if terme == "echu": d = date(*mois_suivant(annee, mois), JOUR_ECHEANCE)
+            else: d = du if du > premier else au
+            info = {"type": "prorata", "date": d, "annee": annee, "trimestre": t + 1, "mois": [mois],
+                    "jours": (au - du).days + 1, "debut": debut, "mixte": False}
+            trimestre.append((d, libelle(info), "prorata", ((rang, 1),), info["jours"]))
+        if terme == "echu": d = date(annee + (t == 3), 3 * ((t + 1) % 4) + 1, JOUR_ECHEANCE)
+        else: d = date(annee, 3 * t + 1, JOUR_ECHEANCE)
+        if pleins and terme == "echoir" and d < debut:
+            report += pleins
+        elif pleins:
+            groupe, report = report + pleins, []
+            if len(groupe) > len(pleins): type_ech = "regroupe"
+            elif len(pleins) == 3: type_ech = "trimestre"
+            else: type_ech = "partiel"
+            parts = tranches(groupe)
+            info = {"type": type_ech, "date": d, "annee": annee, "trimestre": t + 1,
+                    "mois": [m for (_, m), _ in groupe], "jours": None, "debut": debut, "mixte": len(parts) > 1}
+            trimestre.append((d, libelle(info), type_ech, parts, None))
+        trimestre.sort(key=lambda e: e[0])
+        yield from trimestre
+        annee, t = (annee + 1, 0) if t == 3 else (annee, t + 1)
+
+def libelle_type(info):
+    return info["type"]
+
+@lru_cache(maxsize=64)
+def plan_echeances(dates_effet, debut, fin, terme, libelle):
+    return tuple(iterer_plan(dates_effet, debut, fin, terme, libelle))
+
+def montant_echeance(valeurs, type_ech, parts, jours, calcul):
+    # Mêmes opérations flottantes que les échéanciers écrits à la main : niveau x mois, sommés dans l'ordre
+    if calcul == "annuel":
+        if type_ech == "prorata": return (valeurs[parts[0][0]] / 365) * jours
+        if type_ech == "trimestre" and len(parts) == 1: return valeurs[parts[0][0]] / 4
+        return sum((valeurs[r] / 12) * n for r, n in parts)
+    if type_ech == "prorata": return (valeurs[parts[0][0]] / 30) * jours
+    return sum(valeurs[r] * n for r, n in parts)
+
+def iterer_echeances(niveaux, debut, fin=None, terme="echoir", calcul="mensuel", libelle=None, avec_indice=False):
+    dates_effet = tuple(n[0] for n in niveaux)
+    valeurs = [n[1] for n in niveaux]
+    libelle = libelle or libelle_type
+    # Plan fini mis en cache (il ne dépend pas du loyer) ; sans fin, plan produit au fil de l'eau
+    plan = iterer_plan(dates_effet, debut, fin, terme, libelle) if fin is None else plan_echeances(dates_effet, debut, fin, terme, libelle)
+    for d, label, type_ech, parts, jours in plan:
+        ech = {"date": d, "label": label, "montant": montant_echeance(valeurs, type_ech, parts, jours, calcul)}
+        if avec_indice: ech["indice_used"] = niveaux[parts[-1][0]][2]
+        yield ech
+
+# Révision de juin N sur l'indice publié pour N-1, à la hausse seulement (juin 2021 : 115.79 < 116.16)
+def niveaux_loyer_mensuel(loyer_annuel_ht, indices=None):
+    indices = indices or _TABLES.indices
+    loyer_base_mensuel = loyer_annuel_ht * COEF_TVA / 12
+    niveaux = [(date.min, loyer_base_mensuel, indices["BASE"])]
+    for cle in sorted((k for k in indices if k.isdigit()), key=int):
+        if indices[cle] > niveaux[-1][2]:
+            niveaux.append((date(int(cle) + 1, *PIVOT_INDEXATION), loyer_base_mensuel * (indices[cle] / indices["BASE"]), indices[cle]))
+    return niveaux
+
+# --- MOTEUR 1 : PRÉ-RJ (loyers à échoir jusqu'au jugement) ---
+LIBELLES_PRE_RJ = {date(2020, 4, 10): "T2 2020 (Mixte)"}
+
+def libelle_pre_rj(info):
+    if info["date"] in LIBELLES_PRE_RJ: return LIBELLES_PRE_RJ[info["date"]]
+    if info["type"] == "regroupe": return f"Loyer {info['annee']} ({len(info['mois'])} mois TTC)"
+    if info["type"] == "partiel": return "-".join(MOIS_FR[m] for m in info["mois"]) + f" {info['annee']}"
+    if info["type"] == "prorata": return f"{MOIS_FR[info['mois'][0]]} {info['annee']} (Prorata {info['jours']}j)"
+    return f"T{info['trimestre']} {info['annee']}" + (" (Indexation)" if info["mixte"] else "")
+
+def iterer_loyers_pre_rj(loyer_annuel_ht, fin=DATE_JUGEMENT, indices=None):
+    return iterer_echeances(niveaux_loyer_mensuel(loyer_annuel_ht, indices), DEBUT_LOYERS, fin, "echoir", "mensuel", libelle_pre_rj)
+
+def generer_loyers_theoriques_pre_rj(loyer_annuel_ht, indices=None):
+    return list(iterer_loyers_pre_rj(loyer_annuel_ht, indices=indices))
+
+# --- MOTEUR 2 : POST-RJ (loyers échus à partir du lendemain du jugement) ---
+def libelle_post_rj(info):
+    d = info["date"]
+    payable = MOIS_FR[d.month] + (f" {d.year % 100:02d}" if d.year != info["debut"].year else "")
+    if info["type"] == "prorata": return f"Solde {MOIS_FR[info['mois'][0]]} {info['annee']} (Payable {payable})"
+    return f"T{info['trimestre']} {info['annee']} (Payable {payable})"
+
+def iterer_loyers_post_rj(loyer_annuel_ht, fin=FIN_SUIVI_POST_RJ, indices=None):
+    return iterer_echeances(niveaux_loyer_mensuel(loyer_annuel_ht, indices), DATE_JUGEMENT + timedelta(days=1), fin,
+                            "echu", "mensuel", libelle_post_rj)
+
+def generer_loyers_post_rj(loyer_annuel_ht, fin=FIN_SUIVI_POST_RJ, indices=None):
+    return list(iterer_loyers_post_rj(loyer_annuel_ht, fin, indices))
+
+# --- MOTEUR 3 : ÉCHÉANCIER MONITOR (POST-RJ INDEXÉ) ---
+def libelle_monitor(info):
+    if info["type"] == "prorata": return f"Solde {MOIS_FR[info['mois'][0]]} {info['annee']} (Prorata)"
+    mois = range(3 * info["trimestre"] - 2, 3 * info["trimestre"] + 1)
+    return f"T{info['trimestre']} {info['annee']} ({'-'.join(MOIS_COURTS[m] for m in mois)})"
+
+# indices_futurs : {année de révision : indice} au-delà de juin 2025 (projection)
+def niveaux_monitor(montant_annuel_ht_base, indice_base, indice_revision, indices_futurs=()):
+    coef = indice_revision / indice_base
+    niveaux = [(date.min, montant_annuel_ht_base * coef * COEF_TVA, indice_revision)]
+    for annee, indice in sorted(dict(indices_futurs).items()):
+        niveaux.append((date(annee, *PIVOT_INDEXATION), montant_annuel_ht_base * (indice / indice_base) * COEF_TVA, indice))
+    return niveaux, coef
+
+def iterer_echeancier_post_rj(montant_annuel_ht_base, indice_base, indice_revision, fin=FIN_SUIVI_POST_RJ, indices_futurs=()):
+    niveaux, _ = niveaux_monitor(montant_annuel_ht_base, indice_base, indice_revision, indices_futurs)
+    return iterer_echeances(niveaux, DATE_JUGEMENT + timedelta(days=1), fin, "echu", "annuel", libelle_monitor, avec_indice=True)
+
+def generer_echeancier_post_rj(montant_annuel_ht_base, indice_base, indice_revision, fin=FIN_SUIVI_POST_RJ, indices_futurs=()):
+    echeances = list(iterer_echeancier_post_rj(montant_annuel_ht_base, indice_base, indice_revision, fin, indices_futurs))
+    return echeances, indice_revision / indice_base
+
+# --- CASCADE PRÉ-RJ (Art. 1343-1 CC : imputation sur les intérêts d'abord) ---
+def calculer_cascade_pre_rj(loyer_annuel_ht, paiements_pre, date_arret=DATE_JUGEMENT, echeances=None, instantane=None):
+    # Échéances (indices) et intérêts (taux) lus dans le même instantané des tables
+    instantane = instantane or _TABLES
+    if echeances is None: echeances = iterer_loyers_pre_rj(loyer_annuel_ht, indices=instantane.indices)
+    events = []
+    nb_echeances = 0
+    for ech in echeances:
+        events.append({"date": ech["date"], "type": "LOYER", "montant": en_centimes(ech["montant"]), "label": ech["label"]})
+        nb_echeances += 1
+    for p in paiements_pre:
+        events.append({"date": p["date"], "type": "PAIEMENT", "montant": en_centimes(p["montant"]), "label": "Virement"})
+
+    events.sort(key=lambda x: x["date"])
+
+    # Soldes en centimes
+    solde_princ = 0
+    solde_int = 0
+    last_date = events[0]["date"] if events else DATE_DEBUT_GRAPH
+    data_detail = []
+
+    for ev in events:
+        curr = ev["date"]
+        if curr > last_date and solde_princ > 0:
+            solde_int += calculer_interets_centimes(solde_princ, last_date, curr, instantane)
+
+        montant = ev["montant"]
+        if ev["type"] == "LOYER":
+            solde_princ += montant
+            data_detail.append({"Date": curr, "Lib": ev["label"], "Debit": montant / 100, "Credit": 0, "Imp_Princ": 0.0, "R_Princ": solde_princ / 100, "R_Int": solde_int / 100})
+        else:
+            imp_int = min(montant, solde_int)
+            solde_int -= imp_int
+            imp_princ = montant - imp_int
+            solde_princ -= imp_princ
+            data_detail.append({"Date": curr, "Lib": "Paiement", "Debit": 0, "Credit": montant / 100, "Imp_Princ": -imp_princ / 100, "R_Princ": solde_princ / 100, "R_Int": solde_int / 100})
+        last_date = curr
+
+    if last_date < date_arret and solde_princ > 0:
+        solde_int += calculer_interets_centimes(solde_princ, last_date, date_arret, instantane)
+
+    princ_net = max(0, solde_princ) / 100
+    int_net = max(0, solde_int) / 100
+    indemnite = nb_echeances * en_centimes(INDEMNITE_FORFAITAIRE) / 100
+    return data_detail, princ_net, int_net, indemnite
+
+# --- SÉRIE QUOTIDIENNE (principal et intérêts dus chaque jour) ---
+# Soldes à date (indexer_cascade) de tous les jours de la période, en une passe vectorisée.
+# Aux dates de mouvement et à date_arret, mêmes centimes que la cascade.
+def serie_quotidienne(data_detail, fin=DATE_JUGEMENT, debut=None, instantane=None):
+    # Renvoie (jours datetime64[D], principal en centimes, intérêts en centimes)
+    if debut is None: debut = data_detail[0]["Date"] if data_detail else fin
+    jours = np.arange(debut.toordinal(), fin.toordinal() + 1, dtype=np.int64)
+    dates = (jours - ORDINAL_EPOCH).astype("datetime64[D]")
+    if not data_detail:
+        return dates, np.zeros(len(jours), dtype=np.int64), np.zeros(len(jours), dtype=np.int64)
+    p, i = soldes_aux(indexer_cascade(data_detail), jours, instantane)
+    return dates, p, i
+
+# --- SUIVI POST-RJ (Onglet 2) ---
+def suivre_loyers_post_rj(loyer_annuel_ht, paiements_post, aujourd_hui, echeances_post=None, indices=None):
+    if echeances_post is None: echeances_post = iterer_loyers_post_rj(loyer_annuel_ht, indices=indices)
+    # Centimes
+    solde_disponible = sum(en_centimes(p["montant"]) for p in paiements_post)
+    table_rows = []
+    total_a_reclamer = 0
+
+    for ech in echeances_post:
+        montant_du = en_centimes(ech["montant"])
+        paye = min(montant_du, solde_disponible)
+        solde_disponible -= paye
+        reste = montant_du - paye
+
+        status = ""
+        if reste == 0: status = "🟢 PAYÉ"
+        elif paye > 0: status = "🟠 PARTIEL"
+        elif ech["date"] <= aujourd_hui: status = "🔴 IMPAYÉ"
+        else: status = "⚪ À ÉCHOIR"
+
+        if ech["date"] <= aujourd_hui:
+            total_a_reclamer += reste
+
+        table_rows.append({
+            "Échéance": ech["date"],
+            "Libellé": ech["label"],
+            "Montant": montant_du / 100,
+            "Payé": paye / 100,
+            "Reste Dû": reste / 100,
+            "Statut": status
+        })
+
+    return table_rows, total_a_reclamer / 100
+
+# --- IMPUTATION MONITOR (pénalités d'abord, puis principal par date) ---
+def imputer_paiements_monitor(base_loyers, paiements, today):
+    all_debts = []
+    for item in base_loyers:
+        all_debts.append({
+            "date": item['date'],
+            "label": item['label'],
+            "montant": en_centimes(item['montant']),
+            "type": "PRINCIPAL",
+            "paye": 0,
+            "reste": en_centimes(item['montant']),
+            "date_paiement": None,
+            "indice": item['indice_used']
+        })
+        if today > item['date']:
+            date_penalite = item['date'] + timedelta(days=1)
+            all_debts.append({
+                "date": date_penalite,
+                "label": f"↪ Indemnité (Retard {item['label']})",
+                "montant": en_centimes(INDEMNITE_FORFAITAIRE),
+                "type": "PENALITE",
+                "paye": 0,
+                "reste": en_centimes(INDEMNITE_FORFAITAIRE),
+                "date_paiement": None,
+                "indice": 0
+            })
+
+    debts_to_pay = sorted(all_debts, key=lambda x: (0 if x['type'] == 'PENALITE' else 1, x['date']))
+
+    # Curseur sur les virements : chaque dette consomme les virements dans l'ordre,
+    # un virement épuisé n'est plus jamais relu (coût linéaire dettes + paiements).
+    # Imputation en centimes ; montant / payé / reste repassent en euros à la fin.
+    restes_paiements = [en_centimes(p['montant']) for p in paiements]
+    nb_paiements = len(restes_paiements)
+    curseur = 0
+    total_retard = 0
+    sub_retard_loyer = 0
+    sub_retard_penalite = 0
+
+    for debt in debts_to_pay:
+        payment_date_for_this_debt = None
+        while debt['reste'] > 0 and curseur < nb_paiements:
+            disponible = restes_paiements[curseur]
+            if disponible <= 0:
+                curseur += 1
+                continue
+
+            amount_taken = min(disponible, debt['reste'])
+            restes_paiements[curseur] = disponible - amount_taken
+            debt['reste'] -= amount_taken
+            debt['paye'] += amount_taken
+            payment_date_for_this_debt = paiements[curseur]['date']
+
+        debt['date_paiement'] = payment_date_for_this_debt
+        debt['jours_retard'] = 0
+        target_date = debt['date']
+
+        if debt['reste'] == 0 and debt['date_paiement']:
+            delta = (debt['date_paiement'] - target_date).days
+            debt['jours_retard'] = max(0, delta)
+        elif today > target_date:
+            delta = (today - target_date).days
+            debt['jours_retard'] = max(0, delta)
+
+        if debt['reste'] > 0 and today > target_date:
+            total_retard += debt['reste']
+            if debt['type'] == 'PRINCIPAL':
+                sub_retard_loyer += debt['reste']
+            else:
+                sub_retard_penalite += debt['reste']
+
+        for cle in ('montant', 'paye', 'reste'): debt[cle] /= 100
+
+    debts_display = sorted(debts_to_pay, key=lambda x: x['date'])
+    return debts_display, total_retard / 100, sub_retard_loyer / 100, sub_retard_penalite / 100
+
+# --- SOLDES À DATE (index par lot, construit une fois) ---
+# "Que devait-on au jour J ?" sans rejouer le grand livre : l'index garde les dates triées et des cumuls,
+# une requête coûte une bisection (searchsorted) et, pour la cascade, une différence de cumul_taux.
+# Les fonctions *_aux acceptent un tableau d'ordinaux (un rapport de fin de mois en une passe).
+
+# Cascade pré-RJ : soldes après chaque mouvement (data_detail) ; le jour J reprend le dernier
+# mouvement <= J et y ajoute les intérêts courus depuis (mêmes centimes que la cascade arrêtée à J).
+def indexer_cascade(data_detail):
+    return {
+        "dates": en_ordinaux(np.array([r["Date"] for r in data_detail], dtype="datetime64[D]")),
+        "principal": en_centimes_np([r["R_Princ"] for r in data_detail]),
+        "interets": en_centimes_np([r["R_Int"] for r in data_detail]),
+    }
+
+def soldes_aux(index, jours, instantane=None):
+    # Renvoie (principal, intérêts) en centimes au soir de chaque jour
+    jours = np.asarray(jours, dtype=np.int64)
+    if not len(index["dates"]): return np.zeros_like(jours), np.zeros_like(jours)
+    k = np.searchsorted(index["dates"], jours, side="right") - 1
+    avant = k < 0
+    k = np.maximum(k, 0)
+    p = np.where(avant, 0, index["principal"][k])
+    courus = calculer_interets_lot_centimes(np.maximum(p, 0), index["dates"][k], jours, instantane)
+    return p, np.where(avant, 0, index["interets"][k] + courus)
+
+def solde_au(index, d, instantane=None):
+    # (principal, intérêts) dus au jour d, en euros ; un trop-versé compte pour zéro, comme la cascade
+    p, i = soldes_aux(index, [d.toordinal()], instantane)
+    return max(0, int(p[0])) / 100, max(0, int(i[0])) / 100
+
+# Monitor : l'imputation (pénalités d'abord, puis principal par date) ne dépend du jour J que par le
+# nombre d'échéances passées (une pénalité chacune) ; les arriérés se lisent sur les cumuls.
+# base_loyers trié par date ; virements dans l'ordre de saisie (ordre du curseur), négatifs ignorés.
+def indexer_monitor(base_loyers, paiements):
+    montants = np.array([en_centimes(e["montant"]) for e in base_loyers], dtype=np.int64)
+    if isinstance(paiements, Virements):
+        virements, o_virements = np.maximum(0, paiements.centimes), paiements.jours.astype(np.int64)
+    else:
+        virements = np.maximum(0, np.array([en_centimes(p["montant"]) for p in paiements], dtype=np.int64))
+        o_virements = en_ordinaux(np.array([p["date"] for p in paiements], dtype="datetime64[D]"))
+    ordre = np.argsort(o_virements, kind="stable")
+    return {
+        "echeances": base_loyers,
+        "dates": en_ordinaux(np.array([e["date"] for e in base_loyers], dtype="datetime64[D]")),
+        "montants": montants,
+        "cumul": np.r_[0, np.cumsum(montants)],
+        "virements": o_virements,
+        "cumul_virements": np.cumsum(virements),
+        "dates_encaissement": o_virements[ordre],
+        "cumul_encaisse": np.r_[0, np.cumsum(virements[ordre])],
+    }
+
+def arrieres_aux(index, jours, encaisses=False):
+    # (total, loyers, pénalités) exigibles au jour J, en centimes ; encaisses=True : seuls les virements
+    # reçus au plus tard le jour J sont imputés (sinon tous, comme imputer_paiements_monitor)
+    jours = np.asarray(jours, dtype=np.int64)
+    penalite = en_centimes(INDEMNITE_FORFAITAIRE)
+    if encaisses:
+        masse = index["cumul_encaisse"][np.searchsorted(index["dates_encaissement"], jours, side="right")]
+    else:
+        masse = index["cumul_encaisse"][-1]
+    passees = np.searchsorted(index["dates"], jours, side="left")
+    # Pénalité exigible le lendemain de sa date (échéance + 1 jour)
+    penalites_exigibles = np.searchsorted(index["dates"], jours - 1, side="left")
+    loyers = np.maximum(0, index["cumul"][passees] - np.maximum(0, masse - penalite * passees))
+    penalites = np.maximum(0, penalite * penalites_exigibles - masse)
+    return loyers + penalites, loyers, penalites
+
+def arrieres_au(index, today, encaisses=False):
+    total, loyers, penalites = arrieres_aux(index, [today.toordinal()], encaisses)
+    return int(total[0]) / 100, int(loyers[0]) / 100, int(penalites[0]) / 100
+
+def fins_de_mois(debut, fin):
+    # Derniers jours des mois compris entre debut et fin (bornes incluses)
+    res = []
+    annee, mois = debut.year, debut.month
+    while True:
+        d = date(*mois_suivant(annee, mois), 1) - timedelta(days=1)
+        if d > fin: return res
+        if d >= debut: res.append(d)
+        annee, mois = mois_suivant(annee, mois)
+
+def imputer_au(index, today):
+    # Même résultat que imputer_paiements_monitor(base_loyers, paiements, today), sans curseur :
+    # chaque dette occupe une tranche du flux des virements (pénalités, puis loyers par date)
+    t = today.toordinal()
+    echeances = index["echeances"]
+    penalite = en_centimes(INDEMNITE_FORFAITAIRE)
+    k = int(np.searchsorted(index["dates"], t, side="left"))
+    dates = np.r_[index["dates"][:k] + 1, index["dates"]]
+    montant = np.r_[np.full(k, penalite, dtype=np.int64), index["montants"]]
+    debut = np.r_[np.arange(k, dtype=np.int64) * penalite, k * penalite + index["cumul"][:-1]]
+    cumul_v = index["cumul_virements"]
+    paye = np.clip((cumul_v[-1] if len(cumul_v) else 0) - debut, 0, montant)
+    reste = montant - paye
+    # Dernier virement entamé par la dette : celui où se termine sa tranche payée
+    j = np.minimum(np.searchsorted(cumul_v, debut + paye, side="left"), max(0, len(cumul_v) - 1))
+    date_paiement = index["virements"][j] if len(cumul_v) else np.zeros_like(dates)
+    soldee = (reste == 0) & (paye > 0)
+    jours_retard = np.where(soldee, np.maximum(0, date_paiement - dates), np.maximum(0, t - dates))
+
+    dettes = []
+    for n in range(len(dates)):
+        ech = echeances[n - k] if n >= k else echeances[n]
+        dettes.append({
+            "date": date.fromordinal(int(dates[n])),
+            "label": ech["label"] if n >= k else f"↪ Indemnité (Retard {ech['label']})",
+            "montant": int(montant[n]) / 100,
+            "type": "PRINCIPAL" if n >= k else "PENALITE",
+            "paye": int(paye[n]) / 100,
+            "reste": int(reste[n]) / 100,
+            "date_paiement": date.fromordinal(int(date_paiement[n])) if paye[n] > 0 else None,
+            "indice": ech["indice_used"] if n >= k else 0,
+            "jours_retard": int(jours_retard[n]),
+        })
+    return (sorted(dettes, key=lambda x: x["date"]), *arrieres_au(index, today))
+
+# --- SÉRIES POUR LES GRAPHIQUES (taille bornée) ---
+# Seaux min/max : par seau, premier, dernier, minimum et maximum de chaque série (au plus 4 points).
+# Une courbe en escalier garde ses paliers extrêmes et ses bornes ; la taille ne dépend plus du nombre d'événements.
+POINTS_GRAPHIQUE = 800
+
+def indices_min_max(valeurs, nb_seaux):
+    valeurs = np.asarray(valeurs, dtype=np.float64)
+    n = len(valeurs)
+    seau = np.arange(n) * nb_seaux // n
+    debuts = np.flatnonzero(np.r_[True, seau[1:] != seau[:-1]])
+    fins = np.r_[debuts[1:], n] - 1
+    # lexsort stable : dans chaque seau, premier indice du min (resp. du max)
+    par_min = np.lexsort((valeurs, seau))
+    par_max = np.lexsort((-valeurs, seau))
+    return np.unique(np.concatenate([debuts, fins, par_min[debuts], par_max[debuts]]))
+
+def reduire_series(colonnes, budget=POINTS_GRAPHIQUE):
+    # colonnes : séries de même longueur (même axe) ; renvoie les indices à garder, triés
+    n = len(colonnes[0]) if colonnes else 0
+    if n <= budget: return np.arange(n)
+    nb_seaux = max(1, budget // (4 * len(colonnes)))
+    return np.unique(np.concatenate([indices_min_max(c, nb_seaux) for c in colonnes]))
+
+# --- TOTAUX (sommés en centimes : l'écran et le PDF affichent le même centime) ---
+def somme_euros(montants):
+    return sum(en_centimes(m) for m in montants) / 100
+
+def total_teom(teom_list):
+    return somme_euros(t['montant'] for t in teom_list)
+
+def total_creance(princ_net, int_net, indemnite, teom):
+    return somme_euros((princ_net, int_net, indemnite, teom))
+
+# --- SYNTHÈSE D'UN LOT (déclaration pré-RJ + suivi post-RJ) ---
+def synthese_dossier(dossier, aujourd_hui):
+    loyer_ht = dossier["loyer"]
+    _, princ_net, int_net, indemnite = calculer_cascade_pre_rj(loyer_ht, dossier["paiements_pre"])
+    teom = total_teom(dossier["teom"])
+    _, reste_exigible = suivre_loyers_post_rj(loyer_ht, dossier["paiements_post"], aujourd_hui)
+    return {
+        "lot": dossier["identity"].get("lot", ""),
+        "nom": dossier["identity"].get("nom", ""),
+        "loyer_ht": loyer_ht,
+        "principal": princ_net,
+        "interets": int_net,
+        "indemnites": indemnite,
+        "teom": teom,
+        "total_declare": total_creance(princ_net, int_net, indemnite, teom),
+        "reste_exigible": reste_exigible,
+    }
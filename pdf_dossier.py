@@ -0,0 +1,541 @@
+import io
+import re
+import tempfile
+import numpy as np
+from datetime import date, datetime
+from functools import lru_cache
+import fpdf
+from fpdf import FPDF
+from pypdf import PdfWriter
+from images import empreinte, preparer_images, inserer_image
+from metriques import mesure
+from moteur import tables, somme_euros, total_creance, total_teom as somme_teom, serie_quotidienne
+
+# La notice réutilisée (flux des pages, numéros de police) et inserer_image écrivent dans les structures
+# internes de FPDF 1.7.2 : une autre version (fpdf2 compris) est refusée à l'import, pas de PDF corrompu
+VERSION_FPDF = "1.7.2"
+if getattr(fpdf, "__version__", None) != VERSION_FPDF:
+    raise ImportError(f"pdf_dossier requiert fpdf {VERSION_FPDF} (installé : {getattr(fpdf, '__version__', 'inconnu')}) : "
+                      f"pip install fpdf=={VERSION_FPDF}")
+
+# ==========================================
+# CLASS PDF 1 : LE DOSSIER COMPLET
+# ==========================================
+class DossierJuridiquePDF(FPDF):
+    def __init__(self, user_info):
+        super().__init__()
+        self.user_info = user_info
+        
+    def header(self):
+        self.set_font('Arial', 'I', 8)
+        self.set_text_color(100, 100, 100)
+        self.cell(0, 8, f"Dossier Creance - HOTEL ALBION - Lot {self.user_info.get('lot', '?')}", 0, 0, 'L')
+        self.cell(0, 8, f"Proprietaire : {self.user_info.get('nom', 'N/A')}", 0, 1, 'R')
+        self.ln(2)
+        self.set_text_color(0, 0, 0)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+
+    def generate_page_1_courrier(self, total_principal, total_interets, total_teom, total_indemnite):
+        self.add_page()
+        self.set_font("Arial", 'B', 11)
+        
+        # INFO EXPEDITEUR
+        self.cell(0, 5, f"{self.user_info.get('nom', '').upper()}", 0, 1)
+        self.set_font("Arial", '', 10)
+        self.cell(0, 5, f"Lot n {self.user_info.get('lot', '')}", 0, 1)
+        self.cell(0, 5, f"Tel : {self.user_info.get('tel', '')}", 0, 1)
+        self.cell(0, 5, f"Email : {self.user_info.get('email', '')}", 0, 1)
+        
+        self.ln(15)
+        self.set_font("Arial", 'B', 11)
+        self.cell(0, 5, "A l'attention du Mandataire Judiciaire", 0, 1, 'R')
+        self.cell(0, 5, "Etude de Maitre [NOM DU MANDATAIRE]", 0, 1, 'R')
+        self.cell(0, 5, "[ADRESSE MANDATAIRE]", 0, 1, 'R')
+        
+        self.ln(20)
+        self.set_font("Arial", 'B', 12)
+        self.cell(0, 10, "Objet : CONTESTATION D'ETAT DES CREANCES - HOTEL ALBION", 0, 1, 'L')
+        
+        self.ln(5)
+        self.set_font("Arial", '', 11)
+        intro = ("Maitre,\n\n"
+                 "Je fais suite a la verification des creances et je conteste formellement le montant retenu "
+                 "par vos services. Veuillez trouver ci-joint ma declaration rectificative.\n\n"
+                 "1. J'applique les penalites de retard contractuelles et legales (Art. L.441-10 du Code de Commerce).\n"
+                 "2. Je reclame le remboursement de la TEOM (Taxe d'Enlevement des Ordures Menageres).\n")
+        
+        self.multi_cell(0, 6, intro.encode('latin-1', 'replace').decode('latin-1'))
+        
+        self.set_font("Arial", 'B', 11)
+        mention_3 = ("3. En application de l'art. 1353 du Code Civil, je mets le debiteur en demeure de produire "
+                     "les releves de compte bancaires certifies attestant du debit des sommes qu'il pretend avoir versees. "
+                     "Une simple ecriture comptable interne ne saurait constituer une preuve de paiement opposable.")
+        self.multi_cell(0, 6, mention_3.encode('latin-1', 'replace').decode('latin-1'))
+        
+        self.ln(10)
+        self.set_font("Arial", 'B', 11)
+        self.cell(0, 8, "RECAPITULATIF DE LA CREANCE:", 0, 1)
+        
+        # TABLEAU SYNTHESE
+        self.set_fill_color(240, 240, 240)
+        self.cell(100, 8, "POSTE", 1, 0, 'C', fill=True)
+        self.cell(40, 8, "MONTANT", 1, 1, 'C', fill=True)
+        
+        self.set_font("Arial", '', 11)
+        self.cell(100, 8, "Total Loyers Impayes (Principal)", 1)
+        self.cell(40, 8, f"{total_principal:,.2f} EUR", 1, 1, 'R')
+        
+        self.cell(100, 8, "Total Interets de Retard", 1)
+        self.cell(40, 8, f"{total_interets:,.2f} EUR", 1, 1, 'R')
+
+        self.cell(100, 8, "Indemnites Forfaitaires (Art D.441-5)", 1)
+        self.cell(40, 8, f"{total_indemnite:,.2f} EUR", 1, 1, 'R')
+        
+        self.cell(100, 8, "Total TEOM (Taxes)", 1)
+        self.cell(40, 8, f"{total_teom:,.2f} EUR", 1, 1, 'R')
+        
+        self.set_font("Arial", 'B', 12)
+        total_global = total_creance(total_principal, total_interets, total_indemnite, total_teom)
+        self.cell(100, 10, "TOTAL GENERAL A ADMETTRE", 1, 0, 'R')
+        self.cell(40, 10, f"{total_global:,.2f} EUR", 1, 1, 'R')
+        
+        self.ln(2)
+        self.set_font("Arial", 'BI', 9)
+        self.set_text_color(200, 0, 0)
+        txt_arret = "Arret des comptes au jour du Jugement d'Ouverture (26/06/2025). Les loyers posterieurs sont dus au comptant."
+        self.cell(0, 6, txt_arret.encode('latin-1', 'replace').decode('latin-1'), 0, 1, 'C')
+        self.set_text_color(0, 0, 0)
+
+        self.ln(5)
+        self.set_font("Arial", '', 11)
+        self.cell(0, 10, "Dans l'attente de votre retour, je vous prie d'agreer, Maitre, mes salutations distinguees.", 0, 1)
+        
+        self.ln(5)
+        iban = self.user_info.get('iban', '')
+        bic = self.user_info.get('bic', '')
+        if iban:
+            self.set_fill_color(230, 230, 250)
+            self.set_font("Arial", 'B', 10)
+            self.cell(0, 8, "COORDONNEES BANCAIRES POUR REGLEMENT (RIB):", 1, 1, 'L', fill=True)
+            self.set_font("Courier", '', 10)
+            self.cell(0, 6, f"IBAN : {iban}", 'LR', 1)
+            self.cell(0, 6, f"BIC  : {bic}", 'LBR', 1)
+
+        self.ln(10)
+        self.set_font("Arial", '', 11)
+        self.cell(0, 10, "Signature :", 0, 1, 'R')
+
+    def generate_page_2_details(self, data_detail, loyer_ht, total_decl, paiements_pre):
+        self.add_page()
+        self.set_font("Arial", 'B', 14)
+        self.cell(0, 10, "DETAIL DU CALCUL FINANCIER", 0, 1, 'C')
+        self.ln(5)
+        
+        self.set_font("Arial", 'B', 11)
+        self.set_fill_color(230, 230, 230)
+        self.cell(0, 8, "I. RECAPITULATIF DES VIREMENTS PERCUS (A DEDUIRE)", 1, 1, 'L', fill=True)
+        self.ln(2)
+
+        if not paiements_pre:
+             self.set_font("Arial", 'I', 10)
+             self.cell(0, 8, "Aucun paiement enregistre sur la periode.", 0, 1)
+        else:
+            self.set_font("Arial", 'B', 10)
+            self.cell(40, 7, "Date", 1)
+            self.cell(40, 7, "Montant Recu", 1, 1)
+            
+            self.set_font("Arial", '', 10)
+            total_recu = somme_euros(p['montant'] for p in paiements_pre)
+            for p in paiements_pre:
+                self.cell(40, 7, p['date'].strftime("%d/%m/%Y"), 1)
+                self.cell(40, 7, f"{p['montant']:.2f} EUR", 1, 1, 'R')
+            
+            self.set_font("Arial", 'B', 10)
+            self.cell(40, 7, "TOTAL PERCU", 1)
+            self.cell(40, 7, f"{total_recu:.2f} EUR", 1, 1, 'R')
+        
+        self.ln(8)
+
+        self.set_font("Arial", 'B', 11)
+        self.cell(0, 8, "II. DETAIL DU CALCUL (CASCADE - Art. 1343-1 CC)", 1, 1, 'L', fill=True)
+        self.ln(2)
+        
+        self.set_font("Arial", '', 10)
+        self.cell(0, 6, f"Base Loyer Annuel : {loyer_ht:,.2f} EUR HT", 0, 1)
+        self.ln(2)
+        
+        self.set_font("Arial", 'B', 7) 
+        w_d = 18; w_l = 55; w_n = 20
+        self.cell(w_d, 8, "Date", 1)
+        self.cell(w_l, 8, "Libelle", 1)
+        self.cell(w_n, 8, "Debit", 1)
+        self.cell(w_n, 8, "Credit", 1)
+        self.cell(w_n, 8, "Imp. Princ.", 1)
+        self.cell(w_n, 8, "Solde Princ.", 1)
+        self.cell(w_n, 8, "Solde Int.", 1, 1)
+        
+        self.set_font("Arial", '', 7)
+        for row in data_detail:
+            d_str = row['Date'].strftime("%d/%m/%Y")
+            libelle = str(row['Lib']).encode('latin-1', 'replace').decode('latin-1')[:35]
+            
+            self.cell(w_d, 6, d_str, 1)
+            self.cell(w_l, 6, libelle, 1)
+            self.cell(w_n, 6, f"{row['Debit']:.2f}", 1, 0, 'R')
+            self.cell(w_n, 6, f"{row['Credit']:.2f}", 1, 0, 'R')
+            self.cell(w_n, 6, f"{row['Imp_Princ']:.2f}", 1, 0, 'R')
+            self.cell(w_n, 6, f"{row['R_Princ']:.2f}", 1, 0, 'R')
+            self.cell(w_n, 6, f"{row['R_Int']:.2f}", 1, 1, 'R')
+
+    def generate_evolution_trimestrielle(self, data_detail, instantane=None):
+        # Principal et intérêts courus au dernier jour de chaque trimestre (série quotidienne)
+        jours, princ_cts, int_cts = serie_quotidienne(data_detail, instantane=instantane)
+        mois = jours.astype("datetime64[M]")
+        fin_de_mois = np.r_[mois[1:] != mois[:-1], True]
+        fin_trimestre = fin_de_mois & ((mois.astype(np.int64) % 12) % 3 == 2)
+        fin_trimestre[-1] = True
+        self.ln(8)
+        self.set_font("Arial", 'B', 11)
+        self.cell(0, 8, "III. EVOLUTION DE LA DETTE (Fin de trimestre, interets courus au jour)", 1, 1, 'L', fill=True)
+        self.ln(2)
+        self.set_font("Arial", 'B', 8)
+        self.cell(30, 6, "Date", 1)
+        self.cell(35, 6, "Solde Principal", 1)
+        self.cell(35, 6, "Interets Courus", 1, 1)
+        self.set_font("Arial", '', 8)
+        for j in np.flatnonzero(fin_trimestre):
+            self.cell(30, 6, jours[j].astype(datetime).strftime("%d/%m/%Y"), 1)
+            self.cell(35, 6, f"{princ_cts[j] / 100:.2f}", 1, 0, 'R')
+            self.cell(35, 6, f"{int_cts[j] / 100:.2f}", 1, 1, 'R')
+
+    def generate_page_3_notice_statique(self, gabarit):
+        # Recopie la notice pré-rendue (voir notice_statique) sous l'en-tête de ce dossier
+        pages, polices, position = gabarit
+        for corps in pages:
+            self.add_page()
+            correspondance = {}
+            for i_gabarit, (famille, style) in polices.items():
+                self.set_font(famille, style)
+                correspondance[i_gabarit] = self.current_font['i']
+            # Le gabarit est rendu avec les couleurs par défaut (remplissage et texte noirs)
+            self.set_fill_color(0)
+            self.set_text_color(0)
+            self.pages[self.page] += RE_POLICE.sub(
+                lambda m: f"BT /F{correspondance[int(m.group(1))]} {m.group(2)} Tf ET", corps)
+            # L'état graphique réel est celui de la fin du corps : on force FPDF à réémettre la police
+            self.font_family = ''
+        # Curseur là où le rendu direct l'aurait laissé
+        self.x, self.y = position
+
+    def generate_page_3_notice(self, instantane=None):
+        self.add_page()
+        self.set_font("Arial", 'B', 14)
+        self.cell(0, 10, "NOTICE METHODOLOGIQUE", 0, 1, 'C')
+        self.ln(5)
+        
+        self.set_font("Arial", '', 11)
+        notice_text = (
+            "Notice de Calcul :\n\n"
+            "- Principal : Loyer contractuel indexe selon l'ILC + TVA 10%.\n\n"
+            "- Interets : Taux BCE + 10 points (Art L.441-10), calcule prorata temporis jusqu'au jugement (26/06/2025).\n\n"
+            "- Imputation : Les paiements partiels s'imputent d'abord sur les interets (Art 1343-1 Code Civil).\n\n"
+            "- Indemnite Forfaitaire : 40 EUR par echeance impayee (Art D.441-5 Code Commerce)."
+        )
+        self.multi_cell(0, 8, notice_text.encode('latin-1', 'replace').decode('latin-1'))
+        
+        self.ln(10)
+        self.set_font("Arial", 'B', 12)
+        self.cell(0, 10, "ANNEXE : TABLEAUX DE REFERENCE", 0, 1)
+        
+        self.set_font("Arial", 'B', 10)
+        self.cell(40, 8, "Indices ILC", 0, 1)
+        self.set_font("Arial", '', 9)
+        self.cell(30, 6, "Annee", 1); self.cell(30, 6, "Valeur", 1, 1)
+        instantane = instantane or tables()["instantane"]
+        for k, v in instantane.indices.items():
+            self.cell(30, 6, str(k), 1); self.cell(30, 6, str(v), 1, 1)
+            
+        self.ln(5)
+        self.set_font("Arial", 'B', 10)
+        self.cell(40, 8, "Taux Legal (BCE+10)", 0, 1)
+        self.set_font("Arial", '', 9)
+        self.cell(30, 6, "Date Debut", 1); self.cell(30, 6, "Taux %", 1, 1)
+        for d, t in instantane.taux_legaux:
+            self.cell(30, 6, d.strftime("%d/%m/%Y"), 1); self.cell(30, 6, f"{t:.2f}", 1, 1)
+
+    def generate_page_4_teom(self, teom_list, uploaded_images, renvois=()):
+        self.add_page()
+        self.set_font("Arial", 'B', 14)
+        self.cell(0, 10, "JUSTIFICATIFS TEOM (Taxes)", 0, 1, 'C')
+        self.ln(5)
+        
+        if teom_list:
+            self.set_font("Arial", 'B', 10)
+            self.cell(50, 8, "Annee", 1)
+            self.cell(50, 8, "Montant", 1, 1)
+            self.set_font("Arial", '', 10)
+            for t in teom_list:
+                self.cell(50, 8, str(t['annee']), 1)
+                self.cell(50, 8, f"{t['montant']:.2f} EUR", 1, 1, 'R')
+            self.ln(10)
+        
+        self.set_font("Arial", 'I', 10)
+        self.set_text_color(100, 100, 100)
+        self.multi_cell(0, 5, "Note de lecture: Veuillez vous referer a la ligne 'Taxe d'enlevement des ordures menageres' sur les avis ci-joints. Seule cette ligne est reclamee.")
+        self.set_text_color(0, 0, 0)
+        self.ln(5)
+        if renvois:
+            # Dossiers en masse : pièces communes stockées une seule fois dans l'archive
+            self.cell(0, 10, "Pieces jointes (fournies dans l'archive) :", 0, 1)
+            self.set_font("Arial", '', 9)
+            for nom in renvois:
+                self.cell(0, 6, f"- {nom}".encode('latin-1', 'replace').decode('latin-1'), 0, 1)
+            self.set_font("Arial", 'I', 10)
+            self.ln(5)
+        self.cell(0, 10, "Copies des Avis de Taxe Fonciere (Images) :", 0, 1)
+        
+        scans = pieces_uniques(f for f in uploaded_images if f.type != "application/pdf") # On ignore les PDF ici
+        images = preparer_images([f.getvalue() for f in scans])
+        for image_preparee, erreur in images:
+            self.add_page()
+            if erreur is None:
+                inserer_image(self, image_preparee, x=10, y=20, w=190)
+            else:
+                self.cell(0, 10, f"Erreur affichage image : {str(erreur)}", 0, 1)
+
+# ==========================================
+# CLASS PDF 2 : LA RELANCE (MISE A JOUR V4.2)
+# ==========================================
+class PDFRelance(FPDF):
+    def __init__(self, user_info):
+        super().__init__()
+        self.user_info = user_info
+
+    def header(self):
+        # Header simple sur chaque page
+        self.set_font('Arial', 'I', 8)
+        self.set_text_color(100, 100, 100)
+        self.cell(0, 8, f"Relance Loyers Post-RJ - HOTEL ALBION - Lot {self.user_info.get('lot', '?')}", 0, 0, 'L')
+        self.cell(0, 8, f"Proprietaire : {self.user_info.get('nom', 'N/A')}", 0, 1, 'R')
+        self.ln(5)
+        self.set_text_color(0, 0, 0)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+        
+    def generate_letter(self, total_a_reclamer, table_rows, paiements_post):
+        self.add_page()
+        
+        # TITRE AGRESSIF
+        self.set_font("Arial", 'B', 14)
+        self.cell(0, 10, "MISE EN DEMEURE DE PAYER SOUS HUITAINE", 0, 1, 'C')
+        self.set_font("Arial", 'B', 10)
+        self.cell(0, 6, "(Loyers posterieurs au Jugement d'Ouverture - Art. L.622-17 Code de commerce)", 0, 1, 'C')
+        self.ln(10)
+        
+        self.set_font("Arial", '', 10)
+        self.cell(0, 5, f"Date : {date.today().strftime('%d/%m/%Y')}", 0, 1, 'R')
+        self.ln(10)
+
+        # INTRO JURIDIQUE
+        txt_intro = ("Maitre,\n\n"
+                     "En votre qualite d'Administrateur Judiciaire de la SAS ALBION, je vous notifie par la presente "
+                     "le non-paiement partiel des loyers courants, dus au titre de l'occupation des locaux posterieurement au jugement d'ouverture.\n\n"
+                     "Conformement aux dispositions de l'article L.622-17 I du Code de commerce, ces creances nees regulierement "
+                     "apres le jugement pour les besoins de la procedure doivent etre payees a leur echeance.")
+        self.multi_cell(0, 5, txt_intro.encode('latin-1','replace').decode('latin-1'))
+        self.ln(8)
+        
+        # --- SECTION 1 - HISTORIQUE DES REGLEMENTS RECUS ---
+        self.set_font("Arial", 'B', 10)
+        self.set_fill_color(240, 240, 240)
+        self.cell(0, 6, "I. HISTORIQUE DES REGLEMENTS ENREGISTRES (POST-RJ)", 1, 1, 'L', fill=True)
+        self.ln(2)
+        
+        if paiements_post:
+            self.set_font("Arial", 'B', 9)
+            self.cell(40, 6, "Date", 1)
+            self.cell(40, 6, "Montant Recu", 1, 1)
+            self.set_font("Arial", '', 9)
+            total_paye_post = somme_euros(p['montant'] for p in paiements_post)
+            for p in paiements_post:
+                # p est un dict {'date': ..., 'montant': ...}
+                d_str = p['date'].strftime("%d/%m/%Y") if isinstance(p['date'], (date, datetime)) else str(p['date'])
+                self.cell(40, 6, d_str, 1)
+                self.cell(40, 6, f"{p['montant']:.2f} EUR", 1, 1, 'R')
+            
+            self.set_font("Arial", 'B', 9)
+            self.cell(40, 6, "TOTAL PERCU", 1)
+            self.cell(40, 6, f"{total_paye_post:.2f} EUR", 1, 1, 'R')
+        else:
+            self.set_font("Arial", 'I', 9)
+            self.cell(0, 6, "Aucun reglement recu a ce jour sur la periode posterieure.", 1, 1)
+            
+        self.ln(8)
+        
+        # --- SECTION 2 - RESTE DU ---
+        self.set_font("Arial", 'B', 10)
+        self.cell(0, 6, "II. DETAIL DES SOMMES RESTANT DUES (IMPAYES)", 1, 1, 'L', fill=True)
+        self.ln(2)
+        
+        self.set_font("Arial", 'B', 9)
+        self.cell(30, 6, "Echeance", 1)
+        self.cell(70, 6, "Libelle", 1)
+        self.cell(30, 6, "Montant", 1)
+        self.cell(30, 6, "Reste Du", 1, 1)
+        
+        self.set_font("Arial", '', 9)
+        has_debt = False
+        for row in table_rows:
+            if row["Reste Dû"] > 0 and row["Échéance"] <= date.today():
+                 has_debt = True
+                 self.cell(30, 6, row["Échéance"].strftime("%d/%m/%Y"), 1)
+                 self.cell(70, 6, str(row["Libellé"]).encode('latin-1','replace').decode('latin-1')[:35], 1)
+                 self.cell(30, 6, f"{row['Montant']:.2f}", 1, 0, 'R')
+                 self.set_font("Arial", 'B', 9)
+                 self.cell(30, 6, f"{row['Reste Dû']:.2f}", 1, 1, 'R')
+                 self.set_font("Arial", '', 9)
+        
+        if not has_debt:
+            self.cell(0, 6, "Aucun impaye exigible a ce jour.", 1, 1)
+        
+        self.ln(8)
+        
+        # MENACE (CLAUSE RESOLUTOIRE)
+        self.set_font("Arial", 'B', 10)
+        self.set_text_color(150, 0, 0) # Rouge foncé
+        txt_menace = (f"A defaut de reglement integral de la somme de {total_a_reclamer:,.2f} EUR sous un delai de 8 jours a compter de la reception de la presente :\n"
+                      "- Je saisirai Monsieur le Juge-Commissaire pour constater la resiliation de plein droit du bail commercial (Article L.622-14 du Code de commerce).\n"
+                      "- Ce defaut de paiement caracterisera l'impossibilite pour l'entreprise de financer sa periode d'observation, justifiant une conversion en Liquidation Judiciaire.\n"
+                      "- Le present courrier vaut mise en demeure formelle et fait courir les interets legaux.")
+        self.multi_cell(0, 5, txt_menace.encode('latin-1','replace').decode('latin-1'))
+        self.set_text_color(0, 0, 0)
+        
+        self.ln(8)
+        
+        # RIB
+        iban = self.user_info.get('iban', '')
+        if iban:
+            self.set_font("Arial", 'B', 10)
+            self.cell(0, 6, "Reglement par virement exclusivement sur le compte suivant :", 0, 1)
+            self.set_font("Courier", '', 10)
+            self.cell(0, 6, f"IBAN : {iban}  |  BIC : {self.user_info.get('bic', '')}", 1, 1, 'C')
+            self.ln(5)
+
+        self.set_font("Arial", '', 10)
+        self.cell(0, 10, "Signature :", 0, 1, 'R')
+        
+        # COPIES
+        self.set_y(-30)
+        self.set_font("Arial", 'I', 8)
+        self.cell(0, 5, "Copie pour information a : Monsieur le Mandataire Judiciaire et M. MICHEL (Controleur).", 0, 1)
+
+# ==========================================
+# NOTICE PRÉ-RENDUE (une fois par version des tables)
+# ==========================================
+# Le corps de la notice ne dépend que des indices et des taux légaux : on garde le flux de
+# contenu des pages produit par FPDF et on le recopie dans chaque dossier.
+RE_POLICE = re.compile(r"BT /F(\d+) ([\d.]+) Tf ET")
+
+class NoticeStatiquePDF(DossierJuridiquePDF):
+    # Même mise en page que le dossier, sans en-tête ni pied : seul le corps est rendu
+    def __init__(self):
+        super().__init__({})
+
+    def header(self):
+        self.ln(10)
+
+    def footer(self):
+        pass
+
+@lru_cache(maxsize=4)
+def notice_statique(instantane):
+    # Clé : l'instantané des tables lui-même (une version = un objet, jamais modifié)
+    pdf = NoticeStatiquePDF()
+    pdf.generate_page_3_notice(instantane)
+    pages = tuple(pdf.pages[n] for n in range(1, pdf.page + 1))
+    # Index de police FPDF -> (famille, style), ex. 'helveticaB' -> ('helvetica', 'B')
+    polices = {}
+    for cle, police in pdf.fonts.items():
+        famille = cle.rstrip("BIU")
+        polices[police['i']] = (famille, cle[len(famille):])
+    return pages, polices, (pdf.x, pdf.y)
+
+# ==========================================
+# ASSEMBLAGE DU DOSSIER COMPLET
+# ==========================================
+# Le PDF final est écrit dans un fichier temporaire (sur disque au-delà de TAILLE_MEMOIRE_PDF) :
+# le document n'existe jamais deux fois en mémoire. Une pièce jointe envoyée deux fois n'est
+# fusionnée qu'une fois ; les flux de contenu des pièces sont compressés et les objets
+# identiques (polices, images) partagés.
+TAILLE_MEMOIRE_PDF = 8 * 1024 * 1024
+
+def empreinte_piece(f):
+    # getvalue() d'un BytesIO jamais modifié (UploadedFile) renvoie son tampon sans copie
+    return getattr(f, "empreinte", None) or empreinte(f.getvalue())
+
+def pieces_uniques(pieces):
+    vues = {}
+    for f in pieces:
+        vues.setdefault(empreinte_piece(f), f)
+    return list(vues.values())
+
+def fusionner_pdf(report_bytes, pieces, sortie):
+    # Deux phases chronométrées : lecture des pièces (append), puis compression et écriture (write)
+    with mesure("pdf_merge_append"):
+        merger = PdfWriter()
+        merger.append(io.BytesIO(report_bytes))
+        nb_pages_rapport = len(merger.pages)
+        for f in pieces_uniques(f for f in pieces if f.type == "application/pdf"):
+            f.seek(0)
+            merger.append(f)
+    with mesure("pdf_merge_write"):
+        for page in merger.pages[nb_pages_rapport:]:
+            page.compress_content_streams()
+        merger.compress_identical_objects()
+        merger.write(sortie)
+
+def construire_dossier_pdf(user_data, loyer_ht, cascade, paiements_pre, teom_list, pieces, progression=None, renvois=(),
+                           instantane=None):
+    # Renvoie un fichier temporaire rembobiné (SpooledTemporaryFile) ; lire_pdf() pour les octets.
+    # progression(avancement 0..1, étape) : suivi par la file des travaux (travaux.py)
+    # renvois : noms des pièces stockées à part (archive en masse), listés au lieu d'être fusionnés
+    # instantane : tables de la cascade (tables()["instantane"]) ; le rendu entier lit cette version
+    avancer = progression or (lambda avancement, etape: None)
+    instantane = instantane or tables()["instantane"]
+    data_detail, princ_net, int_net, indemnite = cascade
+    total_teom = somme_teom(teom_list)
+    total_final = total_creance(princ_net, int_net, indemnite, total_teom)
+
+    # 1. Générer le rapport principal (FPDF)
+    with mesure("pdf_fpdf"):
+        avancer(0.05, "Courrier et décompte")
+        pdf_report = DossierJuridiquePDF(user_data)
+        pdf_report.generate_page_1_courrier(princ_net, int_net, total_teom, indemnite)
+        pdf_report.generate_page_2_details(data_detail, loyer_ht, total_final, paiements_pre)
+        if data_detail: pdf_report.generate_evolution_trimestrielle(data_detail, instantane)
+        pdf_report.generate_page_3_notice_statique(notice_statique(instantane))
+        avancer(0.25, "Justificatifs TEOM (images)")
+        pdf_report.generate_page_4_teom(teom_list, pieces, renvois)
+
+        # 2. Conversion FPDF -> Bytes
+        avancer(0.6, "Mise en page")
+        report_bytes = pdf_report.output(dest='S').encode('latin-1')
+        del pdf_report
+
+    # 3. Fusion (pypdf) des PDF uploadés, écrite en flux
+    avancer(0.75, "Fusion des pièces jointes")
+    sortie = tempfile.SpooledTemporaryFile(max_size=TAILLE_MEMOIRE_PDF)
+    fusionner_pdf(report_bytes, pieces, sortie)
+    sortie.seek(0)
+    return sortie
+
+def lire_pdf(fichier):
+    fichier.seek(0)
+    return fichier.read()
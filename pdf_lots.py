@@ -0,0 +1,132 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date, datetime
+import pandas as pd
+from moteur import (tables, lire_sauvegarde, lire_sauvegarde_monitor,
+                    calculer_cascade_pre_rj, generer_echeancier_post_rj, imputer_paiements_monitor)
+
+# --- GÉNÉRATION EN MASSE DES PDF DANS UNE ARCHIVE ZIP ---
+# albion_backup.json (app.py)      -> Dossier juridique complet
+# albion_monitor.json (monitor.py) -> Mise en demeure post-RJ (PDFRelance du monitor)
+# Usage : python pdf_lots.py DOSSIER_JSON -o dossiers.zip [--workers N] [--date 2026-01-15]
+# Pièces jointes : clé "annexes" du JSON (chemins relatifs au JSON). Chaque pièce est stockée une
+# seule fois dans l'archive (annexes/, nommée par empreinte) même si plusieurs lots la joignent,
+# et le dossier la liste au lieu de l'inclure.
+
+def nom_fichier(texte):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(texte)) or "lot"
+
+def empreinte_fichier(chemin):
+    h = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloc)
+    return h.hexdigest()
+
+def annexes_dossier(data, repertoire):
+    # [(nom dans l'archive, chemin)] ; même contenu -> même nom, quel que soit le fichier d'origine
+    annexes = []
+    for chemin in data.get("annexes", []):
+        chemin = os.path.join(repertoire, chemin)
+        annexes.append((f"annexes/{empreinte_fichier(chemin)[:16]}{os.path.splitext(chemin)[1].lower()}", chemin))
+    return annexes
+
+def rendre_dossier(data, repertoire=""):
+    from pdf_dossier import construire_dossier_pdf, lire_pdf
+    dossier = lire_sauvegarde(data)
+    identity = dossier["identity"]
+    user_data = {k: identity.get(k, '') for k in ('nom', 'lot', 'tel', 'email', 'iban', 'bic')}
+    instantane = tables()["instantane"]
+    cascade = calculer_cascade_pre_rj(dossier["loyer"], dossier["paiements_pre"], instantane=instantane)
+    annexes = annexes_dossier(data, repertoire)
+    with construire_dossier_pdf(user_data, dossier["loyer"], cascade, dossier["paiements_pre"], dossier["teom"], [],
+                                renvois=[f"{nom} ({os.path.basename(c)})" for nom, c in annexes], instantane=instantane) as fichier:
+        pdf_bytes = lire_pdf(fichier)
+    return f"Dossier_Albion_{nom_fichier(user_data['lot'])}_{nom_fichier(user_data['nom'])}.pdf", pdf_bytes, annexes
+
+def rendre_relance_monitor(data, date_simulation):
+    from pdf_monitor import construire_relance_pdf
+    dossier = lire_sauvegarde_monitor(data)
+    historique_ilc = tables()["historique_ilc"]
+    indices = {row["Annee"]: row["Indice"] for row in historique_ilc}
+    base_loyers, _ = generer_echeancier_post_rj(dossier["loyer_base"], indices[2019], indices[2025])
+    debts_display, *totaux = imputer_paiements_monitor(base_loyers, dossier["paiements"], date_simulation)
+    info = dossier["info"]
+    user_data = {k: info.get(k, '') for k in ('nom', 'lot', 'iban', 'bic', 'email')}
+    pdf_bytes = construire_relance_pdf(user_data, date_simulation.strftime("%d/%m/%Y"), debts_display,
+                                       totaux, dossier["paiements"], pd.DataFrame(historique_ilc))
+    return f"Relance_Albion_{nom_fichier(user_data['lot'])}_{nom_fichier(user_data['nom'])}.pdf", pdf_bytes, []
+
+def rendre_fichier(chemin, date_simulation):
+    with open(chemin, encoding="utf-8") as f:
+        data = json.load(f)
+    if "loyer_base" in data:
+        return rendre_relance_monitor(data, date_simulation)
+    return rendre_dossier(data, os.path.dirname(chemin))
+
+def generer_archive(chemins, sortie, date_simulation, workers=None):
+    # Au plus 2 PDF par processus en vol : la mémoire reste bornée quel que soit le nombre de lots,
+    # chaque PDF est écrit dans le ZIP dès qu'il est prêt puis libéré.
+    workers = workers or os.cpu_count() or 1
+    max_en_vol = 2 * workers
+    a_traiter = iter(chemins)
+    erreurs = []
+    noms = set()
+    annexes_ecrites = set()
+    with zipfile.ZipFile(sortie, "w", compression=zipfile.ZIP_DEFLATED) as archive, \
+         ProcessPoolExecutor(max_workers=workers) as pool:
+        en_vol = {}
+        def remplir():
+            while len(en_vol) < max_en_vol:
+                chemin = next(a_traiter, None)
+                if chemin is None: return
+                en_vol[pool.submit(rendre_fichier, chemin, date_simulation)] = chemin
+        remplir()
+        while en_vol:
+            termines, _ = wait(en_vol, return_when=FIRST_COMPLETED)
+            for fut in termines:
+                chemin = en_vol.pop(fut)
+                try:
+                    nom, pdf_bytes, annexes = fut.result()
+                except Exception as e:
+                    erreurs.append(f"{os.path.basename(chemin)} : {type(e).__name__}: {e}")
+                    continue
+                # Deux lots au même nom : on suffixe plutôt que d'écraser
+                base, n = nom, 1
+                while nom in noms:
+                    n += 1
+                    nom = base.replace(".pdf", f"_{n}.pdf")
+                noms.add(nom)
+                archive.writestr(nom, pdf_bytes)
+                del pdf_bytes
+                # Copie en flux depuis le disque, une fois par contenu
+                for nom_annexe, chemin_annexe in annexes:
+                    if nom_annexe not in annexes_ecrites:
+                        archive.write(chemin_annexe, nom_annexe)
+                        annexes_ecrites.add(nom_annexe)
+            remplir()
+        if erreurs:
+            archive.writestr("ERREURS.txt", "\n".join(erreurs))
+    return len(noms), erreurs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génération en masse des dossiers / mises en demeure dans un ZIP")
+    parser.add_argument("repertoire")
+    parser.add_argument("-o", "--sortie", default="dossiers_albion.zip")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="nombre de processus (défaut : nb de coeurs)")
+    parser.add_argument("--date", default=None, help="date de simulation des relances monitor (AAAA-MM-JJ, défaut : aujourd'hui)")
+    args = parser.parse_args(argv)
+
+    date_simulation = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else date.today()
+    chemins = sorted(os.path.join(args.repertoire, f) for f in os.listdir(args.repertoire) if f.lower().endswith(".json"))
+    nb, erreurs = generer_archive(chemins, args.sortie, date_simulation, args.workers)
+    print(f"{nb} PDF écrit(s), {len(erreurs)} erreur(s) -> {args.sortie}")
+    return 1 if erreurs else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
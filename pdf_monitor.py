@@ -0,0 +1,237 @@
+import numpy as np
+from fpdf import FPDF
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from images import preparer_pixels_rgb, inserer_image
+from metriques import mesure
+from moteur import somme_euros
+
+# --- GRAPHIQUE ---
+def create_debt_chart(data_rows):
+    labels = []
+    montants_dus = []
+    montants_payes = []
+    for row in data_rows:
+        if "Indemnité" not in row['label']:
+            short_label = row['raw_date'].strftime("%b %y")
+            labels.append(short_label)
+            montants_dus.append(row['montant'])
+            montants_payes.append(row['paye'])
+            
+    # Figure hors pyplot : aucun registre global, la mémoire est libérée avec l'objet
+    fig = Figure(figsize=(7, 3))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.bar(labels, montants_dus, color='#ffebee', edgecolor='#ef5350', label='Dû', width=0.6)
+    ax.bar(labels, montants_payes, color='#c8e6c9', edgecolor='#66bb6a', label='Payé', width=0.6)
+    ax.set_ylabel('Euros (€)', fontsize=8)
+    ax.set_title('VISUALISATION DES IMPAYES', fontsize=10, fontweight='bold')
+    ax.legend(fontsize=8)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    fig.tight_layout()
+    return fig
+
+def rendre_graphique(fig, dpi=100):
+    fig.set_dpi(dpi)
+    canvas = fig.canvas
+    canvas.draw()
+    rgba = np.asarray(canvas.buffer_rgba())
+    hauteur, largeur = rgba.shape[:2]
+    image = preparer_pixels_rgb(np.ascontiguousarray(rgba[:, :, :3]).tobytes(), largeur, hauteur)
+    fig.clear()
+    return image
+
+# --- PDF ---
+class PDFRelance(FPDF):
+    def __init__(self, user_info, sim_date):
+        super().__init__()
+        self.user_info = user_info
+        self.sim_date = sim_date
+        self.alias_nb_pages()
+
+    def header(self):
+        self.set_font('Arial', 'I', 8)
+        self.set_text_color(100, 100, 100)
+        self.cell(0, 10, f"Dossier de Recouvrement - HOTEL ALBION - Lot {self.user_info.get('lot', '?')}", 0, 1, 'R')
+        self.set_text_color(0, 0, 0)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, f'Page {self.page_no()}/{{nb}}', 0, 0, 'C')
+
+    def generate_report(self, total_due, sub_loyer, sub_penalite, table_rows, history_payments, df_ilc):
+        # PAGE 1
+        self.add_page()
+        self.set_font("Arial", 'B', 14)
+        self.cell(0, 10, f"AUDIT DE SITUATION AU {self.sim_date}", 0, 1, 'C')
+        self.ln(5)
+
+        try:
+            with mesure("graphique_matplotlib"):
+                image = rendre_graphique(create_debt_chart(table_rows))
+        except Exception as e:
+            self.set_font("Arial", 'I', 8)
+            self.cell(0, 6, f"(Graphique indisponible : {type(e).__name__})", 0, 1, 'C')
+        else:
+            inserer_image(self, image, x=10, w=190)
+            self.ln(5)
+
+        # ILC
+        self.set_fill_color(230, 240, 255)
+        self.set_font("Arial", 'B', 10)
+        self.cell(0, 7, "I. JUSTIFICATIF D'INDEXATION (Clause Echelle Mobile - Art. L145-39)", 1, 1, 'L', fill=True)
+        self.set_font("Arial", 'I', 8)
+        self.multi_cell(0, 5, "Conformement au bail, la revision du montant s'applique automatiquement le 1er JUIN de chaque annee en fonction de l'evolution de l'indice ILC.")
+        self.set_font("Arial", 'B', 8)
+        self.cell(30, 5, "Annee", 1, 0, 'C')
+        self.cell(40, 5, "Indice ILC", 1, 0, 'C')
+        self.cell(40, 5, "Coefficient", 1, 0, 'C')
+        self.cell(80, 5, "Reference", 1, 1, 'L')
+        self.set_font("Arial", '', 8)
+        base_val = 114.06 
+        for index, row in df_ilc.iterrows():
+            coef = row['Indice'] / base_val
+            self.cell(30, 5, str(int(row['Annee'])), 1, 0, 'C')
+            self.cell(40, 5, f"{row['Indice']:.2f}", 1, 0, 'C')
+            self.cell(40, 5, f"x {coef:.4f}", 1, 0, 'C')
+            self.cell(80, 5, str(row['Note']), 1, 1, 'L')
+        self.ln(5)
+
+        # PAIEMENTS
+        self.set_font("Arial", 'B', 10)
+        self.set_fill_color(240, 240, 240)
+        self.cell(0, 7, "II. HISTORIQUE DES VIREMENTS RECUS", 1, 1, 'L', fill=True)
+        if history_payments:
+            self.set_font("Arial", 'B', 9)
+            self.cell(50, 6, "Date Reception", 1)
+            self.cell(50, 6, "Montant", 1, 1)
+            self.set_font("Arial", '', 9)
+            total_history = somme_euros(p['montant'] for p in history_payments)
+            for p in history_payments:
+                d_str = p['date'].strftime("%d/%m/%Y")
+                self.cell(50, 6, d_str, 1)
+                self.cell(50, 6, f"{p['montant']:.2f} EUR", 1, 1, 'R')
+            self.set_font("Arial", 'B', 9)
+            self.cell(50, 6, "TOTAL PERCU", 1)
+            self.cell(50, 6, f"{total_history:.2f} EUR", 1, 1, 'R')
+        else:
+            self.set_font("Arial", 'I', 9)
+            self.cell(0, 6, "Aucun virement enregistre a ce jour.", 1, 1)
+        self.ln(5)
+
+        # PENALITES SEPAREES
+        self.set_font("Arial", 'B', 10)
+        self.cell(0, 7, "III. INDEMNITES DE RETARD (Ajoutees hors indexation)", 1, 1, 'L', fill=True)
+        self.set_font("Arial", '', 9)
+        has_penalty = False
+        for row in table_rows:
+            if "Indemnité" in row['label']:
+                has_penalty = True
+                self.cell(40, 6, row['raw_date'].strftime("%d/%m/%Y"), 1)
+                self.cell(110, 6, row['label'].replace("↪ ", ""), 1)
+                self.cell(40, 6, "40.00 EUR", 1, 1, 'R')
+        if not has_penalty: self.cell(190, 6, "Néant.", 1, 1)
+        
+        self.ln(10)
+        
+        self.set_fill_color(255, 235, 235)
+        self.set_font("Arial", 'B', 10)
+        self.cell(140, 6, "SOUS-TOTAL DETTE PRINCIPALE (Occupation) :", 1, 0, 'R', fill=True)
+        self.cell(50, 6, f"{sub_loyer:,.2f} EUR", 1, 1, 'R', fill=True)
+        self.cell(140, 6, "SOUS-TOTAL INDEMNITES FORFAITAIRES :", 1, 0, 'R', fill=True)
+        self.cell(50, 6, f"{sub_penalite:,.2f} EUR", 1, 1, 'R', fill=True)
+        
+        self.set_font("Arial", 'B', 14)
+        self.cell(140, 10, "TOTAL GENERAL EXIGIBLE :", 1, 0, 'R', fill=True)
+        self.cell(50, 10, f"{total_due:,.2f} EUR", 1, 1, 'R', fill=True)
+        
+        self.set_font("Arial", 'I', 8)
+        self.cell(0, 6, "(Suivant decompte et Mise en Demeure - Voir Page 2/2)", 0, 1, 'C')
+
+        # PAGE 2
+        self.add_page()
+        self.set_font("Arial", 'B', 11)
+        self.cell(0, 5, self.user_info.get('nom', ''), 0, 1)
+        self.set_font("Arial", '', 10)
+        self.cell(0, 5, f"Lot : {self.user_info.get('lot', '')}", 0, 1)
+        self.cell(0, 5, f"Email : {self.user_info.get('email', '')}", 0, 1)
+        self.ln(10)
+        self.set_font("Arial", 'B', 11)
+        self.cell(0, 5, "A l'attention de l'Administrateur Judiciaire", 0, 1, 'R')
+        self.ln(15)
+        self.set_font("Arial", 'B', 14)
+        self.cell(0, 10, "MISE EN DEMEURE DE PAYER SOUS HUITAINE", 0, 1, 'C')
+        self.set_font("Arial", 'B', 10)
+        self.cell(0, 5, "(Sommes Post-Jugement - Art. L.622-17 Code de commerce)", 0, 1, 'C')
+        self.ln(10)
+        
+        self.set_font("Arial", '', 10)
+        txt = ("Maitre,\n\n"
+               "Veuillez trouver en Page 1 l'audit complet de la situation comptable de mon lot.\n"
+               "Je constate a ce jour un solde debiteur exigible.\n\n"
+               "Conformement a l'Article 11 du bail, ces sommes etaient exigibles le 10 du mois. "
+               "L'Article L.622-17 I du Code de commerce impose leur paiement strict a l'echeance.\n\n"
+               "Je vous rappelle les dispositions contractuelles et legales :\n"
+               "- Art 4-10 (Non-tolerance) : Aucun retard passe ne vaut droit acquis.\n"
+               "- Art 15 (Frais) : Les frais de recouvrement sont a votre charge exclusive.\n"
+               "- Art L.441-10 : L'indemnite forfaitaire de 40 EUR est due de plein droit.\n\n"
+               "Les paiements recus ont ete imputes prioritairement sur les penalites (Art 1343-1 Code Civil).")
+        self.multi_cell(0, 5, txt.encode('latin-1', 'replace').decode('latin-1'))
+        self.ln(5)
+        
+        self.set_fill_color(255, 200, 200)
+        self.set_font("Arial", 'B', 9)
+        self.cell(0, 6, "RESTE A REGLER CE JOUR (DETAILS EN PAGE 1)", 1, 1, 'L', fill=True)
+        self.cell(25, 6, "Echeance", 1)
+        self.cell(65, 6, "Libelle", 1)
+        self.cell(20, 6, "Indice", 1)
+        self.cell(25, 6, "Montant", 1)
+        self.cell(25, 6, "Reste Du", 1, 1)
+        self.set_font("Arial", '', 8)
+        for row in table_rows:
+            if row['reste'] > 0:
+                if "Indemnité" in row['label']: 
+                    self.set_font("Arial", 'I', 8)
+                    indice_txt = "-"
+                else: 
+                    self.set_font("Arial", '', 8)
+                    indice_txt = f"{row['indice']:.2f}"
+                d_str = row['raw_date'].strftime("%d/%m/%Y")
+                self.cell(25, 6, d_str, 1)
+                self.cell(65, 6, row['label'][:40].encode('latin-1', 'replace').decode('latin-1'), 1)
+                self.cell(20, 6, indice_txt, 1, 0, 'C')
+                self.cell(25, 6, f"{row['montant']:.2f}", 1, 0, 'R')
+                self.cell(25, 6, f"{row['reste']:.2f}", 1, 1, 'R')
+        self.ln(5)
+        self.set_font("Arial", 'B', 12)
+        self.cell(0, 10, f"NET A PAYER : {total_due:,.2f} EUR", 0, 1, 'R')
+        self.ln(5)
+        self.set_font("Arial", '', 10)
+        self.multi_cell(0, 5, f"IBAN : {self.user_info.get('iban', '')}\nBIC : {self.user_info.get('bic', '')}")
+        self.ln(10)
+        self.cell(0, 10, "Signature :", 0, 1, 'R')
+
+# --- ASSEMBLAGE ---
+def lignes_relance(debts_display):
+    rows_for_pdf = []
+    for d in debts_display:
+        rows_for_pdf.append({
+            "date": d['date'],
+            "label": d['label'],
+            "montant": d['montant'],
+            "paye": d['paye'],
+            "reste": d['reste'],
+            "raw_date": d['date'],
+            "indice": d['indice']
+        })
+    return rows_for_pdf
+
+def construire_relance_pdf(user_data, sim_date, debts_display, totaux, paiements, df_ilc, progression=None):
+    total_retard, sub_retard_loyer, sub_retard_penalite = totaux
+    with mesure("pdf_relance_monitor"):
+        if progression: progression(0.1, "Audit et graphique")
+        pdf = PDFRelance(user_data, sim_date)
+        pdf.generate_report(total_retard, sub_retard_loyer, sub_retard_penalite, lignes_relance(debts_display), paiements, df_ilc)
+        return pdf.output(dest='S').encode('latin-1')
@@ -0,0 +1,97 @@
+import streamlit as st
+from datetime import date
+from moteur import DATE_JUGEMENT, FIN_SUIVI_POST_RJ, tables, fins_de_mois
+from metriques import configurer, mesure
+from calcul_portefeuille import calculer_portefeuille, repartition_retards, totaux_portefeuille, arrieres_fin_de_mois
+import stockage
+
+# --- CONFIGURATION ---
+# Vue immeuble : tous les lots de la base (ALBION_BASE), en lecture seule.
+# streamlit run portefeuille.py
+configurer("portefeuille")
+st.set_page_config(page_title="Albion Portefeuille", page_icon="🏢", layout="wide")
+
+# --- SIDEBAR ---
+with st.sidebar:
+    st.title("🎛️ Simulation")
+    date_simulation = st.date_input("Date 'Aujourd'hui' (Simulation)", value=date(2026, 1, 15))
+    date_projection = st.date_input("Échéancier jusqu'au", value=FIN_SUIVI_POST_RJ, min_value=DATE_JUGEMENT)
+    ref = tables()
+    if ref["erreur"]: st.warning(f"Tables non rechargées ({ref['erreur']}) : version {ref['version']} conservée.")
+    st.caption(f"Tables {ref['version']} (taux {ref['version_taux']}, indices {ref['version_indices']})")
+
+# --- CACHE DES CALCULS (entre les reruns Streamlit) ---
+# Clé = dates + versions des tables + révision de la base (stockage.revision_base) : une saisie dans
+# l'application ou un import de relevé invalide le portefeuille. _instantane : ref["instantane"] du même rerun.
+@st.cache_data(max_entries=16, show_spinner=False)
+def portefeuille_en_cache(date_simulation, date_projection, version_taux, version_indices, revision, _instantane):
+    with mesure("portefeuille"):
+        return calculer_portefeuille(date_simulation, date_projection, instantane=_instantane)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def arrieres_en_cache(fins, date_projection, version_taux, version_indices, revision, _instantane):
+    with mesure("arrieres_fin_de_mois"):
+        return arrieres_fin_de_mois(list(fins), date_projection, instantane=_instantane)
+
+st.title("🏢 Albion — Portefeuille des lots")
+
+if not stockage.ouverture_lots_active():
+    st.info("Portefeuille réservé au poste de gestion : définir ALBION_BASE et ALBION_OUVRIR_LOTS=1.")
+    st.stop()
+
+revision = stockage.revision_base()
+synthese, dettes = portefeuille_en_cache(date_simulation, date_projection, ref["version_taux"], ref["version_indices"],
+                                         revision, ref["instantane"])
+if synthese.empty:
+    st.info("Aucun lot enregistré : ouvrez un dossier dans l'application ou importez des sauvegardes (python stockage.py import ...).")
+    st.stop()
+
+totaux = totaux_portefeuille(synthese)
+c1, c2, c3, c4 = st.columns(4)
+c1.metric("Lots", totaux["lots"])
+c2.metric("Créance déclarée (pré-RJ)", f"{totaux['total_declare']:,.2f} €")
+c3.metric(f"Arriérés post-RJ au {date_simulation:%d/%m/%Y}", f"{totaux['retard_post_rj']:,.2f} €")
+c4.metric("Lots en retard", totaux["lots_en_retard"])
+
+st.divider()
+col_g, col_d = st.columns([1, 2])
+with col_g:
+    st.subheader("⏱️ Ancienneté des retards")
+    st.caption("Échéances de loyer passées ; soldées : retard constaté au paiement.")
+    repartition = repartition_retards(dettes, date_simulation)
+    st.bar_chart(repartition["echeances"])
+    st.dataframe(repartition, column_config={
+        "echeances": st.column_config.NumberColumn("Échéances", format="%d"),
+        "reste_du": st.column_config.NumberColumn("Reste dû", format="%.2f €"),
+    })
+
+    st.subheader("📅 Arriérés en fin de mois")
+    st.caption("Virements reçus à chaque date.")
+    fins = fins_de_mois(DATE_JUGEMENT, date_simulation)
+    if fins:
+        arrieres = arrieres_en_cache(tuple(fins), date_projection, ref["version_taux"], ref["version_indices"],
+                                     revision, ref["instantane"])
+        st.bar_chart(arrieres[[d.isoformat() for d in fins]].sum().rename("Arriérés (€)"))
+
+with col_d:
+    st.subheader("📋 Détail par lot")
+    st.dataframe(
+        synthese.sort_values(["retard_post_rj", "lot"], ascending=[False, True]),
+        column_config={
+            "lot": st.column_config.TextColumn("Lot"),
+            "nom": st.column_config.TextColumn("Propriétaire"),
+            "loyer_ht": st.column_config.NumberColumn("Loyer HT", format="%.2f €"),
+            "principal": st.column_config.NumberColumn("Principal", format="%.2f €"),
+            "interets": st.column_config.NumberColumn("Intérêts", format="%.2f €"),
+            "indemnites": st.column_config.NumberColumn("Indemnités", format="%.2f €"),
+            "teom": st.column_config.NumberColumn("TEOM", format="%.2f €"),
+            "total_declare": st.column_config.NumberColumn("Total déclaré", format="%.2f €"),
+            "retard_loyer": st.column_config.NumberColumn("Retard loyer", format="%.2f €"),
+            "retard_penalite": st.column_config.NumberColumn("Retard pénalités", format="%.2f €"),
+            "retard_post_rj": st.column_config.NumberColumn("Retard post-RJ", format="%.2f €"),
+            "jours_retard_max": st.column_config.NumberColumn("Retard max", format="%d j"),
+        },
+        hide_index=True,
+    )
+    st.download_button("📥 Exporter (CSV)", synthese.to_csv(index=False, float_format="%.2f"),
+                       f"portefeuille_{date_simulation:%Y%m%d}.csv", "text/csv")
@@ -0,0 +1,215 @@
+import argparse
+import itertools
+import json
+import sys
+from datetime import datetime
+import numpy as np
+from moteur import (DATE_JUGEMENT, INDEMNITE_FORFAITAIRE, ORDINAL_EPOCH, tables, lire_sauvegarde, en_centimes, en_centimes_np,
+                    en_ordinaux, cumul_taux_np, iterer_loyers_pre_rj, somme_euros)
+
+# --- SCÉNARIOS : créance déclarée sous des milliers d'hypothèses ---
+# Un scénario perturbe le dossier de base : virements décalés (jours) ou réduits (facteur), règlement
+# partiel supplémentaire (date, montant), taux légaux remplacés à partir de dates communes, indices ILC.
+# Tous les scénarios passent ensemble dans la cascade (Art. 1343-1 : intérêts d'abord), une colonne
+# d'événements à la fois, chaque opération portant sur le vecteur des scénarios (centimes int64).
+# Scénario sans perturbation : mêmes centimes que calculer_cascade_pre_rj.
+# Un virement décalé au-delà de date_arret sort de la créance déclarée (il devient post-RJ) ;
+# un virement non décalé reste compté, comme dans la cascade.
+# Hypothèse de taux (grille, Monte Carlo, --taux) : un taux remplace celui du dernier semestre de la table
+# (1er janvier 2025, en vigueur au jugement) et vaut pour toutes les dates suivantes. Ce n'est pas une
+# projection des semestres BCE futurs : la créance déclarée s'arrête au jugement (26/06/2025), aucun
+# semestre postérieur n'y entre. Avec un date_arret plus tardif, passer dates_taux / taux (un taux par
+# semestre) à evaluer_scenarios.
+# Usage : python scenarios.py albion_backup.json -n 10000 [--retard-max 90] [--taux 10 16] [--indice 130 140]
+
+JAMAIS = np.iinfo(np.int64).max // 4
+
+# --- INTÉRÊTS PAR SCÉNARIO ---
+def cumul_scenarios(ordinaux, dates_taux, taux, instantane=None):
+    # Cumul des taux (centièmes de %) par scénario ; taux[s, k] en vigueur à partir de dates_taux[k]
+    if taux is None: return cumul_taux_np(ordinaux, instantane)
+    res = cumul_taux_np(np.minimum(ordinaux, dates_taux[0]), instantane)
+    centiemes = np.round(np.asarray(taux, dtype=np.float64) * 100).astype(np.int64)
+    bornes = np.r_[dates_taux[1:], JAMAIS]
+    for k, debut in enumerate(dates_taux):
+        res = res + centiemes[:, k] * np.clip(ordinaux - debut, 0, bornes[k] - debut)
+    return res
+
+def interets_scenarios(montants_cts, o_dep, o_fin, dates_taux, taux, instantane=None):
+    # Même arrondi que calculer_interets_centimes, scénario par scénario
+    num = montants_cts * (cumul_scenarios(o_fin, dates_taux, taux, instantane) - cumul_scenarios(o_dep, dates_taux, taux, instantane))
+    q = (2 * np.abs(num) + 3650000) // 7300000
+    return np.where(o_fin > o_dep, np.sign(num) * q, 0)
+
+# --- ÉCHÉANCES PAR JEU D'INDICES ---
+def loyers_scenarios(loyer_annuel_ht, indices, date_arret, instantane=None):
+    # indices : None (ceux de l'instantané) ou liste (un dict par scénario) ; échéancier calculé une fois par jeu distinct
+    if indices is None:
+        echeances = list(iterer_loyers_pre_rj(loyer_annuel_ht, date_arret, instantane and instantane.indices))
+        return en_ordinaux([e["date"] for e in echeances]), en_centimes_np([e["montant"] for e in echeances])[None, :]
+    par_jeu = {}
+    lignes = []
+    for jeu in indices:
+        cle = tuple(sorted(jeu.items()))
+        if cle not in par_jeu:
+            echeances = list(iterer_loyers_pre_rj(loyer_annuel_ht, date_arret, jeu))
+            par_jeu[cle] = (en_ordinaux([e["date"] for e in echeances]), en_centimes_np([e["montant"] for e in echeances]))
+        lignes.append(par_jeu[cle])
+    dates = lignes[0][0]
+    if any(len(d) != len(dates) or (d != dates).any() for d, _ in par_jeu.values()):
+        raise ValueError("les jeux d'indices donnent des dates d'échéance différentes")
+    return dates, np.stack([m for _, m in lignes])
+
+# --- CASCADE VECTORISÉE ---
+def evaluer_scenarios(loyer_annuel_ht, paiements_pre, nb=1, teom=0.0, decalages=None, facteurs=None,
+                      reglement_dates=None, reglement_montants=None, dates_taux=(), taux=None, indices=None,
+                      date_arret=DATE_JUGEMENT, instantane=None):
+    # decalages (nb, P) jours ; facteurs (nb, P) ; reglement_* (nb,) date / euros ; taux (nb, K) en % ;
+    # indices : liste de nb dicts (comme tables()["indices"]). Renvoie un dict de tableaux (nb,) en centimes.
+    # instantane : tables de référence, lues une fois pour tous les scénarios (défaut : version courante)
+    instantane = instantane or tables()["instantane"]
+    o_arret = date_arret.toordinal()
+    o_loyers, loyers = loyers_scenarios(loyer_annuel_ht, indices, date_arret, instantane)
+    nb_echeances = len(o_loyers)
+    nb_p = len(paiements_pre)
+    o_p = en_ordinaux(np.array([p["date"] for p in paiements_pre], dtype="datetime64[D]")) if nb_p else np.zeros(0, dtype=np.int64)
+    dates_p = np.broadcast_to(o_p, (nb, nb_p)) + (0 if decalages is None else np.asarray(decalages, dtype=np.int64))
+    montants_p = np.array([p["montant"] for p in paiements_pre], dtype=np.float64)
+    montants_p = en_centimes_np(np.broadcast_to(montants_p, (nb, nb_p)) * (1.0 if facteurs is None else np.asarray(facteurs)))
+
+    # Événements : loyers, virements, règlement (absent si montant nul) ; ordre de la cascade :
+    # par date, loyers avant virements à date égale, virements dans l'ordre de saisie (tri stable)
+    dates = [np.broadcast_to(o_loyers, (nb, nb_echeances)), dates_p]
+    montants = [np.broadcast_to(loyers, (nb, nb_echeances)), montants_p]
+    loyer = [np.ones((nb, nb_echeances), dtype=bool), np.zeros((nb, nb_p), dtype=bool)]
+    present = [np.ones((nb, nb_echeances), dtype=bool), (dates_p <= o_arret) | (dates_p == o_p)]
+    if reglement_montants is not None:
+        m = en_centimes_np(reglement_montants).reshape(nb, 1)
+        d = en_ordinaux(np.asarray(reglement_dates, dtype="datetime64[D]")).reshape(nb, 1)
+        dates.append(d)
+        montants.append(m)
+        loyer.append(np.zeros((nb, 1), dtype=bool))
+        present.append((m != 0) & (d <= o_arret))
+    present = np.concatenate(present, axis=1)
+    dates = np.where(present, np.concatenate(dates, axis=1), JAMAIS)
+    ordre = np.argsort(dates, axis=1, kind="stable")
+    dates = np.take_along_axis(dates, ordre, axis=1)
+    montants = np.take_along_axis(np.concatenate(montants, axis=1), ordre, axis=1)
+    loyer = np.take_along_axis(np.concatenate(loyer, axis=1), ordre, axis=1)
+    present = np.take_along_axis(present, ordre, axis=1)
+    o_taux = en_ordinaux(np.array(dates_taux, dtype="datetime64[D]")) if taux is not None else None
+
+    solde_princ = np.zeros(nb, dtype=np.int64)
+    solde_int = np.zeros(nb, dtype=np.int64)
+    derniere = dates[:, 0].copy() if dates.shape[1] else np.full(nb, o_arret)
+    for j in range(dates.shape[1]):
+        actif = present[:, j]
+        curr = np.where(actif, dates[:, j], derniere)
+        courus = interets_scenarios(np.maximum(solde_princ, 0), derniere, curr, o_taux, taux, instantane)
+        solde_int += np.where(solde_princ > 0, courus, 0)
+        m = np.where(actif, montants[:, j], 0)
+        est_loyer = loyer[:, j]
+        imp_int = np.where(est_loyer, 0, np.minimum(m, solde_int))
+        solde_int -= imp_int
+        solde_princ += np.where(est_loyer, m, imp_int - m)
+        derniere = curr
+    courus = interets_scenarios(np.maximum(solde_princ, 0), derniere, np.maximum(derniere, o_arret), o_taux, taux, instantane)
+    solde_int += np.where(solde_princ > 0, courus, 0)
+
+    principal = np.maximum(0, solde_princ)
+    interets = np.maximum(0, solde_int)
+    indemnites = np.full(nb, nb_echeances * en_centimes(INDEMNITE_FORFAITAIRE), dtype=np.int64)
+    teom_cts = np.full(nb, en_centimes(teom), dtype=np.int64)
+    return {"principal": principal, "interets": interets, "indemnites": indemnites, "teom": teom_cts,
+            "total": principal + interets + indemnites + teom_cts}
+
+# --- JEUX DE SCÉNARIOS ---
+def indices_avec(annee, valeur):
+    jeu = dict(tables()["indices"])
+    jeu[str(annee)] = float(valeur)
+    return jeu
+
+def scenarios_grille(nb_paiements, decalages_jours=(0,), reglements=((None, 0.0),), taux_apres=(None,),
+                     indices=(None,), annee_indice=2024):
+    # Produit cartésien des axes ; un décalage s'applique à tous les virements, None = taux ou indice de la table
+    combinaisons = list(itertools.product(decalages_jours, reglements, taux_apres, indices))
+    nb = len(combinaisons)
+    params = {"nb": nb, "decalages": np.array([[c[0]] * nb_paiements for c in combinaisons], dtype=np.int64).reshape(nb, nb_paiements)}
+    if any(r[1] for r in reglements):
+        params["reglement_dates"] = [c[1][0] or DATE_JUGEMENT for c in combinaisons]
+        params["reglement_montants"] = np.array([c[1][1] for c in combinaisons], dtype=np.float64)
+    if any(t is not None for t in taux_apres):
+        ref = tables()
+        params["taux"] = np.array([[ref["taux_legaux"][-1][1] if c[2] is None else c[2]] for c in combinaisons])
+        params["dates_taux"] = [ref["taux_legaux"][-1][0]]
+    if any(i is not None for i in indices):
+        params["indices"] = [dict(tables()["indices"]) if c[3] is None else indices_avec(annee_indice, c[3]) for c in combinaisons]
+    return params, combinaisons
+
+def scenarios_monte_carlo(nb_paiements, n, seed=0, retard_max=0, proba_retard=0.3, reduction_max=0.0,
+                          reglement=None, taux=None, indice=None, annee_indice=2024):
+    # retard : chaque virement est retardé (proba_retard) de 1 à retard_max jours ; reduction_max : part non versée ;
+    # reglement (date_min, date_max, montant_max) ; taux (min, max) du dernier semestre de la table, gardé ensuite ;
+    # indice (min, max) pour annee_indice
+    rng = np.random.default_rng(seed)
+    params = {"nb": n}
+    if retard_max:
+        retards = rng.integers(1, retard_max + 1, (n, nb_paiements))
+        params["decalages"] = np.where(rng.random((n, nb_paiements)) < proba_retard, retards, 0)
+    if reduction_max:
+        params["facteurs"] = 1.0 - rng.uniform(0, reduction_max, (n, nb_paiements))
+    if reglement:
+        debut, fin, montant_max = reglement
+        jours = rng.integers(debut.toordinal(), fin.toordinal() + 1, n)
+        params["reglement_dates"] = (jours - ORDINAL_EPOCH).astype("datetime64[D]")
+        params["reglement_montants"] = np.round(rng.uniform(0, montant_max, n), 2)
+    if taux:
+        ref = tables()
+        params["taux"] = np.round(rng.uniform(taux[0], taux[1], (n, 1)), 2)
+        params["dates_taux"] = [ref["taux_legaux"][-1][0]]
+    if indice:
+        params["indices"] = [indices_avec(annee_indice, v) for v in np.round(rng.uniform(indice[0], indice[1], n), 2)]
+    return params
+
+def distribution(totaux_cts, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    totaux = np.asarray(totaux_cts) / 100
+    res = {"min": float(totaux.min()), "moyenne": float(totaux.mean()), "max": float(totaux.max())}
+    for q, v in zip(quantiles, np.quantile(totaux, quantiles)):
+        res[f"q{int(q * 100):02d}"] = float(v)
+    return res
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distribution de la créance déclarée sous des hypothèses tirées au hasard")
+    parser.add_argument("sauvegarde", help="albion_backup.json")
+    parser.add_argument("-n", "--nombre", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--retard-max", type=int, default=0, help="retard maximal d'un virement (jours)")
+    parser.add_argument("--proba-retard", type=float, default=0.3)
+    parser.add_argument("--reduction-max", type=float, default=0.0, help="part maximale non versée d'un virement (0-1)")
+    parser.add_argument("--reglement", nargs=3, metavar=("DEBUT", "FIN", "MONTANT_MAX"), help="règlement partiel aléatoire")
+    parser.add_argument("--taux", nargs=2, type=float, metavar=("MIN", "MAX"), help="taux légal (%%) du semestre en vigueur au jugement (dernier de la table)")
+    parser.add_argument("--indice", nargs=2, type=float, metavar=("MIN", "MAX"), help="indice ILC de --annee-indice")
+    parser.add_argument("--annee-indice", type=int, default=2024)
+    args = parser.parse_args(argv)
+
+    with open(args.sauvegarde, encoding="utf-8") as f:
+        dossier = lire_sauvegarde(json.load(f))
+    reglement = None
+    if args.reglement:
+        reglement = (datetime.strptime(args.reglement[0], "%Y-%m-%d").date(),
+                     datetime.strptime(args.reglement[1], "%Y-%m-%d").date(), float(args.reglement[2]))
+    params = scenarios_monte_carlo(len(dossier["paiements_pre"]), args.nombre, args.seed, args.retard_max, args.proba_retard,
+                                   args.reduction_max, reglement, args.taux, args.indice, args.annee_indice)
+    teom = somme_euros(t["montant"] for t in dossier["teom"])
+    # Dossier de base et scénarios sur la même version des tables
+    instantane = tables()["instantane"]
+    base = evaluer_scenarios(dossier["loyer"], dossier["paiements_pre"], teom=teom, instantane=instantane)
+    res = evaluer_scenarios(dossier["loyer"], dossier["paiements_pre"], teom=teom, instantane=instantane, **params)
+    print(f"Créance déclarée du dossier : {base['total'][0] / 100:,.2f} EUR")
+    print(f"{args.nombre} scénario(s) :")
+    for cle, valeur in distribution(res["total"]).items():
+        print(f"  {cle:<8} {valeur:>14,.2f} EUR")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
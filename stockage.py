@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import date
+from moteur import DATE_JUGEMENT, en_centimes, lire_sauvegarde, lire_sauvegarde_monitor
+
+# --- BASE DES DOSSIERS (SQLite) ---
+# Un fichier pour tout l'immeuble : lots (identité + loyer), virements, TEOM. Montants en centimes.
+# Les applications lisent un lot par requête et écrivent chaque saisie au fil de l'eau.
+# Base opt-in : sans ALBION_BASE (chemin du fichier), les applications ne gardent rien (JSON seulement).
+# La liste des lots (identités, RIB) ne s'affiche qu'avec ALBION_OUVRIR_LOTS=1, sur un poste de gestion.
+# Migration des sauvegardes : python stockage.py import albion_backup.json albion_monitor.json ...
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lots (
+    lot TEXT PRIMARY KEY,
+    nom TEXT NOT NULL DEFAULT '',
+    tel TEXT NOT NULL DEFAULT '',
+    email TEXT NOT NULL DEFAULT '',
+    iban TEXT NOT NULL DEFAULT '',
+    bic TEXT NOT NULL DEFAULT '',
+    loyer_cts INTEGER NOT NULL DEFAULT 0,
+    maj TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS paiements (
+    id INTEGER PRIMARY KEY,
+    lot TEXT NOT NULL REFERENCES lots(lot) ON DELETE CASCADE,
+    phase TEXT NOT NULL CHECK (phase IN ('pre', 'post')),
+    date TEXT NOT NULL,
+    montant_cts INTEGER NOT NULL,
+    reference TEXT
+);
+CREATE INDEX IF NOT EXISTS paiements_lot_date ON paiements (lot, phase, date);
+CREATE TABLE IF NOT EXISTS teom (
+    id INTEGER PRIMARY KEY,
+    lot TEXT NOT NULL REFERENCES lots(lot) ON DELETE CASCADE,
+    annee INTEGER NOT NULL,
+    montant_cts INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS teom_lot_annee ON teom (lot, annee);
+"""
+CHAMPS_IDENTITE = ("nom", "tel", "email", "iban", "bic")
+
+def chemin_base():
+    return os.environ.get("ALBION_BASE") or None
+
+def ouverture_lots_active():
+    # « Ouvrir un lot enregistré » donne accès à tous les propriétaires : jamais sur l'application publique
+    return chemin_base() is not None and os.environ.get("ALBION_OUVRIR_LOTS") == "1"
+
+# Une connexion par thread (Streamlit sert chaque session dans son thread)
+_local = threading.local()
+
+def connexion(chemin=None):
+    chemin = chemin or chemin_base()
+    if chemin is None: raise ValueError("base des lots désactivée (ALBION_BASE non défini)")
+    ouvertes = _local.__dict__.setdefault("connexions", {})
+    if chemin not in ouvertes:
+        cnx = sqlite3.connect(chemin, timeout=10)
+        cnx.execute("PRAGMA journal_mode=WAL")
+        cnx.execute("PRAGMA synchronous=NORMAL")
+        cnx.execute("PRAGMA foreign_keys=ON")
+        cnx.executescript(SCHEMA)
+        migrer(cnx)
+        ouvertes[chemin] = cnx
+    return ouvertes[chemin]
+
+# Révision du fichier (clé des caches de lecture) : change à chaque écriture validée,
+# y compris tant qu'elle n'est que dans le journal WAL
+def revision_base(chemin=None):
+    chemin = chemin or chemin_base()
+    revision = []
+    for fichier in (chemin, chemin + "-wal"):
+        try:
+            st = os.stat(fichier)
+            revision.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            revision.append(None)
+    return tuple(revision)
+
+def migrer(cnx):
+    # Bases créées avant l'import des relevés : colonne reference (virement bancaire d'origine)
+    colonnes = {ligne[1] for ligne in cnx.execute("PRAGMA table_info(paiements)")}
+    if "reference" not in colonnes:
+        with cnx:
+            cnx.execute("ALTER TABLE paiements ADD COLUMN reference TEXT")
+
+# --- LECTURE ---
+def lister_lots(cnx=None):
+    cnx = cnx or connexion()
+    return cnx.execute("SELECT lot, nom FROM lots ORDER BY lot").fetchall()
+
+def lire_paiements_lot(cnx, lot, phase):
+    lignes = cnx.execute("SELECT date, montant_cts FROM paiements WHERE lot = ? AND phase = ? ORDER BY date, id", (lot, phase))
+    return [{"date": date.fromisoformat(d), "montant": m / 100} for d, m in lignes]
+
+def cles_paiements_lot(lot, cnx=None):
+    # (date, centimes, référence ou None) de tous les virements du lot : index des doublons à l'import
+    cnx = cnx or connexion()
+    return [(date.fromisoformat(d), m, r) for d, m, r in
+            cnx.execute("SELECT date, montant_cts, reference FROM paiements WHERE lot = ?", (lot,))]
+
+def lot_existe(lot, cnx=None):
+    cnx = cnx or connexion()
+    return cnx.execute("SELECT 1 FROM lots WHERE lot = ?", (lot,)).fetchone() is not None
+
+# Même format que lire_sauvegarde (albion_backup.json) ; None si le lot est inconnu
+def charger_dossier(lot, cnx=None):
+    cnx = cnx or connexion()
+    ligne = cnx.execute(f"SELECT {', '.join(CHAMPS_IDENTITE)}, loyer_cts FROM lots WHERE lot = ?", (lot,)).fetchone()
+    if ligne is None: return None
+    identity = dict(zip(CHAMPS_IDENTITE, ligne[:-1]), lot=lot)
+    teom = [{"annee": a, "montant": m / 100}
+            for a, m in cnx.execute("SELECT annee, montant_cts FROM teom WHERE lot = ? ORDER BY annee, id", (lot,))]
+    return {
+        "loyer": ligne[-1] / 100,
+        "paiements_pre": lire_paiements_lot(cnx, lot, "pre"),
+        "paiements_post": lire_paiements_lot(cnx, lot, "post"),
+        "teom": teom,
+        "identity": identity,
+    }
+
+# Même format que lire_sauvegarde_monitor : le monitor suit les virements post-RJ du lot
+def charger_monitor(lot, cnx=None):
+    dossier = charger_dossier(lot, cnx)
+    if dossier is None: return None
+    return {"loyer_base": dossier["loyer"], "paiements": dossier["paiements_post"], "info": dossier["identity"]}
+
+# Tout l'immeuble en trois requêtes (vue portefeuille) : lignes brutes, montants en centimes
+def lire_portefeuille(cnx=None):
+    cnx = cnx or connexion()
+    lots = cnx.execute("SELECT lot, nom, loyer_cts FROM lots ORDER BY lot").fetchall()
+    paiements = cnx.execute("SELECT lot, phase, date, montant_cts FROM paiements ORDER BY lot, phase, date, id").fetchall()
+    teom = cnx.execute("SELECT lot, SUM(montant_cts) FROM teom GROUP BY lot").fetchall()
+    return lots, paiements, teom
+
+# --- ÉCRITURE (une transaction par saisie) ---
+def enregistrer_lot(lot, identity=None, loyer=None, cnx=None):
+    cnx = cnx or connexion()
+    champs = {k: str(v or "") for k, v in (identity or {}).items() if k in CHAMPS_IDENTITE}
+    if loyer is not None: champs["loyer_cts"] = en_centimes(loyer)
+    with cnx:
+        cnx.execute("INSERT INTO lots (lot) VALUES (?) ON CONFLICT (lot) DO NOTHING", (lot,))
+        if champs:
+            affectations = ", ".join(f"{k} = ?" for k in champs)
+            cnx.execute(f"UPDATE lots SET {affectations}, maj = CURRENT_TIMESTAMP WHERE lot = ?", (*champs.values(), lot))
+
+def phase_paiement(d):
+    return "pre" if d <= DATE_JUGEMENT else "post"
+
+def ajouter_paiement(lot, d, montant, cnx=None):
+    cnx = cnx or connexion()
+    with cnx:
+        cnx.execute("INSERT INTO paiements (lot, phase, date, montant_cts) VALUES (?, ?, ?, ?)",
+                    (lot, phase_paiement(d), d.isoformat(), en_centimes(montant)))
+
+def ajouter_paiements(lot, lignes, cnx=None):
+    # lignes : [(date, montant, référence)] insérées en une transaction
+    cnx = cnx or connexion()
+    with cnx:
+        cnx.executemany("INSERT INTO paiements (lot, phase, date, montant_cts, reference) VALUES (?, ?, ?, ?, ?)",
+                        [(lot, phase_paiement(d), d.isoformat(), en_centimes(m), ref) for d, m, ref in lignes])
+
+def supprimer_paiement(lot, d, montant, cnx=None):
+    # Supprime une seule ligne identique (deux virements du même jour et du même montant restent distincts)
+    cnx = cnx or connexion()
+    with cnx:
+        cnx.execute("DELETE FROM paiements WHERE id = (SELECT id FROM paiements WHERE lot = ? AND phase = ? AND date = ? "
+                    "AND montant_cts = ? ORDER BY id DESC LIMIT 1)", (lot, phase_paiement(d), d.isoformat(), en_centimes(montant)))
+
+def ajouter_teom(lot, annee, montant, cnx=None):
+    cnx = cnx or connexion()
+    with cnx:
+        cnx.execute("INSERT INTO teom (lot, annee, montant_cts) VALUES (?, ?, ?)", (lot, int(annee), en_centimes(montant)))
+
+def effacer_teom(lot, cnx=None):
+    cnx = cnx or connexion()
+    with cnx:
+        cnx.execute("DELETE FROM teom WHERE lot = ?", (lot,))
+
+# --- DOSSIER COMPLET / MIGRATION DES SAUVEGARDES JSON ---
+def enregistrer_dossier(lot, identity, loyer, paiements, teom=None, cnx=None):
+    # paiements : {phase: liste} ; remplace les virements de ces phases (et les TEOM si fournies)
+    cnx = cnx or connexion()
+    with cnx:
+        cnx.execute("INSERT INTO lots (lot) VALUES (?) ON CONFLICT (lot) DO NOTHING", (lot,))
+        champs = {k: str(identity.get(k) or "") for k in CHAMPS_IDENTITE if identity.get(k)}
+        champs["loyer_cts"] = en_centimes(loyer)
+        cnx.execute(f"UPDATE lots SET {', '.join(f'{k} = ?' for k in champs)}, maj = CURRENT_TIMESTAMP WHERE lot = ?",
+                    (*champs.values(), lot))
+        for phase, liste in paiements.items():
+            cnx.execute("DELETE FROM paiements WHERE lot = ? AND phase = ?", (lot, phase))
+            cnx.executemany("INSERT INTO paiements (lot, phase, date, montant_cts) VALUES (?, ?, ?, ?)",
+                            [(lot, phase, p["date"].isoformat(), en_centimes(p["montant"])) for p in liste])
+        if teom is not None:
+            cnx.execute("DELETE FROM teom WHERE lot = ?", (lot,))
+            cnx.executemany("INSERT INTO teom (lot, annee, montant_cts) VALUES (?, ?, ?)",
+                            [(lot, int(t["annee"]), en_centimes(t["montant"])) for t in teom])
+
+def importer_sauvegarde(data, lot=None, cnx=None):
+    # Sauvegarde app.py ou monitor.py ; renvoie le lot importé
+    if "loyer_base" in data:
+        dossier = lire_sauvegarde_monitor(data)
+        identity, loyer, teom = dossier["info"], dossier["loyer_base"], None
+        paiements = {"post": dossier["paiements"]}
+    else:
+        dossier = lire_sauvegarde(data)
+        identity, loyer, teom = dossier["identity"], dossier["loyer"], dossier["teom"]
+        paiements = {"pre": dossier["paiements_pre"], "post": dossier["paiements_post"]}
+    lot = lot or str(identity.get("lot") or "").strip()
+    if not lot: raise ValueError("sauvegarde sans numéro de lot")
+    enregistrer_dossier(lot, identity, loyer, paiements, teom, cnx)
+    return lot
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Base SQLite des dossiers Albion")
+    sous = parser.add_subparsers(dest="commande", required=True)
+    p_import = sous.add_parser("import", help="importe des sauvegardes JSON (app ou monitor)")
+    p_import.add_argument("fichiers", nargs="+")
+    p_import.add_argument("--base", help="fichier SQLite (défaut : ALBION_BASE)")
+    p_lots = sous.add_parser("lots", help="liste les lots enregistrés")
+    p_lots.add_argument("--base")
+    args = parser.parse_args(argv)
+    if not (args.base or chemin_base()): parser.error("indiquer la base : --base ou ALBION_BASE")
+
+    cnx = connexion(args.base)
+    if args.commande == "lots":
+        for lot, nom in lister_lots(cnx):
+            print(f"{lot}\t{nom}")
+        return 0
+    erreurs = 0
+    for chemin in args.fichiers:
+        try:
+            with open(chemin, encoding="utf-8") as f:
+                lot = importer_sauvegarde(json.load(f), cnx=cnx)
+            print(f"{chemin} -> lot {lot}")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            erreurs += 1
+            print(f"{chemin} : {type(e).__name__}: {e}", file=sys.stderr)
+    return 1 if erreurs else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
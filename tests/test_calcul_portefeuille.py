@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+import moteur
+import stockage
+from calcul_portefeuille import calculer_portefeuille, arrieres_fin_de_mois
+
+# --- ÉQUIVALENCES : PORTEFEUILLE COLONNAIRE / MOTEUR LOT PAR LOT ---
+def virements(rng, n, debut, fin):
+    jours = rng.integers(debut.toordinal(), fin.toordinal() + 1, n)
+    # Quelques virements nuls ou négatifs (régularisations) : jamais imputés
+    return [{"date": date.fromordinal(int(j)), "montant": float(m) / 100} for j, m in zip(jours, rng.integers(-5000, 700000, n))]
+
+@pytest.fixture
+def base(tmp_path):
+    rng = np.random.default_rng(18)
+    cnx = stockage.connexion(str(tmp_path / "albion.db"))
+    # Loyers répétés : plusieurs lots partagent un échéancier en cache
+    loyers = rng.integers(600000, 2500000, 12) / 100
+    for n in range(40):
+        pre = virements(rng, int(rng.integers(0, 25)), date(2019, 10, 1), moteur.DATE_JUGEMENT)
+        post = virements(rng, int(rng.integers(0, 10)), moteur.DATE_JUGEMENT + timedelta(days=1), date(2026, 9, 30))
+        teom = [{"annee": a, "montant": float(rng.integers(0, 90000)) / 100} for a in range(2020, 2020 + int(rng.integers(0, 4)))]
+        stockage.enregistrer_dossier(f"{n:03d}", {"nom": f"Lot {n}"}, float(rng.choice(loyers)), {"pre": pre, "post": post}, teom, cnx)
+    stockage.enregistrer_lot("vide", {"nom": "Sans virement"}, 9000.0, cnx)
+    return cnx
+
+def indices_monitor():
+    # Lecture des indices de monitor.py (historique ILC, 2019 / 2025, années suivantes en projection)
+    df_ilc = pd.DataFrame(moteur.tables()["historique_ilc"])
+    futurs = tuple((int(r['Annee']), float(r['Indice'])) for _, r in df_ilc.iterrows() if r['Annee'] > 2025)
+    return df_ilc.loc[df_ilc['Annee'] == 2019].iloc[0]['Indice'], df_ilc.loc[df_ilc['Annee'] == 2025].iloc[0]['Indice'], futurs
+
+def test_portefeuille_identique_au_moteur_par_lot(base):
+    indice_base, indice_revision, futurs = indices_monitor()
+    for today in (date(2025, 7, 1), date(2025, 10, 11), date(2026, 1, 15), date(2026, 4, 10), date(2026, 11, 30)):
+        synthese, dettes = calculer_portefeuille(today, cnx=base)
+        assert len(synthese) == 41
+        for code, ligne in synthese.iterrows():
+            dossier = stockage.charger_dossier(ligne["lot"], base)
+            _, principal, interets, indemnites = moteur.calculer_cascade_pre_rj(dossier["loyer"], dossier["paiements_pre"])
+            teom = moteur.total_teom(dossier["teom"])
+            assert (ligne["principal"], ligne["interets"], ligne["indemnites"], ligne["teom"]) == (principal, interets, indemnites, teom)
+            assert ligne["total_declare"] == moteur.total_creance(principal, interets, indemnites, teom)
+            echeances, _ = moteur.generer_echeancier_post_rj(dossier["loyer"], indice_base, indice_revision, indices_futurs=futurs)
+            lignes, total, loyers, penalites = moteur.imputer_paiements_monitor(echeances, dossier["paiements_post"], today)
+            assert (ligne["retard_post_rj"], ligne["retard_loyer"], ligne["retard_penalite"]) == (total, loyers, penalites)
+            # Dette par dette : payé, reste, virement qui solde, jours de retard
+            attendu = sorted((l["date"].toordinal(), l["type"] == "PENALITE", round(l["montant"] * 100), round(l["paye"] * 100),
+                              round(l["reste"] * 100), l["date_paiement"].toordinal() if l["date_paiement"] else 0,
+                              l["jours_retard"]) for l in lignes)
+            du_lot = dettes[dettes["lot"] == code]
+            assert sorted(zip(du_lot["date"], du_lot["penalite"], du_lot["montant"], du_lot["paye"], du_lot["reste"],
+                              du_lot["date_paiement"], du_lot["jours_retard"])) == attendu
+            en_retard = [l["jours_retard"] for l in lignes if l["type"] == "PRINCIPAL" and l["reste"] > 0 and today > l["date"]]
+            assert ligne["jours_retard_max"] == max(en_retard, default=0)
+
+def test_arrieres_fin_de_mois_identiques_au_moteur_par_lot(base):
+    indice_base, indice_revision, futurs = indices_monitor()
+    fins = moteur.fins_de_mois(moteur.DATE_JUGEMENT, date(2026, 12, 31))
+    arrieres = arrieres_fin_de_mois(fins, cnx=base)
+    for _, ligne in arrieres.iterrows():
+        dossier = stockage.charger_dossier(ligne["lot"], base)
+        echeances, _ = moteur.generer_echeancier_post_rj(dossier["loyer"], indice_base, indice_revision, indices_futurs=futurs)
+        for d in fins:
+            # Virements encaissés au plus tard à la fin du mois
+            encaisses = [p for p in dossier["paiements_post"] if p["date"] <= d]
+            assert ligne[d.isoformat()] == moteur.imputer_paiements_monitor(echeances, encaisses, d)[1]
+
+def test_un_seul_instantane_par_calcul(base, monkeypatch):
+    # Tables rechargées juste après la lecture de la base : le calcul en cours garde la version de départ
+    ancien = moteur.tables()["instantane"]
+    fins = moteur.fins_de_mois(moteur.DATE_JUGEMENT, date(2026, 6, 30))
+    attendu = arrieres_fin_de_mois(fins, cnx=base)
+    synthese_attendue, _ = calculer_portefeuille(date(2026, 4, 15), cnx=base)
+    monkeypatch.setattr(moteur, "_TABLES", ancien)
+    lire = stockage.lire_portefeuille
+    def lire_puis_recharger(cnx=None):
+        lignes = lire(cnx)
+        moteur.installer_tables({"version": "rechargée", "taux_legaux": list(ancien.taux_legaux), "indices": dict(ancien.indices),
+                                 "historique_ilc": [{**r, "Indice": r["Indice"] + 10} for r in ancien.historique_ilc]})
+        return lignes
+    monkeypatch.setattr(stockage, "lire_portefeuille", lire_puis_recharger)
+    assert arrieres_fin_de_mois(fins, cnx=base).equals(attendu)
+    monkeypatch.setattr(moteur, "_TABLES", ancien)
+    assert calculer_portefeuille(date(2026, 4, 15), cnx=base)[0].equals(synthese_attendue)
+    # Calcul suivant : nouvelle version
+    assert not arrieres_fin_de_mois(fins, cnx=base).equals(attendu)
@@ -0,0 +1,114 @@
+import io
+from datetime import date
+import pytest
+from import_releves import lire_date, lire_date_ofx, lire_montant, lire_releve
+
+OFX = b"""OFXHEADER:100
+DATA:OFXSGML
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240115120000[-5:EST]<TRNAMT>100.00<FITID>A1<NAME>VIR ALBION
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240216093000.000[+1:CET]<TRNAMT>250.50<FITID>A2<NAME>VIR ALBION
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240301<TRNAMT>75.00<FITID>A3<NAME>VIR ALBION
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+def test_lire_date_ofx_fuseaux():
+    assert lire_date_ofx("20240115120000[-5:EST]") == date(2024, 1, 15)
+    assert lire_date_ofx("20240216093000.000[+1:CET]") == date(2024, 2, 16)
+    assert lire_date_ofx("20240301") == date(2024, 3, 1)
+
+def test_lire_date_csv():
+    assert lire_date("15/01/2024") == date(2024, 1, 15)
+    assert lire_date("2024-01-15") == date(2024, 1, 15)
+
+def test_releve_ofx_avec_fuseaux():
+    operations = list(lire_releve(io.BytesIO(OFX), "releve.ofx"))
+    assert [(op["date"], op["montant"], op["reference"]) for op in operations] == [
+        (date(2024, 1, 15), 100.0, "A1"), (date(2024, 2, 16), 250.5, "A2"), (date(2024, 3, 1), 75.0, "A3")]
+
+@pytest.mark.parametrize("texte, montant", [
+    ("1 234,56", 1234.56), ("1\xa0234,56 €", 1234.56), ("1.234,56", 1234.56), ("1,234.56", 1234.56),
+    ("-45.00", -45.0), ("45,5", 45.5), ("1234", 1234.0), ("", None),
+])
+def test_lire_montant(texte, montant):
+    assert lire_montant(texte) == montant
+
+def test_lire_montant_ambigu():
+    with pytest.raises(ValueError):
+        lire_montant("1.234.567")
+
+CSV_ABIME = (b"Date;Libelle;Montant\n"
+             b"05/01/2021;VIR ALBION LOT A1;100,00\n"
+             b"31/02/2021;VIR ALBION LOT A1;50,00\n"
+             b"10/03/2022;VIR ALBION LOT A1;1.2.3\n"
+             b"01/09/2025;VIR ALBION LOT A1;300,00\n")
+
+def test_ligne_illisible_session():
+    from moteur import Virements
+    from import_releves import importer_dans_session, resume
+    pre, post = Virements(), Virements()
+    stats, nouvelles = importer_dans_session(io.BytesIO(CSV_ABIME), "releve.csv", pre, post)
+    assert stats["illisibles"] == 2
+    assert [(p["date"], p["montant"]) for p in pre] == [(date(2021, 1, 5), 100.0)]
+    assert [(p["date"], p["montant"]) for p in post] == [(date(2025, 9, 1), 300.0)]
+    assert "2 lignes illisibles ignorées" in resume(stats)
+
+def test_ligne_illisible_base(tmp_path):
+    import stockage
+    from import_releves import importer_dans_base
+    cnx = stockage.connexion(str(tmp_path / "lots.db"))
+    stockage.enregistrer_lot("A1", {"nom": "X"}, 12000.0, cnx)
+    stats = importer_dans_base(io.BytesIO(CSV_ABIME), "releve.csv", motif_lot=r"LOT\s*(\w+)", cnx=cnx, taille_bloc=1)
+    assert stats["illisibles"] == 2 and stats["pre"] == 1 and stats["post"] == 1
+    assert sorted((d, m) for d, m, _ in stockage.cles_paiements_lot("A1", cnx)) == [(date(2021, 1, 5), 10000), (date(2025, 9, 1), 30000)]
+
+@pytest.mark.parametrize("motif", [r"LOT\s*\w+", r"LOT\s*(\w+"])
+def test_motif_lot_sans_groupe(motif, tmp_path):
+    from import_releves import main
+    with pytest.raises(SystemExit) as sortie:
+        main(["releve.csv", "--motif-lot", motif, "--base", str(tmp_path / "lots.db")])
+    assert sortie.value.code == 2
+
+# Deux loyers identiques le même jour, sans colonne référence : le libellé en tient lieu
+CSV_JUMEAUX = (b"Date;Libelle;Montant\n"
+               b"05/01/2021;VIR ALBION LOT A1;100,00\n"
+               b"05/01/2021;VIR ALBION LOT A1;100,00\n"
+               b"06/01/2021;VIR ALBION LOT A1;100,00\n")
+
+def test_lignes_identiques_d_un_meme_import_session():
+    from moteur import Virements
+    from import_releves import importer_dans_session
+    pre, post = Virements(), Virements()
+    stats, nouvelles = importer_dans_session(io.BytesIO(CSV_JUMEAUX), "releve.csv", pre, post)
+    assert stats["pre"] == 3 and stats["doublons"] == 0 and len(nouvelles) == 3
+    # Réimport : les virements de la session (sans référence) absorbent chacun une ligne
+    stats, _ = importer_dans_session(io.BytesIO(CSV_JUMEAUX), "releve.csv", pre, post)
+    assert stats["pre"] == 0 and stats["doublons"] == 3 and pre.total() == 300.0
+
+def test_lignes_identiques_d_un_meme_import_base(tmp_path):
+    import stockage
+    from import_releves import importer_dans_base
+    cnx = stockage.connexion(str(tmp_path / "lots.db"))
+    stockage.enregistrer_lot("A1", {"nom": "X"}, 12000.0, cnx)
+    stats = importer_dans_base(io.BytesIO(CSV_JUMEAUX), "releve.csv", lot="A1", cnx=cnx, taille_bloc=1)
+    assert stats["pre"] == 3 and stats["doublons"] == 0
+    stats = importer_dans_base(io.BytesIO(CSV_JUMEAUX + b"07/01/2021;VIR ALBION LOT A1;100,00\n"), "releve.csv", lot="A1", cnx=cnx)
+    assert stats["pre"] == 1 and stats["doublons"] == 3
+    assert len(stockage.cles_paiements_lot("A1", cnx)) == 4
+
+def test_flux_de_l_appelant_reste_ouvert():
+    import gc
+    flux = io.BytesIO(OFX)
+    assert len(list(lire_releve(flux, "releve.ofx"))) == 3
+    # Lecture interrompue (relevé refusé en cours de route) : même chose
+    operations = lire_releve(flux, "releve.ofx")
+    next(operations)
+    del operations
+    gc.collect()
+    assert not flux.closed
+    flux.seek(0)
+    assert flux.read() == OFX
@@ -0,0 +1,332 @@
+import json
+from datetime import date, timedelta
+from itertools import islice
+import numpy as np
+import pytest
+import moteur
+from moteur import DATE_JUGEMENT, tables, installer_tables, calculer_cascade_pre_rj
+
+PAIEMENTS = [{"date": date(2021, 3, 15), "montant": 2500.0}, {"date": date(2023, 11, 2), "montant": 4000.0}]
+
+# Dossier de référence : loyer 12 000 EUR HT, six virements pré-RJ
+REFERENCE = [{"date": date(2019, 11, 4), "montant": 3300.0}, {"date": date(2020, 7, 15), "montant": 1234.56},
+             {"date": date(2021, 3, 15), "montant": 2500.0}, {"date": date(2022, 1, 10), "montant": 3500.0},
+             {"date": date(2023, 11, 2), "montant": 4000.0}, {"date": date(2024, 12, 20), "montant": 777.77}]
+
+def test_instantane_en_lecture_seule():
+    instantane = tables()["instantane"]
+    with pytest.raises(AttributeError):
+        instantane.taux_legaux = ()
+    with pytest.raises(TypeError):
+        instantane.indices["BASE"] = 1.0
+    with pytest.raises(ValueError):
+        instantane.cumul_np[0] = 1
+
+def test_rechargement_sans_effet_sur_un_calcul_en_cours(monkeypatch):
+    ancien = tables()["instantane"]
+    attendu = calculer_cascade_pre_rj(12000.0, PAIEMENTS, instantane=ancien)
+    # Nouvelle version (taux doublés, indices relevés) installée pendant le calcul
+    monkeypatch.setattr(moteur, "_TABLES", ancien)
+    installer_tables({"version": "test", "taux_legaux": [(d, 2 * t) for d, t in ancien.taux_legaux],
+                      "indices": {k: v + 10 for k, v in ancien.indices.items()}, "historique_ilc": list(ancien.historique_ilc)})
+    assert moteur._TABLES is not ancien
+    assert calculer_cascade_pre_rj(12000.0, PAIEMENTS, instantane=ancien) == attendu
+    assert calculer_cascade_pre_rj(12000.0, PAIEMENTS)[1:3] != attendu[1:3]
+
+def test_suivi_post_rj_lit_les_indices_passes():
+    indices = dict(tables()["indices"])
+    aujourd_hui = date(2027, 1, 1)
+    lignes, total = moteur.suivre_loyers_post_rj(12000.0, [], aujourd_hui, indices=indices)
+    assert (lignes, total) == moteur.suivre_loyers_post_rj(12000.0, [], aujourd_hui)
+    # Indice 2024 relevé : révision de juin 2025, toutes les échéances post-RJ augmentent
+    indices["2024"] += 5
+    revises, total_revise = moteur.suivre_loyers_post_rj(12000.0, [], aujourd_hui, indices=indices)
+    assert all(r["Montant"] > l["Montant"] for r, l in zip(revises, lignes))
+    assert total_revise > total
+
+def test_cascade_reference_en_centimes():
+    # Centimes de la politique d'arrondi (moteur.py, MONTANTS EN CENTIMES). Le moteur en flottants
+    # déclarait 74 066,52 EUR de principal et 17 952,44 EUR d'intérêts : tout changement d'arrondi se voit ici.
+    detail, principal, interets, indemnite = calculer_cascade_pre_rj(12000.0, REFERENCE)
+    assert (principal, interets, indemnite) == (74066.54, 17952.44, 960.0)
+    assert len(detail) == 30
+    assert [(r["Date"], r["R_Princ"], r["R_Int"]) for r in detail if r["Lib"] == "Paiement"] == [
+        (date(2019, 11, 4), 1130.14, 0.0), (date(2020, 7, 15), 10216.24, 0.0), (date(2021, 3, 15), 15320.47, 0.0),
+        (date(2022, 1, 10), 27034.26, 0.0), (date(2023, 11, 2), 51508.44, 4122.03), (date(2024, 12, 20), 66540.23, 12999.34)]
+
+# --- ÉQUIVALENCES : INDEX DES SOLDES À DATE / MOTEUR DE RÉFÉRENCE ---
+def virements_aleatoires(rng, n, debut, fin, trier=True):
+    jours = rng.integers(debut.toordinal(), fin.toordinal() + 1, n)
+    if trier: jours = np.sort(jours)
+    # Centimes quelconques, quelques virements nuls ou négatifs (ignorés par l'imputation)
+    montants = rng.integers(-5000, 600000, n) / 100
+    return [{"date": date.fromordinal(int(j)), "montant": float(m)} for j, m in zip(jours, montants)]
+
+def echeancier_aleatoire(rng):
+    futurs = tuple((a, 135.30 + float(rng.integers(0, 800)) / 100) for a in range(2026, 2026 + int(rng.integers(0, 3))))
+    fin = date(2026 + len(futurs), 6, 30) if futurs else moteur.FIN_SUIVI_POST_RJ
+    loyer = float(rng.integers(500000, 3000000)) / 100
+    return moteur.generer_echeancier_post_rj(loyer, 114.06, 135.30, fin, futurs)[0]
+
+def test_imputer_au_identique_au_curseur():
+    rng = np.random.default_rng(24)
+    for _ in range(1000):
+        base = echeancier_aleatoire(rng)
+        paiements = virements_aleatoires(rng, int(rng.integers(0, 12)), date(2025, 6, 27), date(2027, 6, 30),
+                                         trier=bool(rng.integers(0, 2)))
+        today = date.fromordinal(int(rng.integers(date(2025, 6, 1).toordinal(), date(2028, 1, 1).toordinal())))
+        attendu = moteur.imputer_paiements_monitor(base, paiements, today)
+        assert moteur.imputer_au(moteur.indexer_monitor(base, paiements), today) == attendu
+        # Colonnes de session (triées par date) : même résultat que la liste triée
+        virements = moteur.Virements.depuis_liste(paiements)
+        assert moteur.imputer_au(moteur.indexer_monitor(base, virements), today) == \
+            moteur.imputer_paiements_monitor(base, virements.en_liste(), today)
+
+def test_arrieres_encaisses_au_jour_j():
+    rng = np.random.default_rng(2024)
+    for _ in range(300):
+        base = echeancier_aleatoire(rng)
+        paiements = virements_aleatoires(rng, int(rng.integers(0, 12)), date(2025, 6, 27), date(2027, 6, 30))
+        index = moteur.indexer_monitor(base, paiements)
+        jours = moteur.fins_de_mois(date(2025, 6, 26), date(2027, 12, 31))
+        totaux, loyers, penalites = moteur.arrieres_aux(index, [d.toordinal() for d in jours], encaisses=True)
+        for n, d in enumerate(jours):
+            _, *attendu = moteur.imputer_paiements_monitor(base, [p for p in paiements if p["date"] <= d], d)
+            assert (totaux[n] / 100, loyers[n] / 100, penalites[n] / 100) == tuple(attendu)
+
+def test_solde_au_identique_a_la_cascade_arretee():
+    rng = np.random.default_rng(240)
+    echeances = moteur.generer_loyers_theoriques_pre_rj(13500.0)
+    for _ in range(40):
+        paiements = virements_aleatoires(rng, int(rng.integers(0, 30)), date(2019, 10, 1), date(2025, 6, 25))
+        paiements = [p for p in paiements if p["montant"] > 0]
+        index = moteur.indexer_cascade(calculer_cascade_pre_rj(13500.0, paiements)[0])
+        for o in rng.integers(date(2019, 10, 10).toordinal(), DATE_JUGEMENT.toordinal() + 1, 10):
+            d = date.fromordinal(int(o))
+            _, principal, interets, _ = calculer_cascade_pre_rj(
+                13500.0, [p for p in paiements if p["date"] <= d], d, [e for e in echeances if e["date"] <= d])
+            assert moteur.solde_au(index, d) == (principal, interets)
+
+# --- ÉQUIVALENCES : ÉCHÉANCIERS GÉNÉRÉS / ÉCHÉANCIERS ÉCRITS À LA MAIN ---
+# Échéanciers d'avant les règles de facturation, recopiés tels quels (indices en paramètre)
+def loyers_pre_rj_a_la_main(loyer_annuel_ht, INDICES):
+    m = loyer_annuel_ht * 1.10 / 12
+    l2020 = m * (INDICES["2019"] / INDICES["BASE"])
+    l2021 = l2020
+    l2022 = m * (INDICES["2021"] / INDICES["BASE"])
+    l2023 = m * (INDICES["2022"] / INDICES["BASE"])
+    l2024 = m * (INDICES["2023"] / INDICES["BASE"])
+    l2025 = m * (INDICES["2024"] / INDICES["BASE"])
+    e = [(date(2019, 10, 10), "Loyer 2019 (4 mois TTC)", m * 4), (date(2020, 1, 10), "T1 2020", m * 3),
+         (date(2020, 4, 10), "T2 2020 (Mixte)", (m * 2) + (l2020 * 1)),
+         (date(2020, 7, 10), "T3 2020", l2020 * 3), (date(2020, 10, 10), "T4 2020", l2020 * 3)]
+    e += [(date(2021, 1 + (t - 1) * 3, 10), f"T{t} 2021", l2021 * 3) for t in range(1, 5)]
+    for annee, avant, apres in ((2022, l2021, l2022), (2023, l2022, l2023), (2024, l2023, l2024)):
+        e += [(date(annee, 1, 10), f"T1 {annee}", avant * 3),
+              (date(annee, 4, 10), f"T2 {annee} (Indexation)", (avant * 2) + (apres * 1)),
+              (date(annee, 7, 10), f"T3 {annee}", apres * 3), (date(annee, 10, 10), f"T4 {annee}", apres * 3)]
+    e += [(date(2025, 1, 10), "T1 2025", l2024 * 3), (date(2025, 4, 10), "Avril-Mai 2025", l2024 * 2),
+          (date(2025, 6, 26), "Juin 2025 (Prorata 26j)", (l2025 / 30) * 26)]
+    return [{"date": d, "label": l, "montant": x} for d, l, x in e]
+
+def loyers_post_rj_a_la_main(loyer_annuel_ht, INDICES):
+    l2025 = loyer_annuel_ht * 1.10 / 12 * (INDICES["2024"] / INDICES["BASE"])
+    e = [(date(2025, 7, 10), "Solde Juin 2025 (Payable Juillet)", (l2025 / 30) * 4),
+         (date(2025, 10, 10), "T3 2025 (Payable Octobre)", l2025 * 3),
+         (date(2026, 1, 10), "T4 2025 (Payable Janvier 26)", l2025 * 3),
+         (date(2026, 4, 10), "T1 2026 (Payable Avril 26)", l2025 * 3)]
+    return [{"date": d, "label": l, "montant": x} for d, l, x in e]
+
+def echeancier_monitor_a_la_main(base, indice_base, indice_revision):
+    ttc = base * (indice_revision / indice_base) * 1.10
+    e = [(date(2025, 7, 10), "Solde Juin 2025 (Prorata)", (ttc / 365) * 4),
+         (date(2025, 10, 10), "T3 2025 (Juil-Août-Sept)", ttc / 4),
+         (date(2026, 1, 10), "T4 2025 (Oct-Nov-Déc)", ttc / 4),
+         (date(2026, 4, 10), "T1 2026 (Jan-Fév-Mars)", ttc / 4)]
+    return [{"date": d, "label": l, "montant": x, "indice_used": indice_revision} for d, l, x in e]
+
+def indices_aleatoires(rng):
+    # Hausse chaque année sauf 2020 (< 2019 : pas de révision en juin 2021, comme l'ILC publié)
+    base = 110 + float(rng.integers(0, 500)) / 100
+    i = {"BASE": base, "2019": base + float(rng.integers(1, 300)) / 100}
+    i["2020"] = i["2019"] - float(rng.integers(1, 100)) / 100
+    courant = i["2019"]
+    for annee in ("2021", "2022", "2023", "2024"):
+        courant += float(rng.integers(1, 600)) / 100
+        i[annee] = courant
+    return i
+
+def test_echeanciers_identiques_aux_listes_ecrites_a_la_main():
+    rng = np.random.default_rng(14)
+    for _ in range(300):
+        loyer = float(rng.integers(100000, 5000000)) / 100
+        indices = indices_aleatoires(rng)
+        assert moteur.generer_loyers_theoriques_pre_rj(loyer, indices) == loyers_pre_rj_a_la_main(loyer, indices)
+        assert moteur.generer_loyers_post_rj(loyer, indices=indices) == loyers_post_rj_a_la_main(loyer, indices)
+        indice_base, indice_revision = indices["BASE"], indices["2024"]
+        assert moteur.generer_echeancier_post_rj(loyer, indice_base, indice_revision) == \
+            (echeancier_monitor_a_la_main(loyer, indice_base, indice_revision), indice_revision / indice_base)
+    # Tables livrées : mêmes échéances et même cascade au centime que la liste écrite à la main
+    indices = tables()["indices"]
+    a_la_main = loyers_pre_rj_a_la_main(12000.0, indices)
+    assert moteur.generer_loyers_theoriques_pre_rj(12000.0) == a_la_main
+    assert calculer_cascade_pre_rj(12000.0, REFERENCE) == calculer_cascade_pre_rj(12000.0, REFERENCE, echeances=a_la_main)
+
+def test_echeancier_paresseux_identique_au_plan_en_cache():
+    rng = np.random.default_rng(1400)
+    for _ in range(50):
+        loyer = float(rng.integers(100000, 5000000)) / 100
+        futurs = tuple((a, 136.0 + float(rng.integers(0, 900)) / 100) for a in range(2026, 2030))
+        # Fin de trimestre : pas de prorata final, la suite sans fin coïncide
+        fin = date(int(rng.integers(2026, 2030)), 3 * int(rng.integers(1, 4)) + 1, 1) - timedelta(days=1)
+        liste, _ = moteur.generer_echeancier_post_rj(loyer, 114.06, 135.30, fin, futurs)
+        # Sans fin : même suite, coupée à la même date (plan produit au fil de l'eau, hors cache)
+        sans_fin = moteur.iterer_echeancier_post_rj(loyer, 114.06, 135.30, None, futurs)
+        assert list(islice(sans_fin, len(liste))) == liste
+
+# --- ÉQUIVALENCES : CURSEUR DE VIREMENTS / DOUBLE BOUCLE ---
+# Imputation d'avant le curseur (flottants, chaque dette relit tous les virements), recopiée telle quelle
+def imputer_double_boucle(base_loyers, paiements, today):
+    dettes = []
+    for item in base_loyers:
+        dettes.append({"date": item['date'], "label": item['label'], "montant": item['montant'], "type": "PRINCIPAL",
+                       "paye": 0.0, "reste": item['montant'], "date_paiement": None, "indice": item['indice_used']})
+        if today > item['date']:
+            dettes.append({"date": item['date'] + timedelta(days=1), "label": f"↪ Indemnité (Retard {item['label']})",
+                           "montant": moteur.INDEMNITE_FORFAITAIRE, "type": "PENALITE", "paye": 0.0,
+                           "reste": moteur.INDEMNITE_FORFAITAIRE, "date_paiement": None, "indice": 0})
+    dettes = sorted(dettes, key=lambda x: (0 if x['type'] == 'PENALITE' else 1, x['date']))
+    disponibles = [p.copy() for p in paiements]
+    total = loyers = penalites = 0
+    for debt in dettes:
+        date_paiement = None
+        for pay in disponibles:
+            if pay['montant'] <= 0: continue
+            if debt['reste'] <= 0: break
+            pris = min(pay['montant'], debt['reste'])
+            pay['montant'] -= pris
+            debt['reste'] -= pris
+            debt['paye'] += pris
+            date_paiement = pay['date']
+        debt['date_paiement'] = date_paiement
+        debt['jours_retard'] = 0
+        if debt['reste'] < 0.01 and debt['date_paiement']:
+            debt['jours_retard'] = max(0, (debt['date_paiement'] - debt['date']).days)
+        elif today > debt['date']:
+            debt['jours_retard'] = max(0, (today - debt['date']).days)
+        if debt['reste'] > 0.01 and today > debt['date']:
+            total += debt['reste']
+            if debt['type'] == 'PRINCIPAL': loyers += debt['reste']
+            else: penalites += debt['reste']
+    return sorted(dettes, key=lambda x: x['date']), total, loyers, penalites
+
+def au_centime(dettes, *totaux):
+    lignes = [{**d, **{c: round(d[c], 2) for c in ("montant", "paye", "reste")}} for d in dettes]
+    return lignes, *(round(t, 2) for t in totaux)
+
+def test_curseur_identique_a_la_double_boucle():
+    rng = np.random.default_rng(5)
+    for _ in range(1000):
+        # Échéances arrondies au centime : les deux versions partent des mêmes montants
+        base = [{**e, "montant": moteur.en_centimes(e["montant"]) / 100} for e in echeancier_aleatoire(rng)]
+        paiements = virements_aleatoires(rng, int(rng.integers(0, 15)), date(2025, 6, 27), date(2027, 6, 30),
+                                         trier=bool(rng.integers(0, 2)))
+        today = date.fromordinal(int(rng.integers(date(2025, 6, 1).toordinal(), date(2028, 1, 1).toordinal())))
+        assert au_centime(*moteur.imputer_paiements_monitor(base, paiements, today)) == \
+            au_centime(*imputer_double_boucle(base, paiements, today))
+
+# --- ÉQUIVALENCES : VIREMENTS EN COLONNES / LISTE DE DICTS ---
+def test_virements_aller_retour_format_de_session():
+    rng = np.random.default_rng(25)
+    for _ in range(200):
+        # Liste de dicts : état de session d'avant les colonnes (version 0) et format des sauvegardes
+        liste = virements_aleatoires(rng, int(rng.integers(0, 40)), date(2019, 10, 1), date(2027, 6, 30), trier=False)
+        attendu = sorted(({"date": p["date"], "montant": moteur.en_centimes(p["montant"]) / 100} for p in liste),
+                         key=lambda p: p["date"])
+        virements = moteur.en_virements(liste)
+        assert virements.version == moteur.VERSION_VIREMENTS and virements.en_liste() == attendu
+        assert virements.total() == round(sum(p["montant"] for p in attendu), 2)
+        # Sauvegarde JSON puis relecture (boutons Sauvegarder / Charger)
+        texte = json.dumps({"paiements": virements}, default=moteur.json_serial)
+        relu = moteur.Virements.depuis_liste(moteur.lire_paiements(json.loads(texte)["paiements"]))
+        assert relu.en_liste() == attendu and relu.cle() == virements.cle()
+        # Clé de cache relue sans copie
+        assert moteur.depuis_cle_paiements(virements.cle()).en_liste() == attendu
+        assert moteur.cle_paiements(liste) == virements.cle()
+        # Saisie et suppression : comme append + tri stable et pop sur la liste
+        d = date.fromordinal(int(rng.integers(date(2019, 10, 1).toordinal(), date(2027, 6, 30).toordinal())))
+        virements.ajouter(d, 123.456)
+        attendu = sorted(attendu + [{"date": d, "montant": 123.46}], key=lambda p: p["date"])
+        assert virements.en_liste() == attendu
+        i = int(rng.integers(0, len(attendu)))
+        assert virements.retirer(i) == attendu.pop(i) and virements.en_liste() == attendu
+
+def test_virements_d_une_version_anterieure_reconvertis():
+    virements = moteur.Virements.depuis_liste(REFERENCE)
+    assert moteur.en_virements(virements) is virements
+    ancien = moteur.Virements(virements.jours, virements.centimes)
+    ancien.version = moteur.VERSION_VIREMENTS - 1
+    converti = moteur.en_virements(ancien)
+    assert converti is not ancien and converti.version == moteur.VERSION_VIREMENTS
+    assert converti.en_liste() == virements.en_liste() == REFERENCE
+    # Une clé de cache d'une autre version n'est jamais relue
+    with pytest.raises(ValueError):
+        moteur.depuis_cle_paiements(ancien.cle())
+    assert moteur.cle_paiements(ancien) == virements.cle()
+    # Moteur : mêmes centimes depuis les colonnes et depuis la liste
+    assert calculer_cascade_pre_rj(12000.0, converti) == calculer_cascade_pre_rj(12000.0, REFERENCE)
+
+# --- ÉQUIVALENCES : SÉRIE QUOTIDIENNE / CASCADE ---
+def test_serie_quotidienne_identique_a_la_cascade():
+    rng = np.random.default_rng(22)
+    echeances = moteur.generer_loyers_theoriques_pre_rj(12000.0)
+    for n in (0, 1, 5, 30, 300):
+        paiements = [p for p in virements_aleatoires(rng, n, date(2019, 10, 1), DATE_JUGEMENT) if p["montant"] > 0]
+        detail, principal, interets, _ = calculer_cascade_pre_rj(12000.0, paiements)
+        jours, princ_cts, int_cts = moteur.serie_quotidienne(detail)
+        assert jours[0] == np.datetime64(detail[0]["Date"]) and jours[-1] == np.datetime64(DATE_JUGEMENT)
+        # Au soir de chaque date de mouvement (dernière ligne du jour) et au jugement : soldes de la cascade
+        position = {np.datetime64(d): k for k, d in enumerate(jours)}
+        for ligne in detail:
+            k = position[np.datetime64(ligne["Date"])]
+            if ligne is [l for l in detail if l["Date"] == ligne["Date"]][-1]:
+                assert (princ_cts[k] / 100, int_cts[k] / 100) == (ligne["R_Princ"], ligne["R_Int"])
+        # Totaux déclarés de la cascade : soldes créditeurs ramenés à zéro
+        net = lambda k: (max(0, princ_cts[k]) / 100, max(0, int_cts[k]) / 100)
+        assert net(-1) == (principal, interets)
+        # Entre deux mouvements : cascade arrêtée au jour tiré
+        for k in rng.integers(0, len(jours), 40):
+            d = date.fromordinal(int(jours[k].astype(np.int64)) + moteur.ORDINAL_EPOCH)
+            _, p, i, _ = calculer_cascade_pre_rj(12000.0, [x for x in paiements if x["date"] <= d], d,
+                                                 [e for e in echeances if e["date"] <= d])
+            assert net(k) == (p, i)
+
+# --- ÉQUIVALENCES : GRAPHIQUE RÉDUIT / SÉRIE COMPLÈTE ---
+def test_reduction_garde_bornes_et_extremes():
+    rng = np.random.default_rng(21)
+    budget = moteur.POINTS_GRAPHIQUE
+    assert np.array_equal(moteur.reduire_series([np.arange(budget)]), np.arange(budget))
+    for n in (budget + 1, 2191, 20000):
+        colonnes = [np.cumsum(rng.normal(0, 100, n)).round(2), np.cumsum(rng.integers(0, 500, n)) / 100]
+        garder = moteur.reduire_series(colonnes, budget)
+        assert len(garder) <= budget and np.all(np.diff(garder) > 0)
+        assert garder[0] == 0 and garder[-1] == n - 1
+        nb_seaux = budget // (4 * len(colonnes))
+        seau = np.arange(n) * nb_seaux // n
+        for c in colonnes:
+            # Dans chaque seau, le min et le max de la série complète restent tracés
+            for s in range(nb_seaux):
+                valeurs = c[seau == s]
+                gardees = c[garder[seau[garder] == s]]
+                assert gardees.min() == valeurs.min() and gardees.max() == valeurs.max()
+
+def test_colonnes_des_virements_sans_copie():
+    virements = moteur.Virements.depuis_liste(REFERENCE)
+    colonnes = virements.colonnes()
+    assert np.shares_memory(colonnes["jours"], virements.jours) and np.shares_memory(colonnes["centimes"], virements.centimes)
+    with pytest.raises(ValueError):
+        colonnes["centimes"][0] = 0
+    # Saisie ultérieure : nouveaux tableaux, la vue garde l'état lu
+    virements.ajouter(date(2025, 1, 5), 10.0)
+    assert len(colonnes["jours"]) == len(REFERENCE) and len(virements) == len(REFERENCE) + 1
+    assert virements.en_liste()[:5] == REFERENCE[:5]
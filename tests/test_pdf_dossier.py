@@ -0,0 +1,68 @@
+import io
+import os
+import subprocess
+import sys
+import pytest
+from pypdf import PdfReader
+from moteur import tables
+from pdf_dossier import DossierJuridiquePDF, notice_statique
+
+def rendre(statique):
+    # Même début de dossier (polices déjà enregistrées dans un autre ordre que dans le gabarit), puis la notice
+    pdf = DossierJuridiquePDF({"nom": "Dupont Jean", "lot": "A204"})
+    pdf.generate_page_1_courrier(10000.0, 500.0, 300.0, 1200.0)
+    if statique:
+        pdf.generate_page_3_notice_statique(notice_statique(tables()["instantane"]))
+    else:
+        pdf.generate_page_3_notice()
+    pdf.set_font("Arial", "", 10)
+    pdf.cell(0, 6, "Suite du dossier", 0, 1)
+    return PdfReader(io.BytesIO(pdf.output(dest="S").encode("latin-1")))
+
+def textes(page):
+    # (texte, police, taille, position) de chaque fragment de la page
+    fragments = []
+    def visiteur(texte, cm, tm, police, taille):
+        if texte.strip():
+            fragments.append((texte, police["/BaseFont"] if police else None, round(taille, 2),
+                              tuple(round(v, 2) for v in tm[4:]), tuple(round(v, 2) for v in cm[4:])))
+    page.extract_text(visitor_text=visiteur)
+    return fragments
+
+def test_notice_statique_identique_au_rendu_direct():
+    direct, statique = rendre(False), rendre(True)
+    assert len(direct.pages) == len(statique.pages)
+    for page_directe, page_statique in zip(direct.pages, statique.pages):
+        attendu = textes(page_directe)
+        assert attendu
+        assert textes(page_statique) == attendu
+
+def test_notice_statique_reprend_les_tables():
+    ref = tables()
+    texte = "".join(p.extract_text() for p in rendre(True).pages)
+    assert "NOTICE METHODOLOGIQUE" in texte
+    for d, t in ref["taux_legaux"]:
+        assert d.strftime("%d/%m/%Y") in texte and f"{t:.2f}" in texte
+
+def test_fusion_chronometree_en_deux_phases(monkeypatch):
+    from pdf_dossier import construire_dossier_pdf, lire_pdf
+    import metriques
+    monkeypatch.setenv("ALBION_METRIQUES_DIR", "")
+    # Pièce jointe PDF d'une page (équivalent minimal d'un UploadedFile)
+    annexe = DossierJuridiquePDF({"nom": "Dupont Jean", "lot": "A204"})
+    annexe.add_page()
+    piece = io.BytesIO(annexe.output(dest="S").encode("latin-1"))
+    piece.type = "application/pdf"
+    avant = {p: metriques._histogrammes.get(p, [None, 0, 0])[2] for p in ("pdf_merge_append", "pdf_merge_write")}
+    with construire_dossier_pdf({"nom": "Dupont Jean", "lot": "A204"}, 12000.0, ([], 0.0, 0.0, 0.0), [], [], [piece]) as f:
+        assert lire_pdf(f).startswith(b"%PDF")
+    for phase, n in avant.items():
+        assert metriques._histogrammes[phase][2] == n + 1
+
+@pytest.mark.parametrize("version", ["2.7.9", "1.7.1", None])
+def test_autre_version_de_fpdf_refusee(version):
+    # Import dans un interpréteur neuf, fpdf installé remplacé par une autre version
+    faux = "del fpdf.__version__" if version is None else f"fpdf.__version__ = {version!r}"
+    res = subprocess.run([sys.executable, "-c", f"import fpdf; {faux}; import pdf_dossier"],
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), capture_output=True, text=True)
+    assert res.returncode != 0 and "ImportError: pdf_dossier requiert fpdf 1.7.2" in res.stderr
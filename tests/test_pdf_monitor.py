@@ -0,0 +1,40 @@
+import gc
+import tracemalloc
+from datetime import date
+import pandas as pd
+from moteur import tables, generer_echeancier_post_rj, imputer_paiements_monitor
+from pdf_monitor import construire_relance_pdf
+
+# Rendus mesurés après préchauffage (RSS) ; tracemalloc ralentit ~5x, il ne suit que les derniers
+RENDUS = 100
+RENDUS_TRACES = 10
+
+def rss_mo():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096 / 1e6
+
+def test_relances_successives_sans_fuite():
+    # Une figure matplotlib gardée par rapport faisait gagner ~1,5 Mo de RSS par relance
+    base_loyers, _ = generer_echeancier_post_rj(12000.0, 114.06, 135.30)
+    paiements = [{"date": date(2025, 7, 20), "montant": 1000.0}, {"date": date(2025, 10, 30), "montant": 4000.0}]
+    today = date(2026, 1, 15)
+    debts_display, *totaux = imputer_paiements_monitor(base_loyers, paiements, today)
+    df_ilc = pd.DataFrame(tables()["historique_ilc"])
+    def rendre():
+        return construire_relance_pdf({"nom": "X", "lot": "1"}, "15/01/2026", debts_display, totaux, paiements, df_ilc)
+    # Préchauffage : polices, caches matplotlib et FPDF, arènes de l'allocateur (RSS stable après ~60 rendus)
+    for _ in range(60): rendre()
+    gc.collect()
+    rss_avant = rss_mo()
+    for _ in range(RENDUS): assert rendre().startswith(b"%PDF")
+    gc.collect()
+    assert rss_mo() - rss_avant < 5.0
+    tracemalloc.start()
+    try:
+        debut, _ = tracemalloc.get_traced_memory()
+        for _ in range(RENDUS_TRACES): rendre()
+        gc.collect()
+        fin, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert (fin - debut) / 1e6 < 1.0
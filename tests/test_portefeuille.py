@@ -0,0 +1,25 @@
+from datetime import date
+from streamlit.testing.v1 import AppTest
+import metriques
+import stockage
+
+def calculs():
+    return metriques._histogrammes.get("portefeuille", [None, 0, 0])[2]
+
+def test_portefeuille_recalcule_seulement_si_la_base_change(tmp_path, monkeypatch):
+    chemin = str(tmp_path / "albion.db")
+    monkeypatch.setenv("ALBION_BASE", chemin)
+    monkeypatch.setenv("ALBION_OUVRIR_LOTS", "1")
+    avant = calculs()
+    stockage.enregistrer_dossier("A1", {"nom": "X"}, 12000.0, {"post": [{"date": date(2025, 7, 20), "montant": 1000.0}]})
+    app = AppTest.from_file("../portefeuille.py", default_timeout=60).run()
+    assert not app.exception and calculs() == avant + 1
+    # Rerun sans changement (widget, rafraîchissement) : portefeuille lu dans le cache
+    app.run()
+    assert not app.exception and calculs() == avant + 1
+    assert app.metric[0].value == "1"
+    # Saisie dans la base : nouvelle révision, portefeuille recalculé
+    stockage.enregistrer_lot("B2", {"nom": "Y"}, 9000.0)
+    app.run()
+    assert not app.exception and calculs() == avant + 2
+    assert app.metric[0].value == "2"
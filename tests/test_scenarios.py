@@ -0,0 +1,93 @@
+from datetime import date, timedelta
+import numpy as np
+import moteur
+from moteur import DATE_JUGEMENT, tables, calculer_cascade_pre_rj, InstantaneTables
+from scenarios import evaluer_scenarios, scenarios_grille, scenarios_monte_carlo
+
+LOYER = 12000.0
+PAIEMENTS = [{"date": date(2019, 11, 4), "montant": 3300.0}, {"date": date(2020, 7, 15), "montant": 1234.56},
+             {"date": date(2022, 1, 10), "montant": 3500.0}, {"date": date(2023, 11, 2), "montant": 4000.0},
+             {"date": date(2024, 12, 20), "montant": 777.77}, {"date": date(2025, 6, 20), "montant": 2000.0}]
+
+# --- ÉQUIVALENCES : CASCADE VECTORISÉE / CASCADE D'UN SCÉNARIO ---
+def instantane_avec_taux(instantane, dates_taux, taux):
+    # Table des taux du scénario : semestres antérieurs à dates_taux[0] conservés, taux remplacés ensuite
+    taux_legaux = [(d, t) for d, t in instantane.taux_legaux if d < dates_taux[0]] + [(d, float(t)) for d, t in zip(dates_taux, taux)]
+    return InstantaneTables({"version": "scénario", "taux_legaux": taux_legaux, "indices": dict(instantane.indices),
+                             "historique_ilc": [dict(r) for r in instantane.historique_ilc]})
+
+def cascade_du_scenario(params, s, instantane, date_arret=DATE_JUGEMENT):
+    # Dossier perturbé comme l'indique le commentaire de scenarios.py, passé dans calculer_cascade_pre_rj
+    paiements = []
+    for k, p in enumerate(PAIEMENTS):
+        decalage = int(params["decalages"][s][k]) if "decalages" in params else 0
+        facteur = params["facteurs"][s][k] if "facteurs" in params else 1.0
+        d = p["date"] + timedelta(days=decalage)
+        # Décalé au-delà de l'arrêt : post-RJ ; non décalé : compté comme dans la cascade
+        if d <= date_arret or decalage == 0:
+            paiements.append({"date": d, "montant": moteur.en_centimes(p["montant"] * facteur) / 100})
+    if "reglement_montants" in params:
+        d = params["reglement_dates"][s]
+        d = d if isinstance(d, date) else date.fromisoformat(str(d))
+        if params["reglement_montants"][s] and d <= date_arret:
+            paiements.append({"date": d, "montant": float(params["reglement_montants"][s])})
+    if "taux" in params:
+        instantane = instantane_avec_taux(instantane, params["dates_taux"], params["taux"][s])
+    indices = params["indices"][s] if "indices" in params else instantane.indices
+    # Loyers appelés jusqu'à l'arrêt (au-delà du jugement pour un arrêt plus tardif)
+    echeances = list(moteur.iterer_loyers_pre_rj(LOYER, date_arret, indices))
+    _, principal, interets, indemnite = calculer_cascade_pre_rj(LOYER, paiements, date_arret, echeances, instantane)
+    return principal, interets, indemnite
+
+def verifier(params, instantane, date_arret=DATE_JUGEMENT):
+    res = evaluer_scenarios(LOYER, PAIEMENTS, date_arret=date_arret, instantane=instantane, **params)
+    for s in range(params["nb"]):
+        assert (res["principal"][s] / 100, res["interets"][s] / 100, res["indemnites"][s] / 100) == \
+            cascade_du_scenario(params, s, instantane, date_arret)
+
+def test_scenario_sans_perturbation_identique_a_la_cascade():
+    instantane = tables()["instantane"]
+    res = evaluer_scenarios(LOYER, PAIEMENTS, instantane=instantane)
+    _, principal, interets, indemnite = calculer_cascade_pre_rj(LOYER, PAIEMENTS, instantane=instantane)
+    assert (res["principal"][0] / 100, res["interets"][0] / 100, res["indemnites"][0] / 100) == (principal, interets, indemnite)
+
+def test_scenarios_aleatoires_identiques_a_la_cascade():
+    rng = np.random.default_rng(23)
+    instantane = tables()["instantane"]
+    nb, nb_p = 300, len(PAIEMENTS)
+    # Taux remplacés sur les trois derniers semestres de la table
+    dates_taux = [d for d, _ in instantane.taux_legaux[-3:]]
+    params = {"nb": nb,
+              "decalages": np.where(rng.random((nb, nb_p)) < 0.4, rng.integers(1, 200, (nb, nb_p)), 0),
+              "facteurs": 1.0 - rng.uniform(0, 0.8, (nb, nb_p)),
+              "reglement_dates": [date.fromordinal(int(o)) for o in rng.integers(date(2019, 10, 1).toordinal(), date(2025, 12, 31).toordinal(), nb)],
+              "reglement_montants": np.where(rng.random(nb) < 0.2, 0.0, np.round(rng.uniform(0, 20000, nb), 2)),
+              "dates_taux": dates_taux, "taux": np.round(rng.uniform(3, 18, (nb, len(dates_taux))), 2),
+              "indices": [{**instantane.indices, "2024": float(v)} for v in np.round(rng.uniform(136, 150, nb), 2)]}
+    verifier(params, instantane)
+    # Arrêt avant le jugement : échéances et virements ultérieurs sortis de la créance
+    verifier(params, instantane, date(2024, 3, 31))
+
+def test_jeux_grille_et_monte_carlo_identiques_a_la_cascade():
+    instantane = tables()["instantane"]
+    params, _ = scenarios_grille(len(PAIEMENTS), decalages_jours=(0, 30, 400), reglements=((None, 0.0), (date(2024, 5, 2), 5000.0)),
+                                 taux_apres=(None, 4.0, 16.5), indices=(None, 140.0))
+    verifier(params, instantane)
+    params = scenarios_monte_carlo(len(PAIEMENTS), 200, seed=230, retard_max=90, reduction_max=0.5,
+                                   reglement=(date(2023, 1, 1), date(2025, 6, 26), 15000.0), taux=(2.0, 20.0), indice=(130.0, 145.0))
+    verifier(params, instantane)
+
+def test_taux_du_dernier_semestre_seulement():
+    # --taux : taux du semestre en vigueur au jugement ; un semestre postérieur ne change rien à la créance déclarée
+    instantane = tables()["instantane"]
+    params = scenarios_monte_carlo(len(PAIEMENTS), 50, seed=12, taux=(2.0, 20.0))
+    assert params["dates_taux"] == [instantane.taux_legaux[-1][0]] == [date(2025, 1, 1)]
+    futurs = {"nb": 50, "dates_taux": [date(2025, 1, 1), date(2025, 7, 1)],
+              "taux": np.c_[params["taux"], np.random.default_rng(0).uniform(0, 30, 50)]}
+    assert evaluer_scenarios(LOYER, PAIEMENTS, instantane=instantane, **params)["total"].tolist() == \
+        evaluer_scenarios(LOYER, PAIEMENTS, instantane=instantane, **futurs)["total"].tolist()
+    # Arrêt plus tardif : un taux par semestre futur est pris en compte
+    fin = date(2026, 6, 30)
+    verifier(futurs, instantane, fin)
+    assert evaluer_scenarios(LOYER, PAIEMENTS, date_arret=fin, instantane=instantane, **params)["total"].tolist() != \
+        evaluer_scenarios(LOYER, PAIEMENTS, date_arret=fin, instantane=instantane, **futurs)["total"].tolist()
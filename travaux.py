@@ -0,0 +1,99 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from metriques import mesure
+from moteur import json_serial
+
+# --- FILE DES TRAVAUX PDF (arrière-plan) ---
+# Un pool borné par processus, partagé par toutes les sessions Streamlit : le script rend la main
+# pendant le rendu FPDF, la préparation des images et la fusion pypdf.
+# Un travail est identifié par l'empreinte de ses entrées : un second clic (ou un autre onglet)
+# sur un travail identique en cours ou déjà fait renvoie le même identifiant, sans nouveau rendu.
+# Résultats consultables par identifiant ; seuls les TAILLE_RESULTATS derniers travaux terminés sont gardés.
+# Threads plutôt que processus : les pièces jointes restent en mémoire partagée et l'avancement
+# se lit sans canal inter-processus. ALBION_PDF_WORKERS : rendus simultanés (défaut 2).
+
+NB_WORKERS = int(os.environ.get("ALBION_PDF_WORKERS", "2"))
+TAILLE_RESULTATS = 32
+
+class PieceJointe(io.BytesIO):
+    # Copie d'un UploadedFile : le travail ne dépend plus de la session qui l'a lancé
+    def __init__(self, contenu, type_mime, nom=""):
+        super().__init__(contenu)
+        self.type = type_mime
+        self.name = nom
+        self.empreinte = hashlib.sha256(contenu).hexdigest()
+
+def figer_pieces(pieces):
+    return [PieceJointe(f.getvalue(), f.type, getattr(f, "name", "")) for f in pieces]
+
+def empreinte_travail(*entrees):
+    h = hashlib.sha256()
+    for e in entrees:
+        h.update(json.dumps(e, default=json_serial, sort_keys=True).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:20]
+
+class Travail:
+    def __init__(self, ident, libelle):
+        self.id = ident
+        self.libelle = libelle
+        self.avancement = 0.0
+        self.etape = "En attente"
+        self.resultat = None
+        self.erreur = None
+        self.termine = False
+        self.soumis = time.time()
+        self.verrou = threading.Lock()
+
+    def progresser(self, avancement, etape):
+        self.avancement = avancement
+        self.etape = etape
+
+_travaux = OrderedDict()
+_verrou = threading.Lock()
+_pool = []
+
+def executer(travail, fonction, args):
+    travail.progresser(0.0, "En cours")
+    try:
+        with mesure("travail_pdf"):
+            travail.resultat = fonction(*args, progression=travail.progresser)
+        travail.progresser(1.0, "Terminé")
+    except Exception as e:
+        travail.erreur = f"{type(e).__name__}: {e}"
+    travail.termine = True
+
+def soumettre(ident, fonction, *args, libelle=""):
+    # fonction(*args, progression=rappel(avancement 0..1, étape)) ; un échec précédent est relancé
+    with _verrou:
+        travail = _travaux.get(ident)
+        if travail is not None and travail.erreur is None:
+            _travaux.move_to_end(ident)
+            return ident
+        travail = _travaux[ident] = Travail(ident, libelle)
+        termines = [i for i, t in _travaux.items() if t.termine]
+        for i in termines[:max(0, len(_travaux) - TAILLE_RESULTATS)]:
+            del _travaux[i]
+        if not _pool: _pool.append(ThreadPoolExecutor(max_workers=NB_WORKERS, thread_name_prefix="albion-pdf"))
+        _pool[0].submit(executer, travail, fonction, args)
+    return ident
+
+def etat(ident):
+    # None si l'identifiant est inconnu ou le résultat déjà évincé
+    with _verrou:
+        return _travaux.get(ident)
+
+def contenu(ident):
+    # Octets du résultat (bytes ou fichier temporaire partagé entre sessions : lecture sous verrou)
+    travail = etat(ident)
+    if travail is None or travail.resultat is None: return b""
+    if isinstance(travail.resultat, bytes): return travail.resultat
+    with travail.verrou:
+        travail.resultat.seek(0)
+        return travail.resultat.read()